@@ -0,0 +1,69 @@
+"""
+Throughput of the thread vs process-pool execute_query paths.
+
+Runs the same CPU-heavy statement many times from a pool of client threads
+through each executor and prints queries/second as JSON.
+
+    python benchmarks/bench_executor.py --requests 64 --concurrency 8
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+import process_pool  # noqa: E402
+
+DEFAULT_SQL = """
+WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 200000)
+SELECT x % 97 AS bucket, COUNT(*) AS n, SUM(x) AS total, AVG(x * 1.5) AS mean
+FROM n GROUP BY bucket ORDER BY bucket
+"""
+
+
+def run(execute, sql: str, db_path: str, requests: int, concurrency: int) -> dict:
+    # Warm-up: connections, statement caches and (for processes) worker startup
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda _: execute(sql, db_path, 0, 0), range(concurrency)))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: execute(sql, db_path, 0, 0), range(requests)))
+    elapsed = time.perf_counter() - started
+    failures = [r["error"] for r in results if not r["success"]]
+    return {
+        "requests": requests,
+        "seconds": round(elapsed, 3),
+        "qps": round(requests / elapsed, 2),
+        "failures": len(failures),
+        "first_error": failures[0] if failures else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=database.DEFAULT_DB)
+    parser.add_argument("--sql", default=DEFAULT_SQL)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 4)
+    args = parser.parse_args()
+
+    report = {
+        "db": args.db,
+        "concurrency": args.concurrency,
+        "process_workers": process_pool.PROCESS_POOL_WORKERS,
+        "thread": run(database.execute_query, args.sql, args.db, args.requests, args.concurrency),
+        "process": run(process_pool.execute_query, args.sql, args.db, args.requests, args.concurrency),
+    }
+    process_pool.shutdown()
+    report["speedup"] = round(report["process"]["qps"] / report["thread"]["qps"], 2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
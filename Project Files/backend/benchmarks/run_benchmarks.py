@@ -0,0 +1,295 @@
+"""
+Benchmark suite for the backend hot paths.
+
+Builds (and caches) synthetic databases of the requested sizes, times
+get_schema / get_schema_text / execute_query / extract_sql in-process, then
+starts the API under uvicorn against a stub Gemini server and load-tests
+/api/execute and /api/query over HTTP. Everything lands in one JSON file so
+runs from different commits can be compared:
+
+    python benchmarks/run_benchmarks.py --rows 1e4,1e5,1e6
+    python benchmarks/run_benchmarks.py --rows 1e5 --compare benchmarks/results/<old>.json
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import statistics
+import subprocess
+import urllib.request
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+import database  # noqa: E402
+import seed_db  # noqa: E402
+from gemini_service import extract_sql  # noqa: E402
+from stub_gemini import start_stub, DEFAULT_RESPONSE  # noqa: E402
+
+DATA_DIR = os.path.join(BENCH_DIR, ".data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+QUERIES = {
+    "point_lookup": "SELECT * FROM customers WHERE id = 42",
+    "filtered_scan": "SELECT id, total_amount FROM orders WHERE status = 'cancelled' ORDER BY total_amount DESC LIMIT 50",
+    "group_by": "SELECT status, COUNT(*) AS n, ROUND(AVG(total_amount), 2) AS avg_total FROM orders GROUP BY status",
+    "join_aggregate": (
+        "SELECT c.name AS category, SUM(oi.quantity * oi.unit_price) AS revenue "
+        "FROM order_items oi JOIN products p ON p.id = oi.product_id "
+        "JOIN categories c ON c.id = p.category_id GROUP BY c.id ORDER BY revenue DESC"
+    ),
+    "wide_rows": "SELECT * FROM order_items LIMIT 500",
+}
+
+
+# ── Helpers ─────────────────────────────────────────────
+def summarize(samples: list[float]) -> dict:
+    """Latency stats in milliseconds."""
+    ordered = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    return {
+        "n": len(ordered),
+        "mean_ms": ms(statistics.fmean(ordered)),
+        "p50_ms": ms(ordered[len(ordered) // 2]),
+        "p95_ms": ms(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]),
+        "min_ms": ms(ordered[0]),
+    }
+
+
+def timed(fn, repeat: int, before=None) -> dict:
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def build_database(rows: int, rebuild: bool) -> tuple[str, float]:
+    """Path to a cached synthetic database of ~rows rows, and its build time (0 when reused)."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    path = os.path.join(DATA_DIR, f"bench_{rows}.db")
+    if os.path.exists(path) and not rebuild:
+        return path, 0.0
+    started = time.perf_counter()
+    seed_db.create_database(path, rows, seed=rows, workers=os.cpu_count() or 1)
+    return path, round(time.perf_counter() - started, 3)
+
+
+# ── In-process micro-benchmarks ─────────────────────────
+def micro(path: str, repeat: int) -> dict:
+    results = {
+        "get_schema_cold": timed(lambda: database.get_schema(path), repeat,
+                                 before=lambda: database.invalidate_schema_cache(path)),
+        "get_schema_warm": timed(lambda: database.get_schema(path), repeat),
+        "get_schema_text_warm": timed(lambda: database.get_schema_text(path), repeat),
+        "execute_query": {},
+    }
+    for name, sql in QUERIES.items():
+        database.execute_query(sql, path, 0, 0)  # warm the pool and page cache
+        results["execute_query"][name] = timed(lambda: database.execute_query(sql, path, 0, 0), repeat)
+    database.close_pool(path)
+    return results
+
+
+# ── HTTP load test ──────────────────────────────────────
+def post_json(url: str, payload: dict) -> tuple[int, float]:
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    return status, time.perf_counter() - started
+
+
+def load(url: str, payloads: list[dict], concurrency: int) -> dict:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(lambda p: post_json(url, p), payloads))
+    elapsed = time.perf_counter() - started
+    return {
+        **summarize([latency for _, latency in outcomes]),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(payloads) / elapsed, 2),
+        "errors": sum(status != 200 for status, _ in outcomes),
+    }
+
+
+def start_server(databases: dict[str, str], gemini_url: str, workdir: str, port: int, extra_env: dict):
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_API_ENDPOINT": gemini_url,
+        "DATABASES": ",".join(f"{name}={path}" for name, path in databases.items()),
+        "DATABASE_REGISTRY_PATH": os.path.join(workdir, "databases.json"),
+        "HISTORY_DB_PATH": os.path.join(workdir, "history.db"),
+        **extra_env,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1).read()
+            return server
+        except OSError:
+            if server.poll() is not None:
+                raise RuntimeError("uvicorn exited during startup")
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("uvicorn did not start within 30s")
+
+
+def http(databases: dict[str, str], args) -> dict:
+    stub, gemini_url = start_stub(latency=args.llm_latency_ms / 1000, response_text=DEFAULT_RESPONSE)
+    port = free_port()
+    workdir = os.path.join(DATA_DIR, "server")
+    os.makedirs(workdir, exist_ok=True)
+    extra_env = {"RESULT_CACHE_BYTES": "0"} if args.no_result_cache else {}
+    server = start_server(databases, gemini_url, workdir, port, extra_env)
+    base = f"http://127.0.0.1:{port}"
+    results = {}
+    try:
+        for name in databases:
+            sqls = list(QUERIES.values())
+            execute = [{"sql": sqls[i % len(sqls)], "db": name} for i in range(args.requests)]
+            # Distinct questions so the NL cache does not short-circuit generation
+            query = [{"question": f"top products by units sold #{i}", "db": name} for i in range(args.requests)]
+            load(f"{base}/api/execute", execute[: args.concurrency], args.concurrency)  # warm-up
+            results[name] = {
+                "execute": load(f"{base}/api/execute", execute, args.concurrency),
+                "query": load(f"{base}/api/query", query, args.concurrency),
+            }
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        stub.shutdown()
+    return results
+
+
+# ── Comparison ──────────────────────────────────────────
+def flatten(tree: dict, prefix: str = "") -> dict[str, float]:
+    out = {}
+    for key, value in tree.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            out.update(flatten(value, path))
+        elif key in ("mean_ms", "p95_ms", "rps"):
+            out[path] = value
+    return out
+
+
+def compare(old: dict, new: dict, threshold: float) -> list[str]:
+    """Lines for metrics that moved by more than threshold (a fraction), worst first."""
+    before, after = flatten(old["results"]), flatten(new["results"])
+    changes = []
+    for key in before.keys() & after.keys():
+        if not before[key]:
+            continue
+        ratio = after[key] / before[key]
+        # Higher latency is worse; lower throughput is worse
+        worse = ratio > 1 if not key.endswith("rps") else ratio < 1
+        if abs(ratio - 1) > threshold:
+            changes.append((worse, abs(ratio - 1), f"{'REGRESSION' if worse else 'improved  '} {key}: "
+                                                   f"{before[key]} -> {after[key]} ({ratio - 1:+.1%})"))
+    return [line for _, _, line in sorted(changes, reverse=True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1e4,1e5", help="comma-separated database sizes, 1e4 .. 1e8")
+    parser.add_argument("--repeat", type=int, default=20, help="iterations per micro-benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="HTTP requests per endpoint and database")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="stub Gemini response delay")
+    parser.add_argument("--no-result-cache", action="store_true", help="run the server with RESULT_CACHE_BYTES=0")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--rebuild", action="store_true", help="regenerate cached databases")
+    parser.add_argument("--output", help="JSON file (default: benchmarks/results/<commit>-<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported by --compare")
+    args = parser.parse_args()
+
+    sizes = [int(float(v)) for v in args.rows.split(",") if v.strip()]
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": database.sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": {"extract_sql": timed(lambda: extract_sql(DEFAULT_RESPONSE), max(args.repeat, 1000)),
+                    "databases": {}},
+    }
+
+    databases = {}
+    for rows in sizes:
+        path, build_seconds = build_database(rows, args.rebuild)
+        name = f"bench_{rows}"
+        databases[name] = path
+        print(f"[{name}] micro-benchmarks", file=sys.stderr)
+        report["results"]["databases"][name] = {
+            "rows": rows,
+            "file_bytes": os.path.getsize(path),
+            "build_seconds": build_seconds,
+            **micro(path, args.repeat),
+        }
+
+    if not args.skip_http:
+        print("HTTP load test", file=sys.stderr)
+        for name, result in http(databases, args).items():
+            report["results"]["databases"][name]["http"] = result
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            lines = compare(json.load(f), report, args.threshold)
+        print("\n".join(lines) if lines else f"No metric moved by more than {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
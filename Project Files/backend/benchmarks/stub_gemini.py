@@ -0,0 +1,74 @@
+"""
+Local stand-in for the Gemini REST API, for load tests without network or quota.
+
+Answers every models/*:generateContent call with a fixed SQL response after
+an optional delay. Point the backend at it with
+GEMINI_API_ENDPOINT=http://127.0.0.1:<port>.
+
+    python benchmarks/stub_gemini.py --port 8089 --latency-ms 300
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = (
+    "```sql\n"
+    "SELECT p.name, SUM(oi.quantity) AS units\n"
+    "FROM order_items oi JOIN products p ON p.id = oi.product_id\n"
+    "GROUP BY p.id ORDER BY units DESC LIMIT 10\n"
+    "```\n"
+    "Top 10 products by units sold."
+)
+
+
+def make_handler(latency: float, response_text: str):
+    body = json.dumps({
+        "candidates": [{
+            "content": {"parts": [{"text": response_text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "usageMetadata": {"promptTokenCount": 0, "candidatesTokenCount": 0, "totalTokenCount": 0},
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not self.path.split("?")[0].endswith(":generateContent"):
+                self.send_error(404)
+                return
+            if latency:
+                time.sleep(latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stub(port: int = 0, latency: float = 0.0, response_text: str = DEFAULT_RESPONSE):
+    """Serve in a background thread. Returns (server, base_url); call server.shutdown() when done."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency, response_text))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="stub-gemini").start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency_ms / 1000, DEFAULT_RESPONSE))
+    print(f"Stub Gemini listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,270 @@
+"""
+Server-side result cursors for Smart Bridge SQL Querying.
+Lets clients page through large results without re-running the query:
+queries ordered by a unique key continue with keyset (seek) pagination,
+anything else keeps its live statement open until it goes idle.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from database import get_schema, stream_query, QueryBudget, MAX_ROWS
+from sql_utils import mask_sql, find_top_level, strip_sql
+
+CURSOR_IDLE_SECONDS = float(os.getenv("CURSOR_IDLE_SECONDS", "300"))
+MAX_OPEN_CURSORS = int(os.getenv("MAX_OPEN_CURSORS", "64"))
+
+_ORDER_TERM = re.compile(
+    r'^\s*(?:(?:"[^"]+"|\w+)\s*\.\s*)?(?:"([^"]+)"|(\w+))(?:\s+(ASC|DESC))?\s*$', re.IGNORECASE
+)
+_SINGLE_TABLE = re.compile(
+    r'\bFROM\s+(?:"([^"]+)"|(\w+))(?:\s+(?:AS\s+)?\w+)?\s*(?:\bWHERE\b.*)?$', re.IGNORECASE | re.DOTALL
+)
+
+
+def _keyset_plan(sql: str, columns: list[str], db_path: str = None) -> Optional[dict]:
+    """
+    Decide whether a query can be continued by seeking on its ORDER BY key.
+    Requires a single-table query whose trailing ORDER BY (one direction only)
+    ends on the table's INTEGER PRIMARY KEY, with every key in the output.
+    Leading keys must be NOT NULL columns: a row-value comparison against NULL
+    is never true, so the seek would silently skip the rest of the result.
+    Returns {"inner", "keys", "desc"} or None.
+    """
+    masked = mask_sql(sql)
+    order = find_top_level(sql, r"\bORDER\s+BY\b", masked)
+    if not order or find_top_level(sql, r"\b(LIMIT|OFFSET|GROUP\s+BY|UNION|INTERSECT|EXCEPT|JOIN|WITH)\b", masked):
+        return None
+
+    # Split the ORDER BY list on top-level commas
+    terms, start = [], order.end()
+    for pos in [i for i in range(order.end(), len(sql)) if masked[i] == ","] + [len(sql)]:
+        terms.append(sql[start:pos])
+        start = pos + 1
+    keys, directions = [], set()
+    for term in terms:
+        m = _ORDER_TERM.match(term)
+        if not m:
+            return None
+        keys.append(m.group(1) or m.group(2))
+        directions.add((m.group(3) or "ASC").upper())
+    if len(directions) != 1 or any(columns.count(k) != 1 for k in keys):
+        return None
+
+    head = masked[:order.start()]
+    if "," in head[head.upper().rfind("FROM"):] or re.search(rf'\bAS\s+"?{re.escape(keys[-1])}"?', head, re.IGNORECASE):
+        return None
+    table_match = _SINGLE_TABLE.search(head)
+    if not table_match:
+        return None
+    table = table_match.group(1) or table_match.group(2)
+
+    for info in get_schema(db_path):
+        if info["table_name"] == table:
+            pks = [c for c in info["columns"] if c["primary_key"]]
+            not_null = {c["name"] for c in info["columns"] if not c["nullable"]}
+            if len(pks) == 1 and pks[0]["type"].upper() == "INTEGER" and pks[0]["name"] == keys[-1] \
+                    and all(k in not_null for k in keys[:-1]):
+                return {"inner": sql[:order.start()].rstrip(), "keys": keys, "desc": directions == {"DESC"}}
+    return None
+
+
+class ResultCursor:
+    """One open result set. Holds at most a live statement, never buffered rows."""
+
+    def __init__(self, sql: str, db_path: str, columns: list[str], batches, budget: QueryBudget = None):
+        self.token = secrets.token_urlsafe(16)
+        self.budget = budget or QueryBudget()  # stays on the live statement; each page gets a fresh allowance
+        self.limits = (self.budget.timeout, self.budget.max_steps)  # applied to each seek query
+        self.sql = sql
+        self.db_path = db_path
+        self.columns = columns
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+        self._batches = batches
+        self._started = False  # the live statement takes page sizes via send() once started
+        self._plan = None
+        self._last_key = None
+
+    @property
+    def mode(self) -> str:
+        return "keyset" if self._plan else "live"
+
+    def use_keyset(self, plan: dict, last_row: tuple):
+        """Switch to seek pagination after the first page and release the live statement."""
+        self._plan = plan
+        self._last_key = [last_row[self.columns.index(k)] for k in plan["keys"]]
+        self._close_live()
+
+    def next_page(self, page_size: int) -> list[tuple]:
+        self.last_used = time.monotonic()
+        if self._plan is None:
+            if not self._batches:
+                return []
+            self.budget.restart()
+            try:
+                if not self._started:
+                    self._started = True
+                    return next(self._batches, [])
+                return self._batches.send(page_size)
+            except StopIteration:
+                return []
+            except sqlite3.Error as e:
+                message = self.budget.error_message()
+                if message:
+                    raise sqlite3.OperationalError(message) from e
+                raise
+
+        plan = self._plan
+        quoted = [f'"{k}"' for k in plan["keys"]]
+        placeholders = ", ".join("?" for _ in quoted)
+        op, direction = ("<", "DESC") if plan["desc"] else (">", "ASC")
+        order_by = ", ".join(f"{k} {direction}" for k in quoted)
+        seek_sql = (
+            f"SELECT * FROM ({plan['inner']}) WHERE ({', '.join(quoted)}) {op} ({placeholders}) "
+            f"ORDER BY {order_by} LIMIT {int(page_size)}"
+        )
+        _, batches = stream_query(
+            seek_sql, self.db_path, batch_size=page_size, params=self._last_key, budget=QueryBudget(*self.limits)
+        )
+        try:
+            rows = next(batches, [])
+        finally:
+            batches.close()
+        if rows:
+            self._last_key = [rows[-1][self.columns.index(k)] for k in plan["keys"]]
+        return rows
+
+    def _close_live(self):
+        if self._batches is not None:
+            self._batches.close()
+            self._batches = None
+
+    def close(self):
+        self._close_live()
+
+
+class CursorRegistry:
+    """Open cursors by token, with idle-timeout and LRU eviction."""
+
+    def __init__(self, idle_seconds: float = CURSOR_IDLE_SECONDS, max_open: int = MAX_OPEN_CURSORS):
+        self.idle_seconds = idle_seconds
+        self.max_open = max_open
+        self._cursors: OrderedDict[str, ResultCursor] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sweep(self):
+        """Close cursors idle for longer than the timeout."""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            stale = [c for c in self._cursors.values() if c.last_used < cutoff]
+            for cursor in stale:
+                del self._cursors[cursor.token]
+        for cursor in stale:
+            with cursor.lock:
+                cursor.close()
+
+    def add(self, cursor: ResultCursor):
+        self.sweep()
+        with self._lock:
+            self._cursors[cursor.token] = cursor
+            evicted = []
+            while len(self._cursors) > self.max_open:
+                evicted.append(self._cursors.popitem(last=False)[1])
+        for old in evicted:
+            with old.lock:
+                old.close()
+
+    def get(self, token: str) -> Optional[ResultCursor]:
+        self.sweep()
+        with self._lock:
+            cursor = self._cursors.get(token)
+            if cursor:
+                self._cursors.move_to_end(token)
+            return cursor
+
+    def close(self, token: str) -> bool:
+        with self._lock:
+            cursor = self._cursors.pop(token, None)
+        if cursor is None:
+            return False
+        with cursor.lock:
+            cursor.close()
+        return True
+
+    def close_all(self):
+        with self._lock:
+            cursors = list(self._cursors.values())
+            self._cursors.clear()
+        for cursor in cursors:
+            with cursor.lock:
+                cursor.close()
+
+    def __len__(self):
+        return len(self._cursors)
+
+
+registry = CursorRegistry()
+
+
+def _page_result(cursor: ResultCursor, rows: list[tuple], done: bool, as_dicts: bool = True) -> dict:
+    return {
+        "success": True,
+        "columns": cursor.columns,
+        "rows": [dict(zip(cursor.columns, row)) for row in rows] if as_dicts else rows,
+        "row_count": len(rows),
+        "truncated": not done,
+        "cursor": None if done else cursor.token,
+        "pagination": cursor.mode,
+    }
+
+
+def open_cursor(sql: str, db_path: str = None, page_size: int = MAX_ROWS, budget: QueryBudget = None,
+                as_dicts: bool = True) -> dict:
+    """
+    Execute a query and return its first page. If more rows may follow, the
+    result carries a `cursor` token for fetch_page.
+    The budget covers the first page; every later page gets the same limits.
+    With as_dicts=False rows are returned as tuples in column order.
+    Raises ValueError for disallowed SQL and sqlite3.Error for execution errors.
+    """
+    sql = strip_sql(sql)
+    budget = budget or QueryBudget()
+    columns, batches = stream_query(sql, db_path, batch_size=page_size, budget=budget)
+    cursor = ResultCursor(sql, db_path, columns, batches, budget)
+    try:
+        rows = cursor.next_page(page_size)
+    except Exception:
+        cursor.close()
+        raise
+    done = len(rows) < page_size
+    if done:
+        cursor.close()
+        return _page_result(cursor, rows, True, as_dicts)
+
+    plan = _keyset_plan(sql, columns, db_path)
+    if plan:
+        cursor.use_keyset(plan, rows[-1])
+    registry.add(cursor)
+    return _page_result(cursor, rows, False, as_dicts)
+
+
+def fetch_page(token: str, page_size: int = MAX_ROWS, as_dicts: bool = True) -> Optional[dict]:
+    """Return the next page for a cursor token, or None if it expired or never existed."""
+    cursor = registry.get(token)
+    if cursor is None:
+        return None
+    with cursor.lock:
+        rows = cursor.next_page(page_size)
+        done = len(rows) < page_size
+        if done:
+            cursor.close()
+    if done:
+        registry.close(token)
+    return _page_result(cursor, rows, done, as_dicts)
@@ -5,12 +5,50 @@ Handles SQLite connections, schema introspection, and query execution.
 
 import sqlite3
 import os
-from typing import Any
+import json
+import hashlib
+import time
+import queue
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Optional
+from urllib.request import pathname2url
+
+from sql_guard import verdict_cache, READ_ONLY_ERROR
+from sql_utils import file_signature
+from metrics import span
+from slow_queries import slow_log
+from rollups import rollups
 
 DB_DIR = os.path.join(os.path.dirname(__file__), "data")
 DEFAULT_DB = os.path.join(DB_DIR, "sample.db")
 CURRENT_DB_PATH = DEFAULT_DB
 MAX_ROWS = 500
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "1000"))
+
+# Default per-statement budgets (0 = unlimited); endpoints may override them.
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+QUERY_MAX_STEPS = int(os.getenv("QUERY_MAX_STEPS", "0"))
+# The progress handler runs every this many SQLite VM instructions
+PROGRESS_INTERVAL = 1000
+
+# Tables whose estimated size is at or below this get an exact COUNT(*) during
+# introspection; larger ones keep their estimate until the background refresh.
+EXACT_COUNT_LIMIT = int(os.getenv("SCHEMA_EXACT_COUNT_LIMIT", "100000"))
+BACKGROUND_COUNTS = os.getenv("SCHEMA_BACKGROUND_COUNTS", "1") != "0"
+
+# Read-only connection pool tuning
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "16"))
+# Databases with open pools; the least recently used idle one is closed beyond this
+MAX_OPEN_DATABASES = int(os.getenv("MAX_OPEN_DATABASES", "64"))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB, so 64 MiB
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY")
+
+# Schema cache: db path -> {"signature", "schema_version", "fingerprint", "schema", "text"}
+_schema_cache: dict[str, dict] = {}
+_schema_lock = threading.Lock()
 
 
 def get_db_path() -> str:
@@ -20,9 +58,17 @@ def get_db_path() -> str:
 
 
 def set_db_path(path: str):
-    """Set the active database path."""
+    """Set the active database path, rebuilding its connection pool."""
     global CURRENT_DB_PATH
-    CURRENT_DB_PATH = path
+    with _pools_lock:
+        # The file at `path` may have been replaced, so its old connections
+        # (and the previous database's) are drained before the switch.
+        for old in {CURRENT_DB_PATH, path}:
+            pool = _pools.pop(old, None)
+            if pool:
+                pool.close()
+        invalidate_schema_cache(path)
+        CURRENT_DB_PATH = path
 
 
 def get_connection(db_path: str = None) -> sqlite3.Connection:
@@ -33,60 +79,310 @@ def get_connection(db_path: str = None) -> sqlite3.Connection:
     return conn
 
 
-def get_schema(db_path: str = None) -> list[dict]:
+# ── Connection pool ─────────────────────────────────────
+class ConnectionPool:
     """
-    Introspect the database and return schema info.
-    Returns a list of tables with their columns, types, and primary keys.
+    Pool of long-lived read-only connections to one database file.
+    Connections keep their page and statement caches between requests and
+    are handed to whichever threadpool worker needs one.
     """
-    conn = get_connection(db_path)
-    cursor = conn.cursor()
 
-    # Get all table names
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
-    tables = [row[0] for row in cursor.fetchall()]
+    def __init__(self, path: str, max_idle: int = POOL_SIZE):
+        self.path = path
+        self.max_idle = max_idle
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._closed = False
+        self._in_use = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA temp_store = {SQLITE_TEMP_STORE}")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._in_use -= 1
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed or self._idle.qsize() >= self.max_idle:
+            conn.close()
+            return
+        self._idle.put(conn)
+        if self._closed:
+            # close() ran between the check and the put
+            self._drain()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _drain(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def close(self):
+        """Close idle connections; checked-out ones are closed on release."""
+        self._closed = True
+        self._drain()
+
+    def stats(self) -> dict:
+        return {"idle": self._idle.qsize(), "in_use": self._in_use, "max_idle": self.max_idle}
+
+
+_pools: OrderedDict[str, ConnectionPool] = OrderedDict()
+_pools_lock = threading.Lock()
+
+
+def _evict_idle_pools():
+    """Close least recently used pools with nothing checked out. Caller holds _pools_lock."""
+    for path in list(_pools):
+        if len(_pools) <= MAX_OPEN_DATABASES:
+            return
+        pool = _pools[path]
+        if pool.stats()["in_use"] or path == CURRENT_DB_PATH:
+            continue
+        del _pools[path]
+        pool.close()
+        invalidate_schema_cache(path)
+
+
+def get_pool(db_path: str = None) -> ConnectionPool:
+    """Return the connection pool for a database, creating it on first use."""
+    path = db_path or get_db_path()
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+            _evict_idle_pools()
+        else:
+            _pools.move_to_end(path)
+        return pool
+
+
+def open_databases() -> list[str]:
+    """Paths of databases that currently hold a connection pool, most recently used last."""
+    with _pools_lock:
+        return list(_pools)
+
+
+def pool_stats() -> dict[str, dict]:
+    """Idle / in-use connection counts per open database."""
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {path: pool.stats() for path, pool in pools}
+
+
+def close_pool(db_path: str):
+    """Drain and discard the pool for a database (e.g. after its file was replaced)."""
+    with _pools_lock:
+        pool = _pools.pop(db_path, None)
+    if pool:
+        pool.close()
+
+
+def pooled_connection(db_path: str = None):
+    """Context manager yielding a pooled read-only connection."""
+    return get_pool(db_path).connection()
+
+
+def _estimate_row_counts(cursor: sqlite3.Cursor, tables: list[str]) -> dict[str, int]:
+    """
+    Estimate row counts without scanning tables.
+    Uses sqlite_stat1 (written by ANALYZE) when present, otherwise MAX(rowid),
+    which is a single b-tree seek.
+    """
+    estimates = {}
+    try:
+        cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+        for tbl, stat in cursor.fetchall():
+            try:
+                count = int(str(stat).split()[0])
+            except (ValueError, IndexError):
+                continue
+            estimates[tbl] = max(estimates.get(tbl, 0), count)
+    except sqlite3.Error:
+        pass
 
-    schema = []
     for table in tables:
-        cursor.execute(f"PRAGMA table_info('{table}')")
-        columns = []
-        for col in cursor.fetchall():
-            columns.append({
-                "name": col[1],
-                "type": col[2],
-                "nullable": not col[3],
-                "primary_key": bool(col[5]),
-            })
+        if table in estimates:
+            continue
+        try:
+            cursor.execute(f"SELECT MAX(rowid) FROM \"{table}\"")
+            estimates[table] = cursor.fetchone()[0] or 0
+        except sqlite3.Error:
+            # WITHOUT ROWID tables have no cheap estimate
+            estimates[table] = None
+    return estimates
+
+
+def _introspect_schema(path: str) -> tuple[int, list[dict]]:
+    """Read the schema of a database file. Returns (schema_version, schema)."""
+    with pooled_connection(path) as conn:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA schema_version")
+        schema_version = cursor.fetchone()[0]
+
+        # Get all table names
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name")
+        tables = [row[0] for row in cursor.fetchall()]
+        estimates = _estimate_row_counts(cursor, tables)
 
-        # Get row count
-        cursor.execute(f"SELECT COUNT(*) FROM '{table}'")
-        row_count = cursor.fetchone()[0]
-
-        # Get foreign keys
-        cursor.execute(f"PRAGMA foreign_key_list('{table}')")
-        foreign_keys = []
-        for fk in cursor.fetchall():
-            foreign_keys.append({
-                "from_column": fk[3],
-                "to_table": fk[2],
-                "to_column": fk[4],
+        schema = []
+        for table in tables:
+            cursor.execute(f"PRAGMA table_info('{table}')")
+            columns = []
+            for col in cursor.fetchall():
+                columns.append({
+                    "name": col[1],
+                    "type": col[2],
+                    "nullable": not col[3],
+                    "primary_key": bool(col[5]),
+                })
+
+            # Row count: exact for small tables, estimated for large ones
+            row_count = estimates.get(table)
+            estimated = True
+            if row_count is None or row_count <= EXACT_COUNT_LIMIT:
+                cursor.execute(f"SELECT COUNT(*) FROM '{table}'")
+                row_count = cursor.fetchone()[0]
+                estimated = False
+
+            # Get foreign keys
+            cursor.execute(f"PRAGMA foreign_key_list('{table}')")
+            foreign_keys = []
+            for fk in cursor.fetchall():
+                foreign_keys.append({
+                    "from_column": fk[3],
+                    "to_table": fk[2],
+                    "to_column": fk[4],
+                })
+
+            schema.append({
+                "table_name": table,
+                "columns": columns,
+                "row_count": row_count,
+                "row_count_estimated": estimated,
+                "foreign_keys": foreign_keys,
             })
+    return schema_version, schema
 
-        schema.append({
-            "table_name": table,
-            "columns": columns,
-            "row_count": row_count,
-            "foreign_keys": foreign_keys,
-        })
 
-    conn.close()
-    return schema
+def _refresh_row_counts(path: str, entry: dict):
+    """Background job: replace estimated row counts with exact ones."""
+    pending = [t["table_name"] for t in entry["schema"] if t["row_count_estimated"]]
+    counts = {}
+    try:
+        with pooled_connection(path) as conn:
+            for table in pending:
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM '{table}'").fetchone()[0]
+    except sqlite3.Error:
+        return
+
+    with _schema_lock:
+        # Only publish if the entry is still the current one for this path
+        if _schema_cache.get(path) is not entry:
+            return
+        schema = [
+            {**t, "row_count": counts[t["table_name"]], "row_count_estimated": False}
+            if t["table_name"] in counts else t
+            for t in entry["schema"]
+        ]
+        _schema_cache[path] = {
+            **entry,
+            "schema": schema,
+            "text": format_schema_text(schema),
+            "table_rows": {t["table_name"]: t["row_count"] for t in schema},
+        }
 
 
-def get_schema_text(db_path: str = None) -> str:
+def _cached_schema_entry(db_path: str = None) -> dict:
     """
-    Return schema as formatted text for LLM prompt context.
+    Return the cache entry for a database, rebuilding it only when the file
+    changed and its PRAGMA schema_version moved.
+    """
+    path = db_path or get_db_path()
+    signature = file_signature(path)
+
+    with _schema_lock:
+        entry = _schema_cache.get(path)
+    if entry and entry["signature"] == signature:
+        return entry
+
+    if entry:
+        # File changed: data writes don't bump schema_version, DDL does
+        with pooled_connection(path) as conn:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        if schema_version == entry["schema_version"]:
+            entry = {**entry, "signature": signature}
+            with _schema_lock:
+                _schema_cache[path] = entry
+            return entry
+
+    schema_version, schema = _introspect_schema(path)
+    entry = {
+        "signature": signature,
+        "schema_version": schema_version,
+        "fingerprint": _schema_fingerprint(schema),
+        "table_rows": {t["table_name"]: t["row_count"] for t in schema},
+        "schema": schema,
+        "text": format_schema_text(schema),
+    }
+    with _schema_lock:
+        _schema_cache[path] = entry
+
+    if BACKGROUND_COUNTS and any(t["row_count_estimated"] for t in schema):
+        threading.Thread(target=_refresh_row_counts, args=(path, entry), daemon=True).start()
+    return entry
+
+
+def _schema_fingerprint(schema: list[dict]) -> str:
+    """Hash of the schema structure (tables, columns, FKs), ignoring row counts."""
+    shape = [[t["table_name"], t["columns"], t["foreign_keys"]] for t in schema]
+    return hashlib.sha1(json.dumps(shape, sort_keys=True).encode()).hexdigest()
+
+
+def invalidate_schema_cache(db_path: str = None):
+    """Drop cached schema for one database, or for all when no path is given."""
+    with _schema_lock:
+        if db_path is None:
+            _schema_cache.clear()
+        else:
+            _schema_cache.pop(db_path, None)
+
+
+def get_schema(db_path: str = None) -> list[dict]:
+    """
+    Introspect the database and return schema info.
+    Returns a list of tables with their columns, types, and primary keys.
+    Results are cached per database and invalidated when the schema changes.
     """
-    schema = get_schema(db_path)
+    return _cached_schema_entry(db_path)["schema"]
+
+
+def format_schema_text(schema: list[dict]) -> str:
+    """Format a schema list as CREATE TABLE text for LLM prompt context."""
     lines = []
     for table in schema:
         cols = ", ".join(
@@ -98,35 +394,270 @@ def get_schema_text(db_path: str = None) -> str:
                 lines.append(
                     f"  -- FK: {table['table_name']}.{fk['from_column']} -> {fk['to_table']}.{fk['to_column']}"
                 )
-        lines.append(f"  -- {table['row_count']} rows")
+        approx = "~" if table.get("row_count_estimated") else ""
+        lines.append(f"  -- {approx}{table['row_count']} rows")
         lines.append("")
     return "\n".join(lines)
 
 
-def execute_query(sql: str, db_path: str = None) -> dict[str, Any]:
+def get_schema_text(db_path: str = None) -> str:
     """
-    Safely execute a SQL query and return results.
-    Only SELECT statements are allowed for safety.
+    Return schema as formatted text for LLM prompt context.
+    """
+    return _cached_schema_entry(db_path)["text"]
+
+
+def get_schema_fingerprint(db_path: str = None) -> str:
+    """Return a stable hash of the schema structure, for keying derived caches."""
+    return _cached_schema_entry(db_path)["fingerprint"]
+
+
+# ── Query budgets & cancellation ────────────────────────
+class QueryBudget:
+    """
+    Wall-clock and VM-step limits for one statement, enforced through the
+    connection's progress handler. cancel() aborts the statement from any thread.
+    """
+
+    def __init__(self, timeout: float = None, max_steps: int = None, query_id: str = None):
+        timeout = QUERY_TIMEOUT_SECONDS if timeout is None else timeout
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.timeout = timeout
+        self.max_steps = QUERY_MAX_STEPS if max_steps is None else max_steps
+        self.query_id = query_id
+        self.steps = 0
+        self.reason = None  # "timeout" | "steps" | "cancelled"
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _check(self) -> int:
+        self.steps += PROGRESS_INTERVAL
+        if self.reason:
+            return 1
+        if self.deadline and time.monotonic() > self.deadline:
+            self.reason = "timeout"
+            return 1
+        if self.max_steps and self.steps > self.max_steps:
+            self.reason = "steps"
+            return 1
+        return 0
+
+    def attach(self, conn: sqlite3.Connection):
+        with self._lock:
+            self._conn = conn
+            conn.set_progress_handler(self._check, PROGRESS_INTERVAL)
+        self.register()
+
+    def register(self):
+        """Make the budget cancellable by query_id, with or without a connection attached."""
+        if self.query_id:
+            with _running_lock:
+                _running_queries[self.query_id] = self
+
+    def wait(self, event: threading.Event, poll: float = 0.05) -> bool:
+        """
+        Wait for another thread's work (e.g. an identical query) within this budget.
+        Returns False, with reason set, if time ran out or the query was cancelled first.
+        """
+        self.register()
+        try:
+            while not event.wait(poll):
+                if self.reason:
+                    return False
+                if self.deadline and time.monotonic() > self.deadline:
+                    self.reason = "timeout"
+                    return False
+            return True
+        finally:
+            self.detach()
+
+    def restart(self):
+        """Grant a fresh timeout and step allowance, e.g. for the next page of a long-lived statement."""
+        with self._lock:
+            self.deadline = time.monotonic() + self.timeout if self.timeout else None
+            self.steps = 0
+
+    def detach(self):
+        if self.query_id:
+            with _running_lock:
+                if _running_queries.get(self.query_id) is self:
+                    del _running_queries[self.query_id]
+        with self._lock:
+            if self._conn is not None:
+                self._conn.set_progress_handler(None, 0)
+                self._conn = None
+
+    def cancel(self):
+        with self._lock:
+            self.reason = self.reason or "cancelled"
+            # Only interrupt while attached, so a pooled connection that has
+            # moved on to another query is never hit.
+            if self._conn is not None:
+                self._conn.interrupt()
+
+    def error_message(self) -> Optional[str]:
+        if self.reason == "timeout":
+            return f"Query timed out after {self.timeout:g}s."
+        if self.reason == "steps":
+            return f"Query exceeded its budget of {self.max_steps} VM steps."
+        if self.reason == "cancelled":
+            return "Query was cancelled."
+        return None
+
+
+_running_queries: dict[str, QueryBudget] = {}
+_running_lock = threading.Lock()
+
+
+def cancel_query(query_id: str) -> bool:
+    """Abort a running query by id. Returns False if no such query is running."""
+    with _running_lock:
+        budget = _running_queries.get(query_id)
+    if budget is None:
+        return False
+    budget.cancel()
+    return True
+
+
+def error_result(error: str, budget: QueryBudget = None) -> dict[str, Any]:
+    reason = budget.reason if budget else None
+    return {
+        "success": False,
+        "error": (budget.error_message() if budget else None) or error,
+        "columns": [],
+        "rows": [],
+        "row_count": 0,
+        "timed_out": reason in ("timeout", "steps"),
+        "cancelled": reason == "cancelled",
+    }
+
+
+def _validation_error(conn: sqlite3.Connection, sql_stripped: str, db_path: str = None,
+                      params: list = None) -> Optional[str]:
+    """Run the (cached) safety validator for a statement on a pooled connection."""
+    if not sql_stripped:
+        return READ_ONLY_ERROR
+    path = db_path or get_db_path()
+    entry = _cached_schema_entry(path)
+    return verdict_cache.validate(conn, sql_stripped, (path, entry["fingerprint"]), entry["table_rows"], params)
+
+
+def validate_query(sql: str, db_path: str = None) -> Optional[str]:
+    """Check that SQL is a safe read query without running it. Returns an error message or None."""
+    with pooled_connection(db_path) as conn:
+        return _validation_error(conn, sql.strip().rstrip(";").strip(), db_path)
+
+
+def stream_query(sql: str, db_path: str = None, batch_size: int = STREAM_BATCH_SIZE, params: list = None,
+                 budget: QueryBudget = None):
+    """
+    Execute a read query for streaming, without a row cap.
+    Returns (columns, batches) where batches yields lists of row tuples;
+    batches.send(n) sizes the next batch to n rows instead of batch_size.
+    The pooled connection is held until the batches iterator is exhausted or closed.
+    An optional budget applies to the whole stream, not each batch.
+    Raises ValueError for disallowed SQL and sqlite3.Error for execution errors.
     """
     sql_stripped = sql.strip().rstrip(";").strip()
+    pool = get_pool(db_path)
+    conn = pool.acquire()
+    try:
+        with span("sql_validate"):
+            error = _validation_error(conn, sql_stripped, db_path, params)
+    except BaseException:
+        pool.release(conn)
+        raise
+    if error:
+        pool.release(conn)
+        raise ValueError(error)
 
-    # Basic safety check — only allow SELECT and certain read-only statements
-    first_word = sql_stripped.split()[0].upper() if sql_stripped else ""
-    if first_word not in ("SELECT", "WITH", "EXPLAIN"):
-        return {
-            "success": False,
-            "error": "Only SELECT queries are allowed for safety. Write operations are disabled.",
-            "columns": [],
-            "rows": [],
-            "row_count": 0,
-        }
+    if budget:
+        budget.attach(conn)
+
+    def release():
+        if budget:
+            budget.detach()
+        pool.release(conn)
 
-    conn = get_connection(db_path)
+    cursor = conn.cursor()
+    cursor.row_factory = None  # plain tuples: no per-row dicts
     try:
-        cursor = conn.cursor()
-        cursor.execute(sql_stripped)
-        columns = [description[0] for description in cursor.description] if cursor.description else []
-        rows = [dict(row) for row in cursor.fetchmany(MAX_ROWS)]
+        cursor.execute(sql_stripped, params or [])
+    except sqlite3.Error as e:
+        # Close the statement before the connection goes back to the pool, so
+        # a later finalizer can't block on a connection another thread is using.
+        cursor.close()
+        release()
+        message = budget.error_message() if budget else None
+        if message:
+            raise sqlite3.OperationalError(message) from e
+        raise
+    except BaseException:
+        cursor.close()
+        release()
+        raise
+    columns = [description[0] for description in cursor.description] if cursor.description else []
+
+    def batches():
+        try:
+            size = batch_size
+            while True:
+                batch = cursor.fetchmany(size)
+                if not batch:
+                    return
+                size = (yield batch) or batch_size
+        finally:
+            cursor.close()
+            release()
+
+    return columns, batches()
+
+
+def fetch_rows(sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+               query_id: str = None) -> dict[str, Any]:
+    """
+    Like execute_query, but "rows" is a list of plain tuples (no per-row dicts).
+    Used where results are re-encoded anyway, e.g. by process-pool workers.
+    """
+    sql_stripped = sql.strip().rstrip(";").strip()
+    path = db_path or get_db_path()
+
+    budget = QueryBudget(timeout, max_steps, query_id)
+    try:
+        with pooled_connection(path) as conn:
+            with span("sql_validate"):
+                error = _validation_error(conn, sql_stripped, path)
+            if error:
+                return error_result(error)
+            with span("rollup_rewrite"):
+                rewrite = rollups.rewrite(sql_stripped, path)
+            if rewrite:
+                result = _fetch_rollup(rewrite, budget)
+                if result is not None:
+                    return result
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            rows, failure = [], None
+            budget.attach(conn)
+            started = time.perf_counter()
+            try:
+                with span("sql_execute"):
+                    cursor.execute(sql_stripped)
+                    columns = [description[0] for description in cursor.description] if cursor.description else []
+                    rows = cursor.fetchmany(MAX_ROWS)
+            except sqlite3.Error as e:
+                failure = e
+            finally:
+                elapsed = time.perf_counter() - started
+                budget.detach()
+                # Reset the statement so the pooled connection holds no read transaction
+                cursor.close()
+            if slow_log.is_slow(elapsed):
+                slow_log.record(conn, sql_stripped, path, elapsed, len(rows), budget.steps,
+                                _cached_schema_entry(path)["table_rows"],
+                                failure and error_result(str(failure), budget)["error"])
+            if failure:
+                raise failure
         total = len(rows)
 
         return {
@@ -137,12 +668,49 @@ def execute_query(sql: str, db_path: str = None) -> dict[str, Any]:
             "truncated": total >= MAX_ROWS,
         }
     except sqlite3.Error as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "columns": [],
-            "rows": [],
-            "row_count": 0,
-        }
-    finally:
-        conn.close()
+        return error_result(str(e), budget)
+
+
+def _fetch_rollup(rewrite: dict, budget: QueryBudget) -> Optional[dict[str, Any]]:
+    """Run a query rewritten onto a rollup table; None if that failed and the source should be used."""
+    try:
+        with pooled_connection(rewrite["path"]) as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            budget.attach(conn)
+            try:
+                with span("sql_execute"):
+                    cursor.execute(rewrite["sql"])
+                    columns = [description[0] for description in cursor.description]
+                    rows = cursor.fetchmany(MAX_ROWS)
+            finally:
+                budget.detach()
+                cursor.close()
+    except sqlite3.Error:
+        if budget.reason:
+            raise
+        return None
+    return {
+        "success": True,
+        "columns": columns,
+        "rows": rows,
+        "row_count": len(rows),
+        "truncated": len(rows) >= MAX_ROWS,
+        "rollup": rewrite["rollup"],
+    }
+
+
+def execute_query(sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+                  query_id: str = None) -> dict[str, Any]:
+    """
+    Safely execute a SQL query and return results.
+    Only SELECT statements are allowed for safety.
+    timeout/max_steps default to QUERY_TIMEOUT_SECONDS/QUERY_MAX_STEPS (0 = unlimited);
+    a query_id makes the statement cancellable through cancel_query().
+    """
+    result = fetch_rows(sql, db_path, timeout, max_steps, query_id)
+    if result["success"]:
+        columns = result["columns"]
+        with span("rows_to_dicts"):
+            result["rows"] = [dict(zip(columns, row)) for row in result["rows"]]
+    return result
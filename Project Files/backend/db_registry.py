@@ -0,0 +1,133 @@
+"""
+Registry of named databases for Smart Bridge SQL Querying.
+Requests pick a database by name; each one gets its own connection pool,
+schema cache and history, and idle pools are closed LRU by the database module.
+The registry is a small JSON file so every uvicorn worker sees new uploads.
+"""
+
+import os
+import json
+import threading
+from typing import Optional
+
+from database import DB_DIR, DEFAULT_DB, get_db_path, set_db_path, close_pool, invalidate_schema_cache, open_databases
+
+REGISTRY_PATH = os.getenv("DATABASE_REGISTRY_PATH", os.path.join(DB_DIR, "databases.json"))
+# Extra databases to register at startup: "name=/path/a.db,other=/path/b.db"
+DATABASES = os.getenv("DATABASES", "")
+
+
+class UnknownDatabase(KeyError):
+    pass
+
+
+class DatabaseRegistry:
+    """Maps database names to files, reloading when another worker changes the index."""
+
+    def __init__(self, path: str = REGISTRY_PATH, defaults: dict[str, str] = None):
+        self.path = path
+        self.defaults = defaults or {}
+        self._entries: dict[str, str] = {}
+        self._mtime_ns: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        """Re-read the index if it changed on disk. Caller holds _lock."""
+        try:
+            mtime_ns = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime_ns = None
+        if mtime_ns == self._mtime_ns and self._entries:
+            return
+        entries = dict(self.defaults)
+        if mtime_ns is not None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        self._entries = entries
+        self._mtime_ns = mtime_ns
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        stored = {name: path for name, path in self._entries.items() if self.defaults.get(name) != path}
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(stored, f, indent=1)
+        os.replace(tmp, self.path)
+        self._mtime_ns = os.stat(self.path).st_mtime_ns
+
+    def register(self, name: str, path: str):
+        """Add or repoint a database. Its pool and schema cache are dropped, since the file may be new."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._reload()
+            self._entries[name] = path
+            self._save()
+        close_pool(path)
+        invalidate_schema_cache(path)
+
+    def unregister(self, name: str) -> bool:
+        with self._lock:
+            self._reload()
+            path = self._entries.pop(name, None)
+            if path is None:
+                return False
+            self._save()
+        close_pool(path)
+        invalidate_schema_cache(path)
+        return True
+
+    def resolve(self, name: str = None) -> str:
+        """Path for a database name; the active default database when name is empty."""
+        if not name:
+            return get_db_path()
+        with self._lock:
+            self._reload()
+            path = self._entries.get(name)
+        if path is None:
+            raise UnknownDatabase(name)
+        return path
+
+    def name_of(self, path: str) -> str:
+        """Registered name for a path, falling back to its file name."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._reload()
+            for name, registered in self._entries.items():
+                if registered == path:
+                    return name
+        return os.path.basename(path)
+
+    def activate(self, name: str):
+        """Make a database the default for requests that do not name one."""
+        set_db_path(self.resolve(name))
+
+    def list(self) -> list[dict]:
+        with self._lock:
+            self._reload()
+            entries = dict(self._entries)
+        active = os.path.abspath(get_db_path())
+        open_paths = {os.path.abspath(p) for p in open_databases()}
+        return [
+            {
+                "name": name,
+                "active": path == active,
+                "open": path in open_paths,
+                "size": os.path.getsize(path) if os.path.exists(path) else None,
+            }
+            for name, path in sorted(entries.items())
+        ]
+
+
+def _default_entries() -> dict[str, str]:
+    entries = {os.path.basename(DEFAULT_DB): os.path.abspath(DEFAULT_DB)}
+    for item in filter(None, (part.strip() for part in DATABASES.split(","))):
+        name, _, path = item.partition("=")
+        if name and path:
+            entries[name.strip()] = os.path.abspath(path.strip())
+    return entries
+
+
+registry = DatabaseRegistry(defaults=_default_entries())
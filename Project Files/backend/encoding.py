@@ -0,0 +1,231 @@
+"""
+Compact response encodings for Smart Bridge SQL Querying.
+Query results normally go out as JSON with one object per row, repeating every
+column name in every row. Clients can opt into a leaner shape with ?format=:
+
+    arrays    {"columns": [...], "rows": [[...], ...]}       rows in column order
+    columnar  {"columns": [...], "data": [[...], ...]}       one array per column
+    msgpack   the arrays shape as MessagePack
+    arrow     Arrow IPC stream; the rest of the result rides in the schema metadata
+
+(or send Accept: application/vnd.msgpack / the Arrow media type). Encoded bodies
+over COMPRESS_MIN_BYTES are compressed with the best coding the client accepts:
+zstd, then br, then gzip. orjson, msgpack, zstandard and brotli are optional;
+without them JSON is written by the standard library and the missing formats
+and codings are simply not offered.
+"""
+
+import os
+import gzip
+import json
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+from metrics import span, server_timing
+from streaming import arrow_available, arrow_column, json_default
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional coding
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional coding
+    brotli = None
+
+# Bodies smaller than this are sent as-is: compressing them costs more than it saves
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "3"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+JSON_MEDIA_TYPE = "application/json"
+MEDIA_TYPES = {
+    "json": JSON_MEDIA_TYPE,
+    "arrays": JSON_MEDIA_TYPE,
+    "columnar": JSON_MEDIA_TYPE,
+    "msgpack": "application/vnd.msgpack",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# Accept values that select a binary format when no ?format= is given
+ACCEPT_FORMATS = {
+    "application/vnd.msgpack": "msgpack",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+    "application/vnd.apache.arrow.stream": "arrow",
+}
+ARROW_METADATA_KEY = b"smartbridge"
+
+
+def available_formats() -> list[str]:
+    formats = ["json", "arrays", "columnar"]
+    if msgpack is not None:
+        formats.append("msgpack")
+    if arrow_available():
+        formats.append("arrow")
+    return formats
+
+
+def available_codings() -> list[str]:
+    """Content codings this server can produce, most preferred first."""
+    return [name for name, ok in (("zstd", zstandard), ("br", brotli), ("gzip", True)) if ok]
+
+
+# ── Negotiation ─────────────────────────────────────────
+def _media_ranges(header: str) -> dict[str, float]:
+    """{token: q} for an Accept or Accept-Encoding header."""
+    ranges = {}
+    for part in (header or "").split(","):
+        token, *params = [p.strip() for p in part.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        ranges[token.lower()] = q
+    return ranges
+
+
+def negotiate_format(fmt: Optional[str], accept: str = None) -> Optional[str]:
+    """
+    The result format for a request: ?format= if given, else a binary type
+    named in Accept, else None (the endpoint's default JSON response).
+    Raises ValueError for unknown or unavailable formats.
+    """
+    available = available_formats()
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported format '{fmt}'. Use one of: {', '.join(available)}.")
+        if fmt not in available:
+            package = "msgpack" if fmt == "msgpack" else "pyarrow"
+            raise ValueError(f"The {fmt} format requires the {package} package.")
+        return fmt
+    accepted = _media_ranges(accept)
+    best = max(
+        ((q, ACCEPT_FORMATS[media]) for media, q in accepted.items()
+         if q > 0 and media in ACCEPT_FORMATS and ACCEPT_FORMATS[media] in available),
+        default=None,
+    )
+    return best[1] if best else None
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred content coding the client accepts, or None for identity."""
+    accepted = _media_ranges(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for coding in available_codings():
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+# ── Shaping ─────────────────────────────────────────────
+def dumps(obj) -> bytes:
+    """Compact JSON bytes, with blobs written as hex."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=json_default)
+    return json.dumps(obj, default=json_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _result_of(payload: dict) -> Optional[dict]:
+    """The part of an endpoint payload holding columns/rows: itself, or its nested "results"."""
+    if "rows" in payload:
+        return payload
+    nested = payload.get("results")
+    return nested if isinstance(nested, dict) and "rows" in nested else None
+
+
+def shape(payload: dict, fmt: str) -> dict:
+    """
+    Copy of an endpoint payload whose tuple rows are laid out for fmt.
+    "json" builds row objects, "arrays"/"msgpack" keep row arrays, "columnar" transposes.
+    """
+    result = _result_of(payload)
+    if result is None or not result.get("success"):
+        return payload
+    columns, rows = result["columns"], result["rows"]
+    shaped = dict(result)
+    if fmt == "json":
+        shaped["rows"] = [dict(zip(columns, row)) for row in rows]
+    elif fmt == "columnar":
+        del shaped["rows"]
+        shaped["data"] = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+    return shaped if result is payload else {**payload, "results": shaped}
+
+
+def encode_arrow(payload: dict) -> bytes:
+    """Arrow IPC stream of the result rows; everything else goes in the schema metadata as JSON."""
+    import pyarrow as pa
+
+    result = _result_of(payload)
+    columns = result["columns"] if result and result.get("success") else []
+    rows = result["rows"] if columns else []
+    arrays = [arrow_column([row[i] for row in rows]) for i in range(len(columns))]
+    if result is None:
+        meta = payload
+    elif result is payload:
+        meta = {k: v for k, v in payload.items() if k != "rows"}
+    else:
+        meta = {**payload, "results": {k: v for k, v in result.items() if k != "rows"}}
+    table = pa.Table.from_arrays(arrays, names=columns).replace_schema_metadata({ARROW_METADATA_KEY: dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode(payload: dict, fmt: str) -> bytes:
+    """Body bytes for a payload with tuple rows in the given format."""
+    if fmt == "arrow":
+        return encode_arrow(payload)
+    shaped = shape(payload, fmt)
+    if fmt == "msgpack":
+        return msgpack.packb(shaped, use_bin_type=True)
+    return dumps(shaped)
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+# ── Responses ───────────────────────────────────────────
+def encoded_response(payload: dict, fmt: str, accept_encoding: str = None) -> Response:
+    """A Response carrying payload (tuple rows) as fmt, compressed per Accept-Encoding."""
+    with span("serialize"):
+        body = encode(payload, fmt)
+    headers = {"Vary": "Accept, Accept-Encoding", "X-Result-Format": fmt}
+    coding = choose_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_BYTES else None
+    if coding:
+        with span("compress"):
+            body = compress(body, coding)
+        headers["Content-Encoding"] = coding
+    timing = server_timing()
+    if timing:
+        headers["Server-Timing"] = timing
+    return Response(body, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+
+def info() -> dict[str, Any]:
+    return {"formats": available_formats(), "codings": available_codings(), "fast_json": orjson is not None}
@@ -1,29 +1,144 @@
 """
-Gemini AI service for natural language to SQL translation.
+Natural language to SQL translation through the configured LLM provider
+(Gemini by default; see llm_providers).
 """
 
 import os
 import re
-import google.generativeai as genai
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+from llm_providers import (  # noqa: E402  (after load_dotenv, which they read)
+    LLMProvider, create_provider, LLM_PROVIDER, LLM_FALLBACK_PROVIDER, LLM_TIMEOUT_SECONDS,
+)
+from metrics import span, LLM_REQUESTS, LLM_TOKENS  # noqa: E402
 
-if GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key_here":
-    genai.configure(api_key=GEMINI_API_KEY)
+# Max LLM calls in flight per worker
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+# With a fallback provider, give the primary this long before switching (default: the full timeout)
+LLM_FAILOVER_AFTER_SECONDS = float(os.getenv("LLM_FAILOVER_AFTER_SECONDS", str(LLM_TIMEOUT_SECONDS)))
+# Calls started per second per worker (0 = unlimited), with bursts of up to LLM_RATE_BURST
+LLM_RATE_LIMIT = float(os.getenv("LLM_RATE_LIMIT", "0"))
+LLM_RATE_BURST = int(os.getenv("LLM_RATE_BURST", "10"))
+
+# Provider calls are blocking, so they run on a dedicated bounded pool instead
+# of the event loop (or FastAPI's shared threadpool).
+_executor = None
+provider: LLMProvider = create_provider(LLM_PROVIDER)
+fallback: Optional[LLMProvider] = create_provider(LLM_FALLBACK_PROVIDER) if LLM_FALLBACK_PROVIDER else None
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter (GCRA form). Each acquire reserves the next free slot
+    under a plain lock and then sleeps until it, so it works from any event loop.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tat = 0.0  # theoretical arrival time of the next call
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim a slot; returns how many seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            self._tat = tat + interval
+            return max(0.0, tat - (self.burst - 1) * interval - now)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+rate_limiter = RateLimiter(LLM_RATE_LIMIT, LLM_RATE_BURST)
+
+CODE_BLOCK = re.compile(r"```(?:sql)?\s*\n?(.*?)```", re.DOTALL | re.IGNORECASE)
 
 
 def is_configured() -> bool:
-    """Check if Gemini API is properly configured."""
-    return bool(GEMINI_API_KEY and GEMINI_API_KEY != "your_gemini_api_key_here")
+    """Check if the LLM provider is properly configured."""
+    return provider.is_configured()
+
+
+def init_model():
+    """Set up provider clients once; called at app startup."""
+    for p in (provider, fallback):
+        if p is not None and p.is_configured():
+            p.init()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="gemini")
+    return _executor
+
+
+def shutdown():
+    """Stop accepting new LLM calls and drop queued ones."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def build_prompt(natural_language: str, schema_text: str) -> str:
+    """Build the NL-to-SQL prompt sent to Gemini."""
+    return f"""You are an expert SQL query generator. Given the following SQLite database schema and a natural language question, generate the appropriate SQL query.
+
+DATABASE SCHEMA:
+{schema_text}
+
+RULES:
+1. Generate ONLY valid SQLite SELECT queries. Never generate INSERT, UPDATE, DELETE, DROP, or any write operations.
+2. Use proper JOINs when querying across related tables.
+3. Use aliases for readability.
+4. Limit results to 100 rows unless the user specifies otherwise.
+5. Use aggregate functions (COUNT, SUM, AVG, etc.) when the question implies summarization.
+6. Return the SQL query inside a ```sql code block.
+7. After the SQL block, provide a brief one-line explanation of what the query does.
+
+USER QUESTION: {natural_language}
+
+Generate the SQL query:"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token), for reporting prompt size."""
+    return (len(text) + 3) // 4
+
+
+def _generate_blocking(prompt: str, llm: LLMProvider = None) -> str:
+    """Run the synchronous provider call (executed on the LLM thread pool)."""
+    return (llm or provider).generate(prompt)
+
+
+async def _call(llm: LLMProvider, prompt: str, timeout: float) -> str:
+    # Cancelling this coroutine (timeout or client disconnect) releases the
+    # caller immediately; queued calls are dropped before they start.
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_get_executor(), _generate_blocking, prompt, llm), timeout=timeout
+    )
 
 
 def extract_sql(response_text: str) -> str:
     """Extract SQL query from Gemini response text."""
     # Try to find SQL in code blocks first
-    code_block = re.search(r"```(?:sql)?\s*\n?(.*?)```", response_text, re.DOTALL | re.IGNORECASE)
+    code_block = CODE_BLOCK.search(response_text)
     if code_block:
         return code_block.group(1).strip()
 
@@ -47,9 +162,32 @@ def extract_sql(response_text: str) -> str:
     return response_text.strip().rstrip(";")
 
 
+def closed_sql_block(partial_text: str) -> Optional[str]:
+    """SQL of the first code block in a partial response once its closing fence has arrived, else None."""
+    if partial_text.count("```") < 2:
+        return None
+    code_block = CODE_BLOCK.search(partial_text)
+    return code_block.group(1).strip() if code_block else None
+
+
+def extract_explanation(response_text: str) -> str:
+    """Explanation text after the SQL code block."""
+    parts = response_text.split("```")
+    if len(parts) >= 3:
+        explanation = re.sub(r"^\*\*.*?\*\*\s*", "", parts[-1].strip()).strip()
+        if explanation:
+            return explanation
+    return "Query generated successfully."
+
+
+def _error(message: str) -> dict:
+    return {"sql": "", "explanation": "", "success": False, "error": message}
+
+
 async def generate_sql(natural_language: str, schema_text: str) -> dict:
     """
-    Use Gemini to convert natural language question to SQL query.
+    Use the LLM provider to convert natural language question to SQL query.
+    If a fallback provider is configured it answers when the primary fails or is slow.
 
     Returns:
         dict with keys: sql, explanation, success, error
@@ -59,58 +197,146 @@ async def generate_sql(natural_language: str, schema_text: str) -> dict:
             "sql": "",
             "explanation": "",
             "success": False,
-            "error": "Gemini API key is not configured. Please add your key to the .env file.",
+            "error": provider.not_configured_message(),
         }
 
-    prompt = f"""You are an expert SQL query generator. Given the following SQLite database schema and a natural language question, generate the appropriate SQL query.
-
-DATABASE SCHEMA:
-{schema_text}
-
-RULES:
-1. Generate ONLY valid SQLite SELECT queries. Never generate INSERT, UPDATE, DELETE, DROP, or any write operations.
-2. Use proper JOINs when querying across related tables.
-3. Use aliases for readability.
-4. Limit results to 100 rows unless the user specifies otherwise.
-5. Use aggregate functions (COUNT, SUM, AVG, etc.) when the question implies summarization.
-6. Return the SQL query inside a ```sql code block.
-7. After the SQL block, provide a brief one-line explanation of what the query does.
-
-USER QUESTION: {natural_language}
-
-Generate the SQL query:"""
+    with span("prompt_build"):
+        prompt = build_prompt(natural_language, schema_text)
+    with span("llm_rate_limit"):
+        await rate_limiter.acquire()
 
+    used = provider
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        response_text = response.text
-
-        sql = extract_sql(response_text)
-
-        # Extract explanation (text after the code block)
-        explanation = ""
-        parts = response_text.split("```")
-        if len(parts) >= 3:
-            explanation = parts[-1].strip()
-            # Clean up the explanation
-            explanation = re.sub(r"^\*\*.*?\*\*\s*", "", explanation)
-            explanation = explanation.strip()
-            if not explanation:
-                explanation = "Query generated successfully."
-        else:
-            explanation = "Query generated successfully."
+        with span("llm_call"):
+            if fallback is None:
+                response_text = await _call(provider, prompt, LLM_TIMEOUT_SECONDS)
+            else:
+                try:
+                    response_text = await _call(provider, prompt, LLM_FAILOVER_AFTER_SECONDS)
+                except Exception:
+                    LLM_REQUESTS.inc(1, provider.name, "failover")
+                    used = fallback
+                    response_text = await _call(fallback, prompt, LLM_TIMEOUT_SECONDS)
+        LLM_REQUESTS.inc(1, used.name, "ok")
+        LLM_TOKENS.inc(estimate_tokens(prompt), used.name, "prompt")
+        LLM_TOKENS.inc(estimate_tokens(response_text), used.name, "completion")
+
+        with span("extract_sql"):
+            sql = extract_sql(response_text)
 
         return {
             "sql": sql,
-            "explanation": explanation,
+            "explanation": extract_explanation(response_text),
             "success": True,
             "error": None,
         }
 
+    except asyncio.TimeoutError:
+        LLM_REQUESTS.inc(1, used.name, "timeout")
+        return {
+            "sql": "",
+            "explanation": "",
+            "success": False,
+            "error": f"{used.label} timed out after {LLM_TIMEOUT_SECONDS:g}s.",
+        }
     except Exception as e:
+        LLM_REQUESTS.inc(1, used.name, "error")
         return {
             "sql": "",
             "explanation": "",
             "success": False,
-            "error": f"Gemini API error: {str(e)}",
+            "error": f"{used.label} error: {str(e)}",
         }
+
+
+# ── Streaming ───────────────────────────────────────────
+def _stream_blocking(llm: LLMProvider, prompt: str, emit, stop: threading.Event):
+    """Feed provider.stream() pieces to emit(), then None; an exception is emitted instead of None."""
+    try:
+        for piece in llm.stream(prompt):
+            if stop.is_set():
+                return
+            emit(piece)
+        emit(None)
+    except Exception as e:
+        emit(e)
+
+
+async def stream_sql(natural_language: str, schema_text: str) -> AsyncIterator[dict]:
+    """
+    Streaming form of generate_sql. Yields, as the model writes:
+        {"type": "token", "text": ...}   each piece of the raw response
+        {"type": "sql", "sql": ...}      once, as soon as the SQL code block closes
+        {"type": "done", "result": ...}  the same dict generate_sql returns
+    A fallback provider takes over only if the primary fails or stalls before its first piece.
+    """
+    if not is_configured():
+        yield {"type": "done", "result": _error(provider.not_configured_message())}
+        return
+
+    with span("prompt_build"):
+        prompt = build_prompt(natural_language, schema_text)
+    with span("llm_rate_limit"):
+        await rate_limiter.acquire()
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    deadline = started + LLM_TIMEOUT_SECONDS
+
+    def start(llm: LLMProvider) -> tuple[asyncio.Queue, threading.Event]:
+        # One queue per attempt, so an abandoned primary can't leak pieces into the fallback's stream
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        loop.run_in_executor(_get_executor(), _stream_blocking, llm, prompt,
+                             lambda item: loop.call_soon_threadsafe(queue.put_nowait, item), stop)
+        return queue, stop
+
+    used = provider
+    queue, stop = start(provider)
+    text, sql = "", None
+    try:
+        with span("llm_call"):
+            while True:
+                can_fail_over = not text and fallback is not None and used is provider
+                until = min(deadline, started + LLM_FAILOVER_AFTER_SECONDS) if can_fail_over else deadline
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=max(0.0, until - loop.time()))
+                except asyncio.TimeoutError as e:
+                    item = e
+                if isinstance(item, Exception):
+                    if not can_fail_over:
+                        raise item
+                    LLM_REQUESTS.inc(1, provider.name, "failover")
+                    stop.set()
+                    used = fallback
+                    deadline = loop.time() + LLM_TIMEOUT_SECONDS
+                    queue, stop = start(fallback)
+                    continue
+                if item is None:
+                    break
+                text += item
+                yield {"type": "token", "text": item}
+                if sql is None:
+                    sql = closed_sql_block(text)
+                    if sql:
+                        yield {"type": "sql", "sql": sql}
+    except asyncio.TimeoutError:
+        LLM_REQUESTS.inc(1, used.name, "timeout")
+        yield {"type": "done", "result": _error(f"{used.label} timed out after {LLM_TIMEOUT_SECONDS:g}s.")}
+        return
+    except Exception as e:
+        LLM_REQUESTS.inc(1, used.name, "error")
+        yield {"type": "done", "result": _error(f"{used.label} error: {str(e)}")}
+        return
+    finally:
+        stop.set()
+
+    LLM_REQUESTS.inc(1, used.name, "ok")
+    LLM_TOKENS.inc(estimate_tokens(prompt), used.name, "prompt")
+    LLM_TOKENS.inc(estimate_tokens(text), used.name, "completion")
+    yield {"type": "done", "result": {
+        "sql": extract_sql(text),
+        "explanation": extract_explanation(text),
+        "success": True,
+        "error": None,
+    }}
@@ -0,0 +1,246 @@
+"""
+Persistent query history for Smart Bridge SQL Querying.
+Entries live in a separate SQLite file shared by all uvicorn workers.
+Appends are queued and written in batches by a background thread, so the
+request path never waits on disk.
+"""
+
+import os
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "data")
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", os.path.join(DB_DIR, "history.db"))
+# Retention: keep at most this many entries / days (0 = unlimited)
+HISTORY_MAX_ROWS = int(os.getenv("HISTORY_MAX_ROWS", "100000"))
+HISTORY_MAX_AGE_DAYS = float(os.getenv("HISTORY_MAX_AGE_DAYS", "0"))
+
+BATCH_SIZE = 256
+FLUSH_INTERVAL_SECONDS = 0.2
+COMPACT_INTERVAL_SECONDS = 300
+
+_COLUMNS = ("db", "question", "sql", "explanation", "success", "row_count", "timed_out", "cancelled", "timestamp",
+            "job_id")
+
+
+class HistoryStore:
+    """Append-only history table with batched background writes."""
+
+    def __init__(self, path: str = HISTORY_DB_PATH, max_rows: int = HISTORY_MAX_ROWS,
+                 max_age_days: float = HISTORY_MAX_AGE_DAYS):
+        self.path = path
+        self.max_rows = max_rows
+        self.max_age_days = max_age_days
+        self._queue: queue.Queue = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._read_lock = threading.Lock()
+
+    # ── Setup ───────────────────────────────────────────
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self, conn: sqlite3.Connection):
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                db TEXT NOT NULL DEFAULT '',
+                question TEXT NOT NULL,
+                sql TEXT,
+                explanation TEXT,
+                success INTEGER NOT NULL,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                timed_out INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                timestamp TEXT NOT NULL,
+                job_id TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_history_question ON history(question COLLATE NOCASE);
+        """)
+        # Files created before per-database history have no db column
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(history)")}
+        if "db" not in columns:
+            conn.execute("ALTER TABLE history ADD COLUMN db TEXT NOT NULL DEFAULT ''")
+        # ... and entries answered before async jobs have no job_id
+        if "job_id" not in columns:
+            conn.execute("ALTER TABLE history ADD COLUMN job_id TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_history_db ON history(db, id)")
+
+    def start(self):
+        """Create the history file if needed and start the writer thread."""
+        with self._start_lock:
+            if self._writer and self._writer.is_alive():
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = self._connect()
+            self._init_db(conn)
+            conn.close()
+            self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+            self._writer.start()
+
+    def stop(self):
+        """Flush pending entries and stop the writer."""
+        if self._writer and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=10)
+        self._writer = None
+        with self._read_lock:
+            if self._read_conn:
+                self._read_conn.close()
+                self._read_conn = None
+
+    # ── Writes ──────────────────────────────────────────
+    def append(self, entry: dict):
+        """Queue an entry for writing; returns immediately."""
+        self.start()
+        self._queue.put(entry)
+
+    def flush(self):
+        """Block until every queued entry is on disk."""
+        if self._writer and self._writer.is_alive():
+            self._queue.join()
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_compact = 0.0
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + FLUSH_INTERVAL_SECONDS
+            while len(batch) < BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            entries = [e for e in batch if e is not None]
+            running = len(entries) == len(batch)
+            try:
+                if entries:
+                    with conn:
+                        conn.executemany(
+                            f"INSERT INTO history ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                            [self._row(e) for e in entries],
+                        )
+                if time.monotonic() - last_compact > COMPACT_INTERVAL_SECONDS:
+                    self._compact(conn)
+                    last_compact = time.monotonic()
+            except sqlite3.Error:
+                pass  # history is best-effort; never take the writer down
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    @staticmethod
+    def _row(entry: dict) -> tuple:
+        return (
+            entry.get("db", ""),
+            entry["question"],
+            entry.get("sql", ""),
+            entry.get("explanation", ""),
+            int(bool(entry.get("success", True))),
+            entry.get("row_count", 0),
+            int(bool(entry.get("timed_out", False))),
+            int(bool(entry.get("cancelled", False))),
+            entry.get("timestamp") or datetime.now().isoformat(),
+            entry.get("job_id"),
+        )
+
+    def _compact(self, conn: sqlite3.Connection):
+        """Apply the retention policy and return freed pages to the OS."""
+        with conn:
+            if self.max_age_days:
+                cutoff = (datetime.now() - timedelta(days=self.max_age_days)).isoformat()
+                conn.execute("DELETE FROM history WHERE timestamp < ?", (cutoff,))
+            if self.max_rows:
+                conn.execute(
+                    "DELETE FROM history WHERE id <= (SELECT id FROM history ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+        conn.execute("PRAGMA incremental_vacuum")
+
+    def compact(self):
+        """Run retention immediately (normally done by the writer every few minutes)."""
+        self.start()
+        conn = self._connect()
+        try:
+            self._compact(conn)
+        finally:
+            conn.close()
+
+    # ── Reads ───────────────────────────────────────────
+    def _reader(self) -> sqlite3.Connection:
+        if self._read_conn is None:
+            self.start()
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    def query(self, limit: int = 50, before_id: int = None, q: str = None, success: bool = None,
+              since: str = None, until: str = None, db: str = None) -> list[dict]:
+        """
+        Return entries newest first. Page with before_id (the last id of the
+        previous page); filter by database, question substring, outcome and ISO timestamp range.
+        """
+        clauses, params = [], []
+        if db is not None:
+            clauses.append("db = ?")
+            params.append(db)
+        if before_id is not None:
+            clauses.append("id < ?")
+            params.append(before_id)
+        if q:
+            clauses.append("question LIKE ? ESCAPE '\\'")
+            escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(int(success))
+        if since:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        self.flush()
+        with self._read_lock:
+            rows = self._reader().execute(
+                f"SELECT id, {', '.join(_COLUMNS)} FROM history {where} ORDER BY id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [
+            {**dict(row), "success": bool(row["success"]), "timed_out": bool(row["timed_out"]),
+             "cancelled": bool(row["cancelled"])}
+            for row in rows
+        ]
+
+    def count(self, db: str = None) -> int:
+        self.flush()
+        where, params = ("WHERE db = ?", (db,)) if db is not None else ("", ())
+        with self._read_lock:
+            return self._reader().execute(f"SELECT COUNT(*) FROM history {where}", params).fetchone()[0]
+
+    def clear(self, db: str = None):
+        """Delete the history of one database, or all of it when no db is given."""
+        self.flush()
+        where, params = ("WHERE db = ?", (db,)) if db is not None else ("", ())
+        with self._read_lock:
+            with self._reader() as conn:
+                conn.execute(f"DELETE FROM history {where}", params)
+
+
+history = HistoryStore()
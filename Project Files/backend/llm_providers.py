@@ -0,0 +1,275 @@
+"""
+LLM backends for Smart Bridge SQL Querying.
+generate_sql talks to a provider chosen by LLM_PROVIDER:
+
+  gemini   Google Gemini via google-generativeai (default)
+  openai   any OpenAI-compatible /v1/chat/completions server (llama.cpp, vLLM, Ollama, ...)
+  replay   serves recorded responses from LLM_REPLAY_DIR with injected latency; offline and deterministic
+  record   calls LLM_RECORD_UPSTREAM and saves every response to LLM_REPLAY_DIR for later replay
+
+Providers are blocking; gemini_service runs them on its own thread pool.
+"""
+
+import os
+import abc
+import json
+import time
+import random
+import hashlib
+import urllib.request
+from typing import Iterator, Optional
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini").lower()
+# Used when the primary provider errors or exceeds LLM_FAILOVER_AFTER_SECONDS (empty = no failover)
+LLM_FALLBACK_PROVIDER = os.getenv("LLM_FALLBACK_PROVIDER", "").lower()
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Alternate API host (REST transport), e.g. the benchmark stub: "http://127.0.0.1:8089"
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:8080/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "local-model")
+
+LLM_REPLAY_DIR = os.getenv("LLM_REPLAY_DIR", os.path.join(os.path.dirname(__file__), "data", "llm_recordings"))
+LLM_REPLAY_LATENCY_MS = float(os.getenv("LLM_REPLAY_LATENCY_MS", "0"))
+LLM_REPLAY_JITTER_MS = float(os.getenv("LLM_REPLAY_JITTER_MS", "0"))
+# On a replay miss: "error", or "stub" to answer with a fixed schema-agnostic query
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "error").lower()
+LLM_RECORD_UPSTREAM = os.getenv("LLM_RECORD_UPSTREAM", "gemini").lower()
+
+STUB_RESPONSE = (
+    "```sql\nSELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name\n```\n"
+    "Offline stub response: lists the tables in the database."
+)
+
+
+class ProviderError(Exception):
+    pass
+
+
+class LLMProvider(abc.ABC):
+    """Interface: generate() returns the full response text; stream() yields it in pieces."""
+
+    name = "base"
+    label = "LLM"
+
+    def is_configured(self) -> bool:
+        return True
+
+    def not_configured_message(self) -> str:
+        return f"{self.label} provider is not configured."
+
+    def init(self):
+        """Warm up clients; called at app startup."""
+
+    @abc.abstractmethod
+    def generate(self, prompt: str) -> str:
+        """The full response text for a prompt."""
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield self.generate(prompt)
+
+
+# ── Gemini ──────────────────────────────────────────────
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+    label = "Gemini API"
+
+    def __init__(self, api_key: str = GEMINI_API_KEY, model: str = GEMINI_MODEL, endpoint: str = GEMINI_API_ENDPOINT):
+        self.api_key = api_key
+        self.model_name = model
+        self.endpoint = endpoint
+        self._model = None
+
+    def is_configured(self) -> bool:
+        return bool(self.api_key and self.api_key != "your_gemini_api_key_here")
+
+    def not_configured_message(self) -> str:
+        return "Gemini API key is not configured. Please add your key to the .env file."
+
+    def init(self):
+        if self._model is None and self.is_configured():
+            import google.generativeai as genai
+
+            if self.endpoint:
+                genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": self.endpoint})
+            else:
+                genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def generate(self, prompt: str) -> str:
+        response = self.init().generate_content(prompt, request_options={"timeout": LLM_TIMEOUT_SECONDS})
+        return response.text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        response = self.init().generate_content(prompt, stream=True, request_options={"timeout": LLM_TIMEOUT_SECONDS})
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+# ── OpenAI-compatible HTTP ──────────────────────────────
+class OpenAICompatibleProvider(LLMProvider):
+    """Chat-completions client on urllib, so local model servers need no extra SDK."""
+
+    name = "openai"
+    label = "OpenAI-compatible API"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: str = OPENAI_API_KEY, model: str = OPENAI_MODEL):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+
+    def is_configured(self) -> bool:
+        return bool(self.base_url)
+
+    def _request(self, prompt: str, stream: bool):
+        body = json.dumps({
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0,
+            "stream": stream,
+        }).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(f"{self.base_url}/chat/completions", data=body, headers=headers)
+        try:
+            return urllib.request.urlopen(request, timeout=LLM_TIMEOUT_SECONDS)
+        except urllib.error.HTTPError as e:
+            raise ProviderError(f"HTTP {e.code}: {e.read(500).decode(errors='replace')}") from e
+
+    def generate(self, prompt: str) -> str:
+        with self._request(prompt, stream=False) as response:
+            payload = json.load(response)
+        try:
+            return payload["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise ProviderError(f"Unexpected response: {str(payload)[:200]}")
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        with self._request(prompt, stream=True) as response:
+            for raw in response:
+                line = raw.decode().strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+
+# ── Record / replay ─────────────────────────────────────
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+class ReplayProvider(LLMProvider):
+    """Serves responses recorded for the exact same prompt, after an injected delay."""
+
+    name = "replay"
+    label = "Replay"
+
+    def __init__(self, directory: str = LLM_REPLAY_DIR, latency_ms: float = LLM_REPLAY_LATENCY_MS,
+                 jitter_ms: float = LLM_REPLAY_JITTER_MS, miss: str = LLM_REPLAY_MISS):
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.miss = miss
+
+    def _path(self, prompt: str) -> str:
+        return os.path.join(self.directory, f"{prompt_key(prompt)}.json")
+
+    def _delay(self) -> float:
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        try:
+            with open(self._path(prompt), "r", encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _response(self, prompt: str) -> str:
+        response = self.lookup(prompt)
+        if response is None:
+            if self.miss != "stub":
+                raise ProviderError(f"No recording for this prompt ({prompt_key(prompt)[:12]}) in {self.directory}.")
+            response = STUB_RESPONSE
+        return response
+
+    def generate(self, prompt: str) -> str:
+        response = self._response(prompt)
+        time.sleep(self._delay())
+        return response
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        response = self._response(prompt)
+        # Spend the delay before the first piece, like time-to-first-token
+        time.sleep(self._delay())
+        for i in range(0, len(response), 16):
+            yield response[i:i + 16]
+
+
+class RecordingProvider(LLMProvider):
+    """Pass-through to an upstream provider that saves each response for ReplayProvider."""
+
+    name = "record"
+
+    def __init__(self, upstream: LLMProvider, directory: str = LLM_REPLAY_DIR):
+        self.upstream = upstream
+        self.directory = directory
+        self.label = upstream.label
+
+    def is_configured(self) -> bool:
+        return self.upstream.is_configured()
+
+    def not_configured_message(self) -> str:
+        return self.upstream.not_configured_message()
+
+    def init(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.upstream.init()
+
+    def _save(self, prompt: str, response: str):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{prompt_key(prompt)}.json")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"provider": self.upstream.name, "recorded_at": time.time(), "prompt": prompt,
+                       "response": response}, f, indent=1)
+        os.replace(tmp, path)
+
+    def generate(self, prompt: str) -> str:
+        response = self.upstream.generate(prompt)
+        self._save(prompt, response)
+        return response
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        pieces = []
+        for piece in self.upstream.stream(prompt):
+            pieces.append(piece)
+            yield piece
+        self._save(prompt, "".join(pieces))
+
+
+def create_provider(name: str) -> LLMProvider:
+    """Build a provider by LLM_PROVIDER name."""
+    if name == "gemini":
+        return GeminiProvider()
+    if name == "openai":
+        return OpenAICompatibleProvider()
+    if name == "replay":
+        return ReplayProvider()
+    if name == "record":
+        if LLM_RECORD_UPSTREAM == "record":
+            raise ValueError("LLM_RECORD_UPSTREAM cannot be 'record'.")
+        return RecordingProvider(create_provider(LLM_RECORD_UPSTREAM))
+    raise ValueError(f"Unknown LLM provider '{name}'. Use gemini, openai, replay or record.")
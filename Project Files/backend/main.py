@@ -5,21 +5,102 @@ FastAPI Backend Server
 
 import os
 import json
+import uuid
 import shutil
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from typing import Optional
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import sqlite3
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 
-from database import get_schema, get_schema_text, execute_query, set_db_path, get_db_path, DB_DIR
-from gemini_service import generate_sql, is_configured
+from database import (
+    get_schema, get_schema_text, get_schema_fingerprint, stream_query, get_db_path,
+    open_databases, pool_stats, close_pool, cancel_query, error_result, QueryBudget, DB_DIR, MAX_ROWS,
+    QUERY_TIMEOUT_SECONDS, QUERY_MAX_STEPS,
+)
+import cursors
+from nl_cache import sql_cache, normalize_question
+from history_store import history
+from result_cache import result_cache
+import process_pool
+import metrics
+from metrics import span, with_timings, observe_rows, TimedJSONResponse, TimingMiddleware
+from db_registry import registry as databases, UnknownDatabase
+from uploads import uploads, receive, safe_filename, UploadTooLarge
+from sql_guard import verdict_cache
+from slow_queries import slow_log, SLOW_QUERY_ADMIN
+from rollups import rollups
+from sampling import samples
+from streaming import ENCODERS, FORMATS, SSE_MEDIA_TYPE, arrow_available, ndjson_line, sse_event
+from query_jobs import jobs, JobQueueFull, TERMINAL as JOB_TERMINAL
+import encoding
+from encoding import negotiate_format, encoded_response
+import gemini_service
+from gemini_service import generate_sql, stream_sql, is_configured, build_prompt, estimate_tokens
+from schema_retrieval import select_schema
+
+# How often a pending request checks whether its client has gone away
+DISCONNECT_POLL_SECONDS = 0.5
+MAX_PAGE_SIZE = 10000
+
+# Per-endpoint query budgets: (wall-clock seconds, SQLite VM steps); 0 = unlimited
+QUERY_BUDGETS = {
+    "query": (
+        float(os.getenv("QUERY_ENDPOINT_TIMEOUT_SECONDS", QUERY_TIMEOUT_SECONDS)),
+        int(os.getenv("QUERY_ENDPOINT_MAX_STEPS", QUERY_MAX_STEPS)),
+    ),
+    "execute": (
+        float(os.getenv("EXECUTE_TIMEOUT_SECONDS", QUERY_TIMEOUT_SECONDS)),
+        int(os.getenv("EXECUTE_MAX_STEPS", QUERY_MAX_STEPS)),
+    ),
+    "stream": (
+        float(os.getenv("STREAM_TIMEOUT_SECONDS", "300")),
+        int(os.getenv("STREAM_MAX_STEPS", "0")),
+    ),
+}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    gemini_service.init_model()
+    history.start()
+    loop = asyncio.get_running_loop()
+    jobs.start(
+        lambda question, db_path: asyncio.run_coroutine_threadsafe(
+            generate_or_cached(question, None, db_path), loop
+        ).result(),
+        on_finished=record_job_history,
+    )
+    def sources():
+        return [(entry["name"], databases.resolve(entry["name"])) for entry in databases.list()]
+
+    rollups.start(sources)
+    samples.start(sources)
+    yield
+    samples.stop()
+    rollups.stop()
+    jobs.stop()
+    cursors.registry.close_all()
+    result_cache.close()
+    process_pool.shutdown()
+    history.stop()
+    gemini_service.shutdown()
+
 
 app = FastAPI(
     title="Smart Bridge SQL API",
     description="Intelligent natural language to SQL querying",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=TimedJSONResponse,
 )
 
 # CORS
@@ -30,19 +111,349 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TimingMiddleware)
 
-# In-memory query history
-query_history: list[dict] = []
+MAX_HISTORY_PAGE = 500
+MAX_BATCH_QUESTIONS = int(os.getenv("MAX_BATCH_QUESTIONS", "500"))
+# Questions of one batch waiting on the LLM at once (the rate limiter still applies)
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+JOB_EVENTS_POLL_SECONDS = 0.5
+# Rows per "rows" event of /api/query/sse; small so the first rows go out quickly
+SSE_ROW_BATCH = 100
 
 
 # ── Models ──────────────────────────────────────────────
 class QueryRequest(BaseModel):
     question: str
     execute: bool = True  # whether to also execute the generated SQL
+    query_id: Optional[str] = None  # client-chosen id for cancellation
+    db: Optional[str] = None  # registered database name; defaults to the active one
+    approximate: bool = False  # estimate aggregates from table samples when possible (see sampling.py)
+
+
+class BatchQueryRequest(BaseModel):
+    questions: list[str]
+    execute: bool = True
+    db: Optional[str] = None
 
 
 class DirectSQLRequest(BaseModel):
     sql: str
+    query_id: Optional[str] = None
+    db: Optional[str] = None
+    paginate: bool = False  # return a cursor token to page through large results
+    page_size: int = MAX_ROWS
+    approximate: bool = False  # ignored with paginate
+
+
+class JobRequest(BaseModel):
+    question: Optional[str] = None  # exactly one of question / sql
+    sql: Optional[str] = None
+    db: Optional[str] = None
+    priority: int = 0  # higher runs sooner
+    user: Optional[str] = None  # fairness key; defaults to X-User-Id, then the client address
+
+
+# ── Helpers ─────────────────────────────────────────────
+def resolve_db(name: Optional[str]) -> tuple[str, str]:
+    """Map a request's db parameter to (name, path); 404 for unknown names."""
+    try:
+        path = databases.resolve(name)
+    except UnknownDatabase:
+        raise HTTPException(status_code=404, detail=f"Unknown database '{name}'.")
+    return name or databases.name_of(path), path
+
+
+async def run_until_disconnect(request: Request, coro, on_disconnect=None):
+    """
+    Await a coroutine, cancelling it if the HTTP client disconnects first.
+    on_disconnect is called as well, to stop work running outside the event loop.
+    Raises HTTPException(499) when the client went away.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                if on_disconnect:
+                    on_disconnect()
+                raise HTTPException(status_code=499, detail="Client disconnected.")
+    except asyncio.CancelledError:
+        task.cancel()
+        if on_disconnect:
+            on_disconnect()
+        raise
+
+
+def result_format(format: Optional[str], request: Request) -> Optional[str]:
+    """The compact result format a request asked for (see encoding.py), or None for plain JSON."""
+    try:
+        return negotiate_format(format, request.headers.get("accept"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def respond(result: dict, fmt: Optional[str], request: Request):
+    """An endpoint result as-is, or encoded in the negotiated compact format (rows must be tuples)."""
+    if fmt is None:
+        return result
+    return encoded_response(result, fmt, request.headers.get("accept-encoding"))
+
+
+async def run_query(request: Request, sql: str, endpoint: str, query_id: str = None, db_path: str = None,
+                    as_dicts: bool = True, approximate: bool = False) -> dict:
+    """
+    Execute SQL in the threadpool under the endpoint's budget. The query is
+    cancelled if the client disconnects; the result carries its query_id and
+    the mode ("exact" or "approximate") that produced it. Approximate queries
+    that can't be answered from a sample run exactly, saying why.
+    """
+    query_id = query_id or uuid.uuid4().hex
+    timeout, max_steps = QUERY_BUDGETS[endpoint]
+    fallback = {"mode": "exact"}
+    if approximate:
+        with span("approximate"):
+            result = await run_until_disconnect(
+                request,
+                run_in_threadpool(samples.execute, sql, db_path, timeout, max_steps, query_id, as_dicts),
+                on_disconnect=lambda: cancel_query(query_id),
+            )
+        if "success" in result:
+            observe_rows(endpoint, result)
+            return {**result, "query_id": query_id}
+        fallback = result
+    with span("execute"):
+        result = await run_until_disconnect(
+            request,
+            run_in_threadpool(result_cache.execute, sql, db_path, timeout, max_steps, query_id, as_dicts),
+            on_disconnect=lambda: cancel_query(query_id),
+        )
+    observe_rows(endpoint, result)
+    return {**result, **fallback, "query_id": query_id}
+
+
+async def load_schema_context(db_path: str = None) -> dict:
+    """Fingerprint, schema and prompt text for a database (all served from the schema cache)."""
+    return {
+        "fingerprint": await run_in_threadpool(get_schema_fingerprint, db_path),
+        "schema": await run_in_threadpool(get_schema, db_path),
+        "text": await run_in_threadpool(get_schema_text, db_path),
+    }
+
+
+async def select_prompt_schema(question: str, fingerprint: str, db_path: str = None,
+                               context: dict = None) -> tuple[dict, dict]:
+    """(schema context, the part of the schema to put in the prompt) for a question."""
+    if context is None:
+        with span("schema"):
+            context = await load_schema_context(db_path)
+    with span("schema_select"):
+        selection = select_schema(question, context["schema"], fingerprint, context["text"])
+    return context, selection
+
+
+def prompt_token_report(question: str, schema_text: str, selection: dict) -> dict:
+    return {
+        "full_schema": estimate_tokens(build_prompt(question, schema_text)),
+        "sent": estimate_tokens(build_prompt(question, selection["text"])),
+        "compacted": selection["compacted"],
+        "tables": selection["tables"],
+    }
+
+
+async def generate_or_cached(question: str, request: Optional[Request], db_path: str = None,
+                             context: dict = None) -> tuple[dict, bool]:
+    """
+    Generate SQL for a question, reusing a cached answer for this schema. Returns (result, cached).
+    Pass a preloaded schema context to skip the lookups; with no request the
+    call is not tied to a client connection.
+    """
+    if context is None:
+        with span("schema_fingerprint"):
+            fingerprint = await run_in_threadpool(get_schema_fingerprint, db_path)
+    else:
+        fingerprint = context["fingerprint"]
+    with span("nl_cache"):
+        result = sql_cache.get(question, fingerprint)
+    if result is not None:
+        return {**result, "success": True, "error": None}, True
+
+    context, selection = await select_prompt_schema(question, fingerprint, db_path, context)
+    if request is not None:
+        result = await run_until_disconnect(request, generate_sql(question, selection["text"]))
+    else:
+        result = await generate_sql(question, selection["text"])
+    result["prompt_tokens"] = prompt_token_report(question, context["text"], selection)
+    if result["success"] and result["sql"]:
+        sql_cache.put(question, fingerprint, result["sql"], result["explanation"])
+    return result, False
+
+
+def record_history(db_name: str, question: str, sql: str, explanation: str, exec_result: dict = None,
+                   job_id: str = None):
+    """Queue a history entry for an answered question."""
+    history.append({
+        "db": db_name,
+        "question": question,
+        "sql": sql,
+        "explanation": explanation,
+        "success": exec_result["success"] if exec_result else True,
+        "row_count": exec_result["row_count"] if exec_result else 0,
+        "timed_out": exec_result.get("timed_out", False) if exec_result else False,
+        "cancelled": exec_result.get("cancelled", False) if exec_result else False,
+        "timestamp": datetime.now().isoformat(),
+        "job_id": job_id,
+    })
+
+
+def record_job_history(job: dict):
+    """History entry for a finished question job, linked by job_id."""
+    if not job["question"]:
+        return
+    record_history(job["db"], job["question"], job["sql"] or "", job["explanation"] or "", {
+        "success": job["status"] == "succeeded",
+        "row_count": job["row_count"],
+        "timed_out": job["timed_out"],
+        "cancelled": job["status"] == "cancelled",
+    }, job_id=job["job_id"])
+
+
+async def stream_sql_response(sql: str, fmt: str, meta: dict = None, db_path: str = None) -> StreamingResponse:
+    """
+    Start a query and stream its full result in the requested format.
+    The statement is executed before the response starts, so SQL errors
+    still come back as a normal 400.
+    """
+    if fmt not in ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{fmt}'. Use one of: {', '.join(ENCODERS)}.")
+    if fmt == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow output requires the pyarrow package.")
+    budget = QueryBudget(*QUERY_BUDGETS["stream"], query_id=uuid.uuid4().hex)
+    try:
+        columns, batches = await run_in_threadpool(stream_query, sql, db_path, budget=budget)
+    except (ValueError, sqlite3.Error) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        ENCODERS[fmt](columns, batches, meta), media_type=FORMATS[fmt], headers={"X-Query-Id": budget.query_id}
+    )
+
+
+async def sse_rows(sql: str, db_path: str, budget: QueryBudget, events: asyncio.Queue) -> dict:
+    """
+    Run a query for /api/query/sse, putting "columns" and "rows" events on the
+    queue (up to MAX_ROWS rows, like /api/query). Returns the execution summary.
+    """
+    try:
+        columns, batches = await run_in_threadpool(stream_query, sql, db_path, SSE_ROW_BATCH, budget=budget)
+    except (ValueError, sqlite3.Error) as e:
+        return error_result(str(e), budget)
+    row_count = 0
+    try:
+        events.put_nowait(sse_event("columns", {"columns": columns}))
+        while row_count < MAX_ROWS:
+            batch = await run_in_threadpool(next, batches, None)
+            if batch is None:
+                break
+            batch = batch[:MAX_ROWS - row_count]
+            row_count += len(batch)
+            events.put_nowait(sse_event("rows", {"rows": batch}))
+    except sqlite3.Error as e:
+        return {**error_result(str(e), budget), "row_count": row_count}
+    finally:
+        try:
+            batches.close()
+        except ValueError:
+            pass  # still inside next() on a worker thread; the budget's interrupt ends it
+    return {"success": True, "error": None, "row_count": row_count, "truncated": row_count >= MAX_ROWS,
+            "timed_out": False, "cancelled": False}
+
+
+async def query_events(question: str, execute: bool, db_name: str, db_path: str, query_id: str):
+    """
+    Server-Sent Events for /api/query/sse. The LLM stream and the query run as
+    two producers feeding one queue; the query starts as soon as the SQL code
+    block closes, so rows can arrive before the explanation has finished.
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    budget = QueryBudget(*QUERY_BUDGETS["query"], query_id=query_id)
+    executions: list[asyncio.Task] = []
+    producers = [1]  # still running; each puts None on the queue when it ends
+
+    def start_execution(sql: str, cached: bool):
+        events.put_nowait(sse_event("sql", {"sql": sql, "cached": cached}))
+        if execute and not executions:
+            producers[0] += 1
+            task = asyncio.ensure_future(sse_rows(sql, db_path, budget, events))
+            task.add_done_callback(lambda _: events.put_nowait(None))
+            executions.append(task)
+
+    async def generate() -> tuple[dict, bool]:
+        try:
+            with span("schema_fingerprint"):
+                fingerprint = await run_in_threadpool(get_schema_fingerprint, db_path)
+            with span("nl_cache"):
+                cached = sql_cache.get(question, fingerprint)
+            if cached is not None:
+                start_execution(cached["sql"], True)
+                return {**cached, "success": True, "error": None}, True
+
+            context, selection = await select_prompt_schema(question, fingerprint, db_path)
+            result = None
+            async for event in stream_sql(question, selection["text"]):
+                if event["type"] == "token":
+                    events.put_nowait(sse_event("token", {"text": event["text"]}))
+                elif event["type"] == "sql":
+                    start_execution(event["sql"], False)
+                else:
+                    result = event["result"]
+            if result["success"] and result["sql"]:
+                sql_cache.put(question, fingerprint, result["sql"], result["explanation"])
+                if not executions:
+                    start_execution(result["sql"], False)  # no fenced block; found in the full text
+            result["prompt_tokens"] = prompt_token_report(question, context["text"], selection)
+            return result, False
+        except Exception as e:
+            return {"sql": "", "explanation": "", "success": False, "error": str(e)}, False
+        finally:
+            events.put_nowait(None)
+
+    llm = asyncio.ensure_future(generate())
+    try:
+        yield sse_event("meta", {"db": db_name, "question": question, "query_id": query_id})
+        while producers[0]:
+            event = await events.get()
+            if event is None:
+                producers[0] -= 1
+            else:
+                yield event
+
+        result, cached = llm.result()
+        exec_result = executions[0].result() if executions else None
+        if result["success"]:
+            with span("history"):
+                record_history(db_name, question, result["sql"], result["explanation"], exec_result)
+        observe_rows("query", exec_result)
+        yield sse_event("done", {
+            "success": result["success"] and (exec_result is None or exec_result["success"]),
+            "error": result["error"] or (exec_result or {}).get("error"),
+            "sql": result["sql"],
+            "explanation": result["explanation"],
+            "cached": cached,
+            "prompt_tokens": result.get("prompt_tokens"),
+            "row_count": exec_result["row_count"] if exec_result else 0,
+            "truncated": exec_result.get("truncated", False) if exec_result else False,
+            "timed_out": exec_result.get("timed_out", False) if exec_result else False,
+            "cancelled": exec_result.get("cancelled", False) if exec_result else False,
+        })
+    finally:
+        # Client went away (or we are done): stop both producers
+        budget.cancel()
+        llm.cancel()
+        for task in executions:
+            task.cancel()
 
 
 # ── Endpoints ───────────────────────────────────────────
@@ -53,40 +464,45 @@ def root():
         "app": "Smart Bridge — Intelligent SQL Querying",
         "status": "running",
         "gemini_configured": is_configured(),
+        "llm_provider": gemini_service.provider.name,
     }
 
 
 @app.get("/api/schema")
-def api_get_schema():
+def api_get_schema(db: Optional[str] = None):
     """Return the database schema (tables, columns, types, foreign keys)."""
+    name, path = resolve_db(db)
     try:
-        schema = get_schema()
-        return {"success": True, "schema": schema, "db_path": os.path.basename(get_db_path())}
+        schema = get_schema(path)
+        return {"success": True, "schema": schema, "db_path": os.path.basename(path), "db": name}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/query")
-async def api_query(req: QueryRequest):
+async def api_query(req: QueryRequest, request: Request, format: Optional[str] = None):
     """
     Accept a natural language question, generate SQL via Gemini, and optionally execute it.
+    ?format=arrays|columnar|msgpack|arrow returns the rows in a compact encoding.
     """
     if not req.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty.")
 
-    # Step 1: Generate SQL
-    schema_text = get_schema_text()
-    result = await generate_sql(req.question, schema_text)
+    db_name, db_path = resolve_db(req.db)
+    fmt = result_format(format, request)
+
+    # Step 1: Generate SQL (or reuse a cached answer for this schema)
+    result, cached = await generate_or_cached(req.question, request, db_path)
 
     if not result["success"]:
-        return {
+        return respond(with_timings({
             "success": False,
             "error": result["error"],
             "question": req.question,
             "sql": "",
             "explanation": "",
             "results": None,
-        }
+        }), fmt, request)
 
     sql = result["sql"]
     explanation = result["explanation"]
@@ -94,91 +510,585 @@ async def api_query(req: QueryRequest):
     # Step 2: Execute if requested
     exec_result = None
     if req.execute and sql:
-        exec_result = execute_query(sql)
+        exec_result = await run_query(request, sql, "query", req.query_id, db_path, as_dicts=fmt is None,
+                                      approximate=req.approximate)
 
     # Step 3: Save to history
-    history_entry = {
-        "id": len(query_history) + 1,
-        "question": req.question,
-        "sql": sql,
-        "explanation": explanation,
-        "success": exec_result["success"] if exec_result else True,
-        "row_count": exec_result["row_count"] if exec_result else 0,
-        "timestamp": datetime.now().isoformat(),
-    }
-    query_history.insert(0, history_entry)
+    with span("history"):
+        record_history(db_name, req.question, sql, explanation, exec_result)
 
-    return {
+    return respond(with_timings({
         "success": True,
+        "db": db_name,
         "question": req.question,
         "sql": sql,
         "explanation": explanation,
+        "cached": cached,
+        "prompt_tokens": result.get("prompt_tokens"),
         "results": exec_result,
-    }
+    }), fmt, request)
+
+
+@app.post("/api/query/stream")
+async def api_query_stream(req: QueryRequest, request: Request, format: str = "ndjson"):
+    """
+    Generate SQL for a question and stream the complete result (no row cap)
+    as NDJSON, CSV or Arrow IPC.
+    """
+    if not req.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+
+    db_name, db_path = resolve_db(req.db)
+    result, cached = await generate_or_cached(req.question, request, db_path)
+    if not result["success"]:
+        raise HTTPException(status_code=502, detail=result["error"])
+    meta = {"db": db_name, "question": req.question, "sql": result["sql"], "explanation": result["explanation"],
+            "cached": cached}
+    return await stream_sql_response(result["sql"], format, meta, db_path)
+
+
+@app.post("/api/query/sse")
+async def api_query_sse(req: QueryRequest):
+    """
+    /api/query as Server-Sent Events: "meta", the model's output as "token"
+    events, "sql" as soon as the code block closes, then "columns" and "rows"
+    (arrays, up to 500 rows) while the explanation is still being written,
+    and finally "done" with the explanation and outcome.
+    """
+    if not req.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty.")
+    db_name, db_path = resolve_db(req.db)
+    query_id = req.query_id or uuid.uuid4().hex
+    return StreamingResponse(
+        query_events(req.question, req.execute, db_name, db_path, query_id),
+        media_type=SSE_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache", "X-Query-Id": query_id},
+    )
+
+
+@app.post("/api/query/batch")
+async def api_query_batch(req: BatchQueryRequest):
+    """
+    Answer many questions in one request, streamed back as NDJSON.
+    Identical questions are answered once; each line carries the positions
+    (indices) of the questions it answers and lines arrive in completion
+    order, followed by a final {"summary": ...} line.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="questions cannot be empty.")
+    if len(req.questions) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUESTIONS} questions per batch.")
+    db_name, db_path = resolve_db(req.db)
+
+    groups: dict[str, list[int]] = {}
+    texts: dict[str, str] = {}
+    blank = []
+    for i, question in enumerate(req.questions):
+        if not question.strip():
+            blank.append(i)
+            continue
+        key = normalize_question(question)
+        groups.setdefault(key, []).append(i)
+        texts.setdefault(key, question.strip())
+
+    context = await load_schema_context(db_path)
+    batch_id = uuid.uuid4().hex
+    timeout, max_steps = QUERY_BUDGETS["query"]
+    llm_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def answer(n: int, key: str) -> dict:
+        question = texts[key]
+        item = {"indices": groups[key], "question": question}
+        async with llm_slots:
+            result, cached = await generate_or_cached(question, None, db_path, context)
+        if not result["success"]:
+            return {**item, "success": False, "error": result["error"], "sql": "", "explanation": "",
+                    "results": None}
+
+        exec_result = None
+        if req.execute and result["sql"]:
+            query_id = f"{batch_id}-{n}"
+            exec_result = await run_in_threadpool(
+                result_cache.execute, result["sql"], db_path, timeout, max_steps, query_id
+            )
+            exec_result["query_id"] = query_id
+            observe_rows("batch", exec_result)
+        record_history(db_name, question, result["sql"], result["explanation"], exec_result)
+        return {**item, "success": True, "sql": result["sql"], "explanation": result["explanation"],
+                "cached": cached, "results": exec_result}
+
+    async def stream():
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(answer(n, key)) for n, key in enumerate(groups)]
+        succeeded = 0
+        try:
+            if blank:
+                yield ndjson_line({"indices": blank, "question": "", "success": False,
+                                   "error": "Question cannot be empty.", "results": None})
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                succeeded += item["success"] and (item["results"] is None or item["results"]["success"])
+                yield ndjson_line(item)
+            yield ndjson_line({"summary": {
+                "db": db_name,
+                "questions": len(req.questions),
+                "unique": len(groups),
+                "succeeded": succeeded,
+                "failed": len(groups) - succeeded + bool(blank),
+                "elapsed_seconds": round(time.perf_counter() - started, 3),
+            }})
+        finally:
+            # Client went away (or we are done): stop anything still running
+            for n, task in enumerate(tasks):
+                if not task.done():
+                    task.cancel()
+                    cancel_query(f"{batch_id}-{n}")
+
+    return StreamingResponse(stream(), media_type=FORMATS["ndjson"], headers={"X-Batch-Id": batch_id})
 
 
 @app.post("/api/execute")
-def api_execute_sql(req: DirectSQLRequest):
-    """Execute a SQL query directly (for editing/re-running)."""
+async def api_execute_sql(req: DirectSQLRequest, request: Request, format: Optional[str] = None):
+    """Execute a SQL query directly (for editing/re-running). ?format= as for /api/query."""
+    if not req.sql.strip():
+        raise HTTPException(status_code=400, detail="SQL query cannot be empty.")
+    _, db_path = resolve_db(req.db)
+    fmt = result_format(format, request)
+
+    if req.paginate:
+        if not 1 <= req.page_size <= MAX_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {MAX_PAGE_SIZE}.")
+        budget = QueryBudget(*QUERY_BUDGETS["execute"], query_id=req.query_id or uuid.uuid4().hex)
+        try:
+            with span("execute"):
+                result = await run_until_disconnect(
+                    request,
+                    run_in_threadpool(cursors.open_cursor, req.sql, db_path, req.page_size, budget, fmt is None),
+                    on_disconnect=budget.cancel,
+                )
+        except (ValueError, sqlite3.Error) as e:
+            result = error_result(str(e), budget)
+        observe_rows("execute", result)
+        return respond(with_timings({**result, "mode": "exact", "query_id": budget.query_id}), fmt, request)
+
+    result = await run_query(request, req.sql, "execute", req.query_id, db_path, as_dicts=fmt is None,
+                             approximate=req.approximate)
+    return respond(with_timings(result), fmt, request)
+
+
+@app.post("/api/queries/{query_id}/cancel")
+def api_cancel_query(query_id: str):
+    """Cancel a running query by the query_id it was started with."""
+    if not cancel_query(query_id):
+        raise HTTPException(status_code=404, detail="No running query with that id.")
+    return {"success": True, "message": "Query cancelled."}
+
+
+@app.get("/api/execute/cursor/{token}")
+def api_fetch_page(token: str, request: Request, page_size: int = MAX_ROWS, format: Optional[str] = None):
+    """Fetch the next page of a paginated /api/execute result."""
+    if not 1 <= page_size <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {MAX_PAGE_SIZE}.")
+    fmt = result_format(format, request)
+    try:
+        page = cursors.fetch_page(token, page_size, fmt is None)
+    except sqlite3.Error as e:
+        cursors.registry.close(token)
+        return respond(error_result(str(e)), fmt, request)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Cursor not found or expired.")
+    return respond(page, fmt, request)
+
+
+@app.delete("/api/execute/cursor/{token}")
+def api_close_cursor(token: str):
+    """Close a paginated result before it is exhausted."""
+    if not cursors.registry.close(token):
+        raise HTTPException(status_code=404, detail="Cursor not found or expired.")
+    return {"success": True, "message": "Cursor closed."}
+
+
+@app.post("/api/execute/stream")
+async def api_execute_stream(req: DirectSQLRequest, format: str = "ndjson"):
+    """Execute a SQL query and stream the complete result (no row cap) as NDJSON, CSV or Arrow IPC."""
     if not req.sql.strip():
         raise HTTPException(status_code=400, detail="SQL query cannot be empty.")
+    _, db_path = resolve_db(req.db)
 
-    result = execute_query(req.sql)
-    return result
+    return await stream_sql_response(req.sql, format, db_path=db_path)
 
 
 @app.get("/api/history")
-def api_get_history():
-    """Return query history."""
-    return {"success": True, "history": query_history}
+def api_get_history(
+    limit: int = 50,
+    before_id: Optional[int] = None,
+    q: Optional[str] = None,
+    success: Optional[bool] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    db: Optional[str] = None,
+):
+    """
+    Return query history, newest first. Pass the last id of a page as
+    before_id to get the next one; filter by database, question text, outcome and time range.
+    """
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_HISTORY_PAGE}.")
+    entries = history.query(limit=limit, before_id=before_id, q=q, success=success, since=since, until=until,
+                            db=db)
+    next_before_id = entries[-1]["id"] if len(entries) == limit else None
+    return {"success": True, "history": entries, "next_before_id": next_before_id}
 
 
 @app.delete("/api/history")
-def api_clear_history():
-    """Clear query history."""
-    query_history.clear()
+def api_clear_history(db: Optional[str] = None):
+    """Clear query history, for one database when db is given."""
+    history.clear(db)
     return {"success": True, "message": "History cleared."}
 
 
-@app.post("/api/upload-db")
-async def api_upload_db(file: UploadFile = File(...)):
-    """Upload a custom SQLite database file."""
-    if not file.filename.endswith((".db", ".sqlite", ".sqlite3")):
-        raise HTTPException(status_code=400, detail="Only .db, .sqlite, .sqlite3 files are accepted.")
+# ── Slow queries ────────────────────────────────────────
+@app.get("/api/slow-queries")
+def api_slow_queries(db: Optional[str] = None, limit: int = 50):
+    """Statements slower than SLOW_QUERY_MS, newest first, with their query plans."""
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_HISTORY_PAGE}.")
+    path = resolve_db(db)[1] if db else None
+    return {"success": True, "threshold_ms": slow_log.threshold_ms, "entries": slow_log.entries(path, limit)}
 
-    os.makedirs(DB_DIR, exist_ok=True)
-    dest_path = os.path.join(DB_DIR, file.filename)
 
+@app.get("/api/slow-queries/analysis")
+def api_slow_query_analysis(db: Optional[str] = None, limit: int = 20):
+    """Slow queries grouped by shape, with full table scans and suggested indexes."""
+    db_name, path = resolve_db(db)
+    return {
+        "success": True,
+        "db": db_name,
+        "index_trials_enabled": SLOW_QUERY_ADMIN,
+        "groups": slow_log.analyze(path, limit),
+    }
+
+
+@app.post("/api/slow-queries/{shape_id}/test-indexes")
+async def api_test_indexes(shape_id: str, db: Optional[str] = None):
+    """
+    Admin only (SLOW_QUERY_ADMIN=1): build a shape's suggested indexes on a
+    copy of the database and compare query times before and after.
+    """
+    if not SLOW_QUERY_ADMIN:
+        raise HTTPException(status_code=403, detail="Index trials are disabled. Set SLOW_QUERY_ADMIN=1 to enable.")
+    _, path = resolve_db(db)
+    return await run_in_threadpool(slow_log.test_indexes, path, shape_id)
+
+
+@app.delete("/api/slow-queries")
+def api_clear_slow_queries(db: Optional[str] = None):
+    """Clear the slow-query log, for one database when db is given."""
+    slow_log.clear(resolve_db(db)[1] if db else None)
+    return {"success": True, "message": "Slow-query log cleared."}
+
+
+# ── Rollups ─────────────────────────────────────────────
+@app.get("/api/rollups")
+def api_rollups(db: Optional[str] = None):
+    """Rollup tables built from recurring aggregate queries, with their freshness."""
+    db_name, path = resolve_db(db)
+    return {"success": True, "db": db_name, **rollups.stats(), "rollups": rollups.list(path)}
+
+
+@app.post("/api/rollups/refresh")
+async def api_refresh_rollups(db: Optional[str] = None):
+    """Mine history and build or refresh rollups now instead of waiting for the background pass."""
+    if not rollups.enabled:
+        raise HTTPException(status_code=400, detail="Rollups are disabled (ROLLUPS_ENABLED=0).")
+    db_name, path = resolve_db(db)
     try:
-        with open(dest_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        summary = await run_in_threadpool(rollups.maintain, db_name, path)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "db": db_name, **summary}
 
-        # Validate it's a real SQLite file
-        try:
-            test_schema = get_schema(dest_path)
-            if not test_schema:
-                os.remove(dest_path)
-                raise HTTPException(status_code=400, detail="Database file contains no tables.")
-        except Exception as e:
-            if os.path.exists(dest_path):
-                os.remove(dest_path)
-            raise HTTPException(status_code=400, detail=f"Invalid SQLite file: {str(e)}")
-
-        set_db_path(dest_path)
-        query_history.clear()
-
-        return {
-            "success": True,
-            "message": f"Database '{file.filename}' loaded successfully.",
-            "schema": test_schema,
-            "db_name": file.filename,
-        }
-    except HTTPException:
-        raise
+
+@app.delete("/api/rollups")
+def api_clear_rollups(db: Optional[str] = None):
+    """Drop a database's rollups; recurring shapes are rebuilt on a later pass."""
+    db_name, path = resolve_db(db)
+    rollups.clear(path)
+    close_pool(rollups.sidecar_path(path))  # pooled readers of the deleted sidecar file
+    return {"success": True, "message": f"Rollups for '{db_name}' dropped."}
+
+
+# ── Samples ─────────────────────────────────────────────
+@app.get("/api/samples")
+def api_samples(db: Optional[str] = None):
+    """Table samples used by approximate queries, with their freshness."""
+    db_name, path = resolve_db(db)
+    return {"success": True, "db": db_name, **samples.stats(), "samples": samples.list(path)}
+
+
+@app.post("/api/samples/refresh")
+async def api_refresh_samples(db: Optional[str] = None):
+    """Build or refresh samples now instead of waiting for the background pass."""
+    if not samples.enabled:
+        raise HTTPException(status_code=400, detail="Sampling is disabled (SAMPLING_ENABLED=0).")
+    db_name, path = resolve_db(db)
+    try:
+        summary = await run_in_threadpool(samples.maintain, path)
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"success": True, "db": db_name, **summary}
+
+
+@app.delete("/api/samples")
+def api_clear_samples(db: Optional[str] = None):
+    """Drop a database's samples; they are rebuilt on a later pass."""
+    db_name, path = resolve_db(db)
+    samples.clear(path)
+    return {"success": True, "message": f"Samples for '{db_name}' dropped."}
+
+
+# ── Jobs ────────────────────────────────────────────────
+def _job_or_404(job_id: str) -> dict:
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return job
+
+
+@app.post("/api/jobs", status_code=202)
+def api_submit_job(req: JobRequest, request: Request):
+    """
+    Queue a question or SQL statement for background execution. Poll
+    /api/jobs/{job_id} or subscribe to its events; the full result is kept on
+    disk until the job expires.
+    """
+    question = (req.question or "").strip()
+    sql = (req.sql or "").strip()
+    if bool(question) == bool(sql):
+        raise HTTPException(status_code=400, detail="Provide either a question or sql.")
+    if question and not is_configured():
+        raise HTTPException(status_code=400, detail=gemini_service.provider.not_configured_message())
+    db_name, db_path = resolve_db(req.db)
+    user = req.user or request.headers.get("x-user-id") or (request.client.host if request.client else "anonymous")
+    try:
+        job = jobs.submit(db_name, db_path, user, question=question or None, sql=sql or None, priority=req.priority)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"success": True, **job}
+
+
+@app.get("/api/jobs")
+def api_list_jobs(user: Optional[str] = None, status: Optional[str] = None, limit: int = 100):
+    """Known jobs, newest first."""
+    if not 1 <= limit <= MAX_HISTORY_PAGE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_HISTORY_PAGE}.")
+    return {"success": True, "jobs": jobs.recent(user, status, limit), **jobs.stats()}
+
+
+@app.get("/api/jobs/{job_id}")
+def api_job_status(job_id: str):
+    """Status of a job; queued jobs include their position in the queue."""
+    return {"success": True, **_job_or_404(job_id)}
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def api_job_events(job_id: str, request: Request):
+    """Server-Sent Events: a "status" event on every change, then "done" once the job ends."""
+    job = _job_or_404(job_id)
+
+    async def events():
+        last = None
+        current = job
+        while True:
+            state = (current["status"], current["row_count"], current.get("position"))
+            if state != last:
+                last = state
+                yield sse_event("status", current)
+            if current["status"] in JOB_TERMINAL:
+                yield sse_event("done", current)
+                return
+            await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+            if await request.is_disconnected():
+                return
+            current = jobs.get(job_id)
+            if current is None:
+                yield sse_event("error", {"job_id": job_id, "error": "Job was deleted."})
+                return
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/jobs/{job_id}/results")
+def api_job_results(job_id: str, request: Request, offset: int = 0, limit: int = MAX_ROWS,
+                    format: Optional[str] = None):
+    """A page of a finished job's result; follow next_offset for the rest."""
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}.")
+    fmt = result_format(format, request)
+    job = _job_or_404(job_id)
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; results are not available.")
+    page = jobs.page(job_id, offset, limit, fmt is None)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Job results have expired.")
+    return respond({**page, "job_id": job_id, "truncated": job["truncated"]}, fmt, request)
+
+
+@app.get("/api/jobs/{job_id}/download")
+def api_job_download(job_id: str, format: str = "csv"):
+    """The whole result of a finished job as NDJSON, CSV or Arrow IPC."""
+    if format not in ENCODERS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'. Use one of: {', '.join(ENCODERS)}.")
+    if format == "arrow" and not arrow_available():
+        raise HTTPException(status_code=400, detail="Arrow output requires the pyarrow package.")
+    job = _job_or_404(job_id)
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}; results are not available.")
+    spooled = jobs.batches(job_id)
+    if spooled is None:
+        raise HTTPException(status_code=404, detail="Job results have expired.")
+    columns, batches = spooled
+    return StreamingResponse(
+        ENCODERS[format](columns, batches, {"job_id": job_id}), media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{job_id}.{format}"'},
+    )
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+def api_cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    if not jobs.cancel(job_id):
+        _job_or_404(job_id)
+        raise HTTPException(status_code=409, detail="Job has already finished.")
+    return {"success": True, "message": "Cancellation requested."}
+
+
+@app.delete("/api/jobs/{job_id}")
+def api_delete_job(job_id: str):
+    """Cancel a job if needed and delete it along with its results."""
+    if not jobs.delete(job_id):
+        raise HTTPException(status_code=404, detail="Unknown job.")
+    return {"success": True, "message": "Job deleted."}
+
+
+@app.post("/api/upload-db", status_code=202)
+async def api_upload_db(file: UploadFile = File(...), activate: bool = Form(False)):
+    """Upload a custom SQLite database file.
+
+    The body is streamed to disk and validated in the background; poll
+    /api/upload-db/{job_id} until its status is "ready" or "failed". The file
+    is registered under its name for use as `db`; pass activate=true to also
+    make it the default database.
+    """
+    db_name = safe_filename(file.filename)
+    if not db_name:
+        raise HTTPException(status_code=400, detail="Only .db, .sqlite, .sqlite3 files are accepted.")
+
+    os.makedirs(DB_DIR, exist_ok=True)
+    tmp_path = os.path.join(DB_DIR, f".upload-{uuid.uuid4().hex}.part")
+    try:
+        sha256, size = await receive(file, tmp_path)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    # New content under an existing name invalidates that database's history
+    job = uploads.submit(tmp_path, db_name, sha256, size, activate, on_replaced=history.clear)
+    return {
+        "success": True,
+        "message": f"Database '{db_name}' received; validating.",
+        **job,
+    }
+
+
+@app.get("/api/upload-db/{job_id}")
+async def api_upload_status(job_id: str):
+    """Status of a database upload; includes the schema once it is ready."""
+    job = uploads.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown upload job.")
+    return job
+
+
+@app.get("/api/databases")
+def api_list_databases():
+    """List registered databases and whether each is active or holding open connections."""
+    return {"success": True, "databases": databases.list()}
+
+
+def _cache_lookups():
+    nl, result, guard = sql_cache.stats(), result_cache.stats(), verdict_cache.stats()
+    yield "nl", "hit", nl["hits"] - nl["fuzzy_hits"]
+    yield "nl", "fuzzy_hit", nl["fuzzy_hits"]
+    yield "nl", "miss", nl["misses"]
+    yield "result", "hit", result["hits"]
+    yield "result", "coalesced", result["coalesced"]
+    yield "result", "miss", result["misses"]
+    yield "sql_guard", "hit", guard["hits"]
+    yield "sql_guard", "miss", guard["misses"]
+
+
+def _cache_hit_ratios():
+    totals: dict[str, list] = {}
+    for cache, outcome, count in _cache_lookups():
+        hits, lookups = totals.setdefault(cache, [0, 0])
+        totals[cache] = [hits + (count if outcome != "miss" else 0), lookups + count]
+    for cache, (hits, lookups) in totals.items():
+        yield cache, round(hits / lookups, 4) if lookups else 0.0
+
+
+def _pool_connections():
+    for path, stats in pool_stats().items():
+        name = databases.name_of(path)
+        yield name, "idle", stats["idle"]
+        yield name, "in_use", stats["in_use"]
+
+
+metrics.register(metrics.Collected(
+    "smartbridge_cache_lookups_total", "Cache lookups by cache and outcome.", "counter", ("cache", "outcome"),
+    _cache_lookups,
+))
+metrics.register(metrics.Collected(
+    "smartbridge_cache_hit_ratio", "Share of lookups served from cache.", "gauge", ("cache",), _cache_hit_ratios,
+))
+metrics.register(metrics.Collected(
+    "smartbridge_result_cache_bytes", "Estimated bytes held by the result cache.", "gauge", (),
+    lambda: [(result_cache.stats()["bytes"],)],
+))
+metrics.register(metrics.Collected(
+    "smartbridge_pool_connections", "Pooled SQLite connections per database.", "gauge", ("db", "state"),
+    _pool_connections,
+))
+metrics.register(metrics.Collected(
+    "smartbridge_open_cursors", "Paginated result cursors held open.", "gauge", (),
+    lambda: [(len(cursors.registry),)],
+))
+
+
+metrics.register(metrics.Collected(
+    "smartbridge_rollup_rewrites_total", "Queries answered from a rollup table.", "counter", (),
+    lambda: [(rollups.stats()["rewrites"],)],
+))
+metrics.register(metrics.Collected(
+    "smartbridge_rollup_refreshes_total", "Rollup refreshes by kind.", "counter", ("kind",),
+    lambda: rollups.stats()["refreshes"].items(),
+))
+metrics.register(metrics.Collected(
+    "smartbridge_approximate_queries_total", "Approximate-mode queries by outcome.", "counter", ("outcome",),
+    lambda: [("answered", samples.stats()["answered"]), ("exact_fallback", samples.stats()["fallbacks"])],
+))
+metrics.register(metrics.Collected(
+    "smartbridge_jobs", "Query jobs known to this process, by status.", "gauge", ("status",),
+    lambda: jobs.stats()["by_status"].items(),
+))
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def api_metrics():
+    """Prometheus metrics (text exposition format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 
 @app.get("/api/status")
 def api_status():
@@ -186,8 +1096,15 @@ def api_status():
     return {
         "status": "healthy",
         "gemini_configured": is_configured(),
-        "current_db": os.path.basename(get_db_path()),
-        "history_count": len(query_history),
+        "llm_provider": gemini_service.provider.name,
+        "current_db": databases.name_of(get_db_path()),
+        "open_databases": len(open_databases()),
+        "history_count": history.count(),
+        "nl_cache": sql_cache.stats(),
+        "sql_guard": verdict_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "executor_mode": process_pool.EXECUTOR_MODE,
+        "encoding": encoding.info(),
     }
 
 
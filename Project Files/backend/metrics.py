@@ -0,0 +1,252 @@
+"""
+Latency instrumentation and Prometheus metrics for Smart Bridge SQL Querying.
+
+span("stage") times a block and feeds the stage histogram. When a request
+carries the X-Debug-Timings header, the middleware also collects that
+request's spans so endpoints can return them as a `timings` field. Spans
+live in a contextvar, so they follow the request into run_in_threadpool workers.
+Metrics are plain in-process counters and histograms with a lock each, so
+the cost per observation is a bisect and an increment.
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from fastapi.responses import JSONResponse
+
+DEBUG_HEADER = "x-debug-timings"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 10000, 100000)
+
+# Spans of the current request, or None when nobody asked for them
+_spans: ContextVar[Optional[list]] = ContextVar("smartbridge_spans", default=None)
+
+
+# ── Metric types ────────────────────────────────────────
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Collected:
+    """Values read from elsewhere (cache stats, pool sizes) at scrape time."""
+
+    def __init__(self, name: str, help: str, kind: str, labels: tuple, collect: Callable[[], Iterable[tuple]]):
+        self.name, self.help, self.kind, self.labelnames = name, help, kind, labels
+        self.collect = collect
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for *labels, value in self.collect():
+            yield f"{self.name}{_labels(self.labelnames, tuple(labels))} {_number(value)}"
+
+
+_registry: list = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception:
+            continue  # a failing collector must not break the scrape
+    return "\n".join(lines) + "\n"
+
+
+# ── Metrics ─────────────────────────────────────────────
+REQUEST_SECONDS = register(Histogram(
+    "smartbridge_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")
+))
+STAGE_SECONDS = register(Histogram(
+    "smartbridge_stage_duration_seconds", "Time spent per request stage.", ("stage",)
+))
+LLM_REQUESTS = register(Counter(
+    "smartbridge_llm_requests_total", "LLM calls by provider and outcome.", ("provider", "outcome")
+))
+LLM_TOKENS = register(Counter(
+    "smartbridge_llm_tokens_total", "Estimated LLM tokens (~4 characters each).", ("provider", "kind")
+))
+QUERY_ROWS = register(Histogram(
+    "smartbridge_query_rows", "Rows returned per executed query.", ("endpoint",), ROW_BUCKETS
+))
+ROWS_RETURNED = register(Counter(
+    "smartbridge_rows_returned_total", "Rows returned to clients.", ("endpoint",)
+))
+
+
+def observe_rows(endpoint: str, result: Optional[dict]):
+    if result and result.get("success"):
+        QUERY_ROWS.observe(result["row_count"], endpoint)
+        ROWS_RETURNED.inc(result["row_count"], endpoint)
+
+
+# ── Spans ───────────────────────────────────────────────
+@contextmanager
+def span(stage: str):
+    """Time a block as a request stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage)
+        spans = _spans.get()
+        if spans is not None:
+            spans.append((stage, started, elapsed))
+
+
+def timings_enabled() -> bool:
+    return _spans.get() is not None
+
+
+def current_timings() -> Optional[dict]:
+    """This request's spans so far (offsets from the first one), or None when not requested."""
+    spans = _spans.get()
+    if spans is None:
+        return None
+    spans = sorted(spans, key=lambda s: s[1])
+    origin = spans[0][1] if spans else 0.0
+    return {
+        "stages": [
+            {"stage": stage, "start_ms": round((start - origin) * 1000, 3), "ms": round(elapsed * 1000, 3)}
+            for stage, start, elapsed in spans
+        ],
+    }
+
+
+def server_timing() -> Optional[str]:
+    """This request's spans as a Server-Timing header value, or None when not requested."""
+    spans = _spans.get()
+    if not spans:
+        return None
+    return ", ".join(f'{stage};dur={elapsed * 1000:.3f}' for stage, _, elapsed in spans)
+
+
+def with_timings(result: dict) -> dict:
+    """Add a `timings` field to an endpoint result when the debug header was sent."""
+    timings = current_timings()
+    if timings is not None:
+        result["timings"] = timings
+    return result
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that records rendering as the "serialize" stage and reports spans in Server-Timing."""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            body = super().render(content)
+        self._server_timing = server_timing()
+        return body
+
+    def init_headers(self, headers=None):
+        super().init_headers(headers)
+        server_timing = getattr(self, "_server_timing", None)
+        if server_timing:
+            self.raw_headers.append((b"server-timing", server_timing.encode()))
+
+
+class TimingMiddleware:
+    """ASGI middleware: request latency histogram, plus span collection for debug requests."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        debug = any(name == DEBUG_HEADER.encode() and value not in (b"", b"0") for name, value in scope["headers"])
+        token = _spans.set([]) if debug else None
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started, scope["method"], getattr(route, "path", "unmatched"), status[0]
+            )
+            if token is not None:
+                _spans.reset(token)
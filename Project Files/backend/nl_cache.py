@@ -0,0 +1,196 @@
+"""
+Natural-language → SQL cache for Smart Bridge SQL Querying.
+Skips the Gemini round-trip for questions that were already answered against
+the same schema, optionally matching paraphrases by n-gram similarity.
+"""
+
+import os
+import re
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+NL_CACHE_SIZE = int(os.getenv("NL_CACHE_SIZE", "1024"))
+NL_CACHE_TTL_SECONDS = float(os.getenv("NL_CACHE_TTL_SECONDS", "86400"))
+# Optional SQLite file so cached answers survive restarts (empty = memory only)
+NL_CACHE_DB = os.getenv("NL_CACHE_DB", "")
+# Trigram similarity needed to reuse a paraphrase's SQL (0 disables fuzzy matching)
+NL_CACHE_SIMILARITY = float(os.getenv("NL_CACHE_SIMILARITY", "0"))
+
+# Words that change a query's meaning even when the rest of the text is alike;
+# fuzzy matches must agree on these (and on every number) exactly.
+_GUARD_WORDS = {"not", "no", "without", "except", "least", "most", "min", "max", "lowest", "highest",
+                "top", "bottom", "asc", "desc", "ascending", "descending", "before", "after"}
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(text.split())
+
+
+def _trigrams(text: str) -> frozenset:
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _guard_tokens(text: str) -> frozenset:
+    return frozenset(t for t in text.split() if t.isdigit() or t in _GUARD_WORDS)
+
+
+class SQLCache:
+    """
+    LRU + TTL cache of generated SQL keyed on (schema fingerprint, normalized question).
+    Thread-safe; writes through to an optional SQLite file.
+    """
+
+    def __init__(self, max_entries: int = NL_CACHE_SIZE, ttl_seconds: float = NL_CACHE_TTL_SECONDS,
+                 db_path: str = None, similarity: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity = similarity
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._fuzzy_hits = 0
+        self._misses = 0
+        self._conn = None
+        if db_path:
+            self._open_store(db_path)
+
+    # ── Persistence ─────────────────────────────────────
+    def _open_store(self, db_path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS nl_cache (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                question TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                explanation TEXT,
+                created_at REAL NOT NULL
+            )"""
+        )
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM nl_cache WHERE created_at < ?", (cutoff,))
+        self._conn.commit()
+        rows = self._conn.execute(
+            "SELECT key, fingerprint, question, sql, explanation, created_at FROM nl_cache "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for key, fingerprint, question, sql, explanation, created_at in reversed(rows):
+            self._entries[key] = self._make_entry(fingerprint, question, sql, explanation, created_at)
+
+    def _make_entry(self, fingerprint, question, sql, explanation, created_at) -> dict:
+        return {
+            "fingerprint": fingerprint,
+            "question": question,
+            "sql": sql,
+            "explanation": explanation,
+            "created_at": created_at,
+            "trigrams": _trigrams(question),
+            "guards": _guard_tokens(question),
+        }
+
+    # ── Lookup ──────────────────────────────────────────
+    @staticmethod
+    def _key(question: str, fingerprint: str) -> str:
+        return hashlib.sha1(f"{fingerprint}\0{question}".encode()).hexdigest()
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return now - entry["created_at"] > self.ttl_seconds
+
+    def _evict(self, key: str):
+        self._entries.pop(key, None)
+        if self._conn:
+            self._conn.execute("DELETE FROM nl_cache WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _closest(self, question: str, fingerprint: str, now: float) -> Optional[tuple[str, float]]:
+        grams = _trigrams(question)
+        guards = _guard_tokens(question)
+        best_key, best_score = None, 0.0
+        for key, entry in self._entries.items():
+            if entry["fingerprint"] != fingerprint or entry["guards"] != guards or self._expired(entry, now):
+                continue
+            union = len(grams | entry["trigrams"])
+            score = len(grams & entry["trigrams"]) / union if union else 0.0
+            if score > best_score:
+                best_key, best_score = key, score
+        if best_key and best_score >= self.similarity:
+            return best_key, best_score
+        return None
+
+    def get(self, question: str, fingerprint: str) -> Optional[dict]:
+        """Return {"sql", "explanation", "similarity"} for a cached answer, or None."""
+        normalized = normalize_question(question)
+        key = self._key(normalized, fingerprint)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and self._expired(entry, now):
+                self._evict(key)
+                entry = None
+            similarity = 1.0
+            if entry is None and self.similarity > 0:
+                match = self._closest(normalized, fingerprint, now)
+                if match:
+                    key, similarity = match
+                    entry = self._entries[key]
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            if similarity < 1.0:
+                self._fuzzy_hits += 1
+            return {"sql": entry["sql"], "explanation": entry["explanation"], "similarity": round(similarity, 3)}
+
+    def put(self, question: str, fingerprint: str, sql: str, explanation: str):
+        """Store a generated answer, evicting the least recently used entries past the size bound."""
+        normalized = normalize_question(question)
+        key = self._key(normalized, fingerprint)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = self._make_entry(fingerprint, normalized, sql, explanation, now)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO nl_cache (key, fingerprint, question, sql, explanation, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, fingerprint, normalized, sql, explanation, now),
+                )
+                self._conn.executemany("DELETE FROM nl_cache WHERE key = ?", [(k,) for k in evicted])
+                self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn:
+                self._conn.execute("DELETE FROM nl_cache")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "fuzzy_hits": self._fuzzy_hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._conn is not None,
+            }
+
+
+sql_cache = SQLCache(db_path=NL_CACHE_DB or None, similarity=NL_CACHE_SIMILARITY)
@@ -0,0 +1,111 @@
+"""
+Process-pool query execution for Smart Bridge SQL Querying.
+With EXECUTOR_MODE=process, execute_query work runs in worker processes that
+each keep their own warm read-only connection pools, so CPU-heavy statements
+(and the Python-side row handling around them) spread across cores instead
+of contending for one GIL. Workers send results back as columnar marshal
+bytes rather than pickled row dicts.
+
+Budgets (timeout / VM steps) are enforced inside the worker; cancelling by
+query_id is only available in thread mode.
+"""
+
+import os
+import marshal
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+import database
+
+EXECUTOR_MODE = os.getenv("EXECUTOR_MODE", "thread").lower()  # "thread" or "process"
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0")) or os.cpu_count() or 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+# ── Worker side ─────────────────────────────────────────
+def _init_worker(db_path: str):
+    """Open a connection to the default database up front so the first query is warm."""
+    try:
+        with database.pooled_connection(db_path):
+            pass
+    except sqlite3.Error:
+        pass
+
+
+def _worker_execute(sql: str, db_path: str, timeout: Optional[float], max_steps: Optional[int]) -> bytes:
+    result = database.fetch_rows(sql, db_path, timeout, max_steps)
+    if result["success"]:
+        rows = result.pop("rows")
+        # Column-major lists marshal more compactly than one tuple per row
+        result["data"] = [list(column) for column in zip(*rows)] if rows else [[] for _ in result["columns"]]
+    return marshal.dumps(result)
+
+
+# ── Parent side ─────────────────────────────────────────
+def decode(payload: bytes, as_dicts: bool = True) -> dict[str, Any]:
+    """Turn a worker payload back into an execute_query-shaped result (fetch_rows-shaped without as_dicts)."""
+    result = marshal.loads(payload)
+    data = result.pop("data", None)
+    if data is not None:
+        columns = result["columns"]
+        rows = zip(*data)
+        result["rows"] = [dict(zip(columns, row)) for row in rows] if as_dicts else list(rows)
+    return result
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that already runs threads can deadlock
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESS_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(database.get_db_path(),),
+            )
+        return _pool
+
+
+def shutdown():
+    """Stop the worker processes (no-op in thread mode)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run(sql: str, db_path: str, timeout: Optional[float], max_steps: Optional[int], as_dicts: bool) -> dict:
+    path = db_path or database.get_db_path()
+    try:
+        payload = _get_pool().submit(_worker_execute, sql, path, timeout, max_steps).result()
+    except BrokenProcessPool:
+        shutdown()
+        return database.error_result("Query worker process exited unexpectedly.")
+    return decode(payload, as_dicts)
+
+
+def execute_query(sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+                  query_id: str = None) -> dict[str, Any]:
+    """database.execute_query, run in a worker process. Blocks the calling thread until done."""
+    return _run(sql, db_path, timeout, max_steps, True)
+
+
+def fetch_rows(sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+               query_id: str = None) -> dict[str, Any]:
+    """database.fetch_rows, run in a worker process: rows come back as tuples."""
+    return _run(sql, db_path, timeout, max_steps, False)
+
+
+def query_executor(mode: str = None) -> Callable[..., dict]:
+    """The fetch_rows implementation (tuple rows) selected by EXECUTOR_MODE."""
+    if (mode or EXECUTOR_MODE) == "process":
+        return fetch_rows
+    return database.fetch_rows
@@ -0,0 +1,506 @@
+"""
+Asynchronous query jobs for Smart Bridge SQL Querying.
+Long-running questions or SQL are submitted as jobs and executed by a fixed
+pool of worker threads. The queue serves higher priorities first and takes
+turns between users within a priority, with a cap on each user's running
+jobs. A job's full result is spooled to its own SQLite file (untyped
+columns, so integers are stored as varints) that can be paged through or
+downloaded until the job expires. Job metadata is kept next to it as JSON,
+so finished jobs survive restarts and are visible to every uvicorn worker.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Callable, Iterator, Optional
+
+from database import DB_DIR, QueryBudget, stream_query, STREAM_BATCH_SIZE
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_RUNNING_PER_USER = int(os.getenv("JOB_MAX_RUNNING_PER_USER", "2"))  # 0 = no cap
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "3600"))
+JOB_MAX_STEPS = int(os.getenv("JOB_MAX_STEPS", "0"))
+JOB_MAX_ROWS = int(os.getenv("JOB_MAX_ROWS", "0"))  # rows spooled per job, 0 = unlimited
+JOB_RESULT_DIR = os.getenv("JOB_RESULT_DIR", os.path.join(DB_DIR, "job_results"))
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", str(24 * 3600)))
+SWEEP_INTERVAL_SECONDS = 60
+
+TERMINAL = ("succeeded", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class FairQueue:
+    """Pending jobs: highest priority first, round-robin between users within a priority."""
+
+    def __init__(self):
+        self._levels: dict[int, OrderedDict[str, deque]] = {}
+        self._size = 0
+
+    def push(self, job: dict):
+        users = self._levels.setdefault(job["priority"], OrderedDict())
+        users.setdefault(job["user"], deque()).append(job)
+        self._size += 1
+
+    def pop(self, busy: Callable[[str], bool]) -> Optional[dict]:
+        """Next job whose user is not busy, or None."""
+        for priority in sorted(self._levels, reverse=True):
+            users = self._levels[priority]
+            for user in list(users):
+                if busy(user):
+                    continue
+                pending = users.pop(user)
+                job = pending.popleft()
+                if pending:
+                    users[user] = pending  # back of the line for this priority
+                if not users:
+                    del self._levels[priority]
+                self._size -= 1
+                return job
+        return None
+
+    def remove(self, job: dict) -> bool:
+        users = self._levels.get(job["priority"], {})
+        pending = users.get(job["user"])
+        if not pending or job not in pending:
+            return False
+        pending.remove(job)
+        if not pending:
+            del users[job["user"]]
+        if not users:
+            self._levels.pop(job["priority"], None)
+        self._size -= 1
+        return True
+
+    def __len__(self):
+        return self._size
+
+
+# ── Result spool ────────────────────────────────────────
+def write_spool(path: str, columns: list[str], batches: Iterator[list[tuple]], max_rows: int = 0,
+                progress: Callable[[int], Any] = None) -> tuple[int, bool]:
+    """Write a result to a new spool file. Returns (rows written, truncated)."""
+    tmp = f"{path}.tmp"
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute(f"CREATE TABLE result ({', '.join(f'c{i}' for i in range(len(columns))) or 'c0'})")
+        insert = f"INSERT INTO result VALUES ({', '.join('?' * len(columns))})"
+        rows, truncated = 0, False
+        for batch in batches:
+            if max_rows and rows + len(batch) > max_rows:
+                batch, truncated = batch[:max_rows - rows], True
+            if columns:
+                conn.executemany(insert, batch)
+            rows += len(batch)
+            if progress:
+                progress(rows)
+            if truncated:
+                break
+        conn.execute("INSERT INTO meta VALUES ('columns', ?)", (json.dumps(columns),))
+        conn.commit()
+    except BaseException:
+        conn.close()
+        _remove(tmp)
+        raise
+    conn.close()
+    os.replace(tmp, path)
+    return rows, truncated
+
+
+def _open_spool(path: str) -> tuple[sqlite3.Connection, list[str]]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    columns = json.loads(conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()[0])
+    return conn, columns
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# ── Manager ─────────────────────────────────────────────
+class JobManager:
+    """Job registry, fair queue and worker threads."""
+
+    def __init__(self, result_dir: str = JOB_RESULT_DIR, workers: int = JOB_WORKERS,
+                 max_running_per_user: int = JOB_MAX_RUNNING_PER_USER, max_queued: int = JOB_MAX_QUEUED,
+                 ttl_seconds: float = JOB_RESULT_TTL_SECONDS):
+        self.result_dir = result_dir
+        self.workers = workers
+        self.max_running_per_user = max_running_per_user
+        self.max_queued = max_queued
+        self.ttl_seconds = ttl_seconds
+        self._jobs: dict[str, dict] = {}
+        self._budgets: dict[str, QueryBudget] = {}
+        self._queue = FairQueue()
+        self._running: dict[str, int] = {}  # user -> running jobs
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+        self._last_sweep = 0.0
+        self._generate: Optional[Callable[[str, str], tuple[dict, bool]]] = None
+        self._on_finished: Optional[Callable[[dict], Any]] = None
+
+    # ── Lifecycle ───────────────────────────────────────
+    def start(self, generate: Callable[[str, str], tuple[dict, bool]], on_finished: Callable[[dict], Any] = None):
+        """
+        Start the workers. generate(question, db_path) -> (result, cached) turns
+        questions into SQL; on_finished(job) runs after every job ends.
+        """
+        self._generate = generate
+        self._on_finished = on_finished
+        os.makedirs(self.result_dir, exist_ok=True)
+        self._recover()
+        with self._cond:
+            self._stopping = False
+            if self._threads:
+                return
+            self._threads = [
+                threading.Thread(target=self._work, name=f"query-job-{n}", daemon=True) for n in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Cancel running jobs and stop the workers; queued jobs are picked up again by the next start()."""
+        with self._cond:
+            self._stopping = True
+            budgets = list(self._budgets.values())
+            self._cond.notify_all()
+        for budget in budgets:
+            budget.cancel()
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+
+    def _recover(self):
+        """Load jobs left by earlier runs: queued ones are queued again, interrupted ones are failed."""
+        for name in os.listdir(self.result_dir):
+            if not name.endswith(".json"):
+                continue
+            job = self._read_meta(name[:-5])
+            if job is None or job["job_id"] in self._jobs:
+                continue
+            if job["status"] not in TERMINAL and _alive(job.get("pid")):
+                continue  # owned by another worker process that is still running
+            job["pid"] = os.getpid()
+            if job["status"] == "queued":
+                self._queue.push(job)
+            elif job["status"] not in TERMINAL:
+                job.update(status="failed", error="Interrupted by a server restart.",
+                           finished_at=datetime.now().isoformat())
+                self._save(job)
+            self._jobs[job["job_id"]] = job
+
+    # ── Persistence ─────────────────────────────────────
+    def _meta_path(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, f"{job_id}.json")
+
+    def result_path(self, job_id: str) -> str:
+        return os.path.join(self.result_dir, f"{job_id}.db")
+
+    def _read_meta(self, job_id: str) -> Optional[dict]:
+        try:
+            with open(self._meta_path(job_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, job: dict):
+        tmp = f"{self._meta_path(job['job_id'])}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp, self._meta_path(job["job_id"]))
+
+    # ── Jobs ────────────────────────────────────────────
+    def submit(self, db_name: str, db_path: str, user: str, question: str = None, sql: str = None,
+               priority: int = 0) -> dict:
+        """Queue a question or SQL statement. Returns the job snapshot."""
+        now = datetime.now().isoformat()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "error": None,
+            "db": db_name,
+            "db_path": db_path,
+            "user": user,
+            "pid": os.getpid(),
+            "priority": priority,
+            "question": question,
+            "sql": sql,
+            "explanation": None,
+            "cached": False,
+            "columns": None,
+            "row_count": 0,
+            "truncated": False,
+            "timed_out": False,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "expires_at": None,
+        }
+        with self._cond:
+            if len(self._queue) >= self.max_queued:
+                raise JobQueueFull(f"The job queue is full ({self.max_queued} jobs waiting).")
+            self._jobs[job["job_id"]] = job
+            self._save(job)
+            self._queue.push(job)
+            self._cond.notify()
+            return self._snapshot(job)
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        return {k: v for k, v in job.items() if k not in ("db_path", "pid", "cancel_requested")}
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Job snapshot; jobs finished by another worker process are read from disk."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job:
+                snapshot = self._snapshot(job)
+                if job["status"] == "queued":
+                    snapshot["position"] = self._position(job)
+                return snapshot
+        job = self._read_meta(job_id) if all(c in "0123456789abcdef" for c in job_id) else None
+        return self._snapshot(job) if job else None
+
+    def _position(self, job: dict) -> int:
+        """Jobs queued ahead of this one by priority and age, ignoring per-user turns. Caller holds _cond."""
+        return sum(
+            1 for other in self._jobs.values()
+            if other["status"] == "queued" and other is not job and (
+                other["priority"] > job["priority"]
+                or (other["priority"] == job["priority"] and other["created_at"] < job["created_at"])
+            )
+        )
+
+    def recent(self, user: str = None, status: str = None, limit: int = 100) -> list[dict]:
+        """Known jobs, newest first."""
+        with self._cond:
+            jobs = [j for j in self._jobs.values()
+                    if (user is None or j["user"] == user) and (status is None or j["status"] == status)]
+            jobs.sort(key=lambda j: j["created_at"], reverse=True)
+            return [self._snapshot(j) for j in jobs[:limit]]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. False if it does not exist or already ended."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job["status"] in TERMINAL:
+                return False
+            if self._queue.remove(job):
+                self._finish(job, "cancelled", "Job was cancelled.")
+                return True
+            job["cancel_requested"] = True
+            budget = self._budgets.get(job_id)
+        if budget:
+            budget.cancel()
+        return True
+
+    def delete(self, job_id: str) -> bool:
+        """Cancel if needed, then remove the job and its results."""
+        self.cancel(job_id)
+        with self._cond:
+            job = self._jobs.pop(job_id, None)
+        on_disk = os.path.exists(self._meta_path(job_id))
+        _remove(self.result_path(job_id))
+        _remove(self._meta_path(job_id))
+        return job is not None or on_disk
+
+    def _finish(self, job: dict, status: str, error: str = None):
+        """Caller holds _cond."""
+        now = time.time()
+        job.update(status=status, error=error, finished_at=datetime.fromtimestamp(now).isoformat(),
+                   expires_at=datetime.fromtimestamp(now + self.ttl_seconds).isoformat())
+        job.pop("cancel_requested", None)
+        self._save(job)
+
+    # ── Workers ─────────────────────────────────────────
+    def _busy(self, user: str) -> bool:
+        return bool(self.max_running_per_user) and self._running.get(user, 0) >= self.max_running_per_user
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = None
+                while not self._stopping:
+                    job = self._queue.pop(self._busy)
+                    if job:
+                        break
+                    self._cond.wait(timeout=SWEEP_INTERVAL_SECONDS)
+                    if time.monotonic() - self._last_sweep > SWEEP_INTERVAL_SECONDS:
+                        self._last_sweep = time.monotonic()
+                        break
+                if self._stopping:
+                    return
+                if job:
+                    self._running[job["user"]] = self._running.get(job["user"], 0) + 1
+                    job.update(status="generating" if job["question"] else "running",
+                               started_at=datetime.now().isoformat())
+            if job is None:
+                self.sweep()
+                continue
+            try:
+                self._run(job)
+            finally:
+                with self._cond:
+                    self._running[job["user"]] -= 1
+                    if not self._running[job["user"]]:
+                        del self._running[job["user"]]
+                    self._cond.notify_all()
+            if self._on_finished:
+                try:
+                    self._on_finished(self._snapshot(job))
+                except Exception:
+                    pass
+
+    def _run(self, job: dict):
+        budget = None
+        try:
+            if job["question"]:
+                result, cached = self._generate(job["question"], job["db_path"])
+                with self._cond:
+                    if not result["success"] or not result["sql"]:
+                        self._finish(job, "failed", result["error"] or "No SQL was generated.")
+                        return
+                    job.update(sql=result["sql"], explanation=result["explanation"], cached=cached, status="running")
+                    if job.get("cancel_requested"):
+                        self._finish(job, "cancelled", "Job was cancelled.")
+                        return
+
+            budget = QueryBudget(JOB_TIMEOUT_SECONDS, JOB_MAX_STEPS, query_id=job["job_id"])
+            with self._cond:
+                self._budgets[job["job_id"]] = budget
+                if job.get("cancel_requested"):
+                    budget.cancel()
+            try:
+                columns, batches = stream_query(job["sql"], job["db_path"], STREAM_BATCH_SIZE, budget=budget)
+                job["columns"] = columns
+
+                def progress(rows: int):
+                    job["row_count"] = rows
+
+                try:
+                    rows, truncated = write_spool(self.result_path(job["job_id"]), columns, batches,
+                                                  JOB_MAX_ROWS, progress)
+                finally:
+                    batches.close()
+            finally:
+                with self._cond:
+                    self._budgets.pop(job["job_id"], None)
+            with self._cond:
+                job.update(row_count=rows, truncated=truncated)
+                self._finish(job, "succeeded")
+        except (ValueError, sqlite3.Error) as e:
+            reason = budget.reason if budget else None
+            with self._cond:
+                job["timed_out"] = reason in ("timeout", "steps")
+                status = "cancelled" if reason == "cancelled" else "failed"
+                self._finish(job, status, (budget.error_message() if reason else None) or str(e))
+        except Exception as e:
+            with self._cond:
+                self._finish(job, "failed", f"Job failed: {e}")
+
+    # ── Results ─────────────────────────────────────────
+    def page(self, job_id: str, offset: int = 0, limit: int = 500, as_dicts: bool = True) -> Optional[dict]:
+        """Rows [offset, offset + limit) of a finished job's result, or None if there is none."""
+        try:
+            conn, columns = _open_spool(self.result_path(job_id))
+        except sqlite3.Error:
+            return None
+        try:
+            total = conn.execute("SELECT MAX(rowid) FROM result").fetchone()[0] or 0
+            # Spooled rows are append-only, so rowid n is row n - 1
+            rows = conn.execute(
+                "SELECT * FROM result WHERE rowid > ? ORDER BY rowid LIMIT ?", (offset, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        next_offset = offset + len(rows)
+        rows = [row[:len(columns)] for row in rows]
+        return {
+            "success": True,
+            "columns": columns,
+            "rows": [dict(zip(columns, row)) for row in rows] if as_dicts else rows,
+            "row_count": len(rows),
+            "offset": offset,
+            "total_rows": total,
+            "next_offset": next_offset if next_offset < total else None,
+        }
+
+    def batches(self, job_id: str, batch_size: int = STREAM_BATCH_SIZE) -> Optional[tuple[list[str], Iterator]]:
+        """(columns, row batches) for downloading a finished job's result, or None."""
+        try:
+            conn, columns = _open_spool(self.result_path(job_id))
+        except sqlite3.Error:
+            return None
+
+        def read():
+            try:
+                cursor = conn.execute("SELECT * FROM result ORDER BY rowid")
+                while batch := cursor.fetchmany(batch_size):
+                    yield [row[:len(columns)] for row in batch]
+            finally:
+                conn.close()
+
+        return columns, read()
+
+    # ── Cleanup ─────────────────────────────────────────
+    def sweep(self):
+        """Delete finished jobs (and their results) older than the TTL, including other processes' files."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._cond:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in TERMINAL and job["finished_at"]
+                       and datetime.fromisoformat(job["finished_at"]).timestamp() < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        for job_id in expired:
+            _remove(self.result_path(job_id))
+            _remove(self._meta_path(job_id))
+        try:
+            names = os.listdir(self.result_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.result_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff and name.split(".")[0] not in self._jobs:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._cond:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"workers": self.workers, "queued": len(self._queue), "by_status": counts}
+
+
+jobs = JobManager()
@@ -0,0 +1,210 @@
+"""
+Query result cache for Smart Bridge SQL Querying.
+Wraps fetch_rows (thread or process-pool, per EXECUTOR_MODE) with an LRU
+bounded by an estimate of bytes held. Rows are kept as tuples; per-row dicts
+are only built for callers that ask for them.
+Keys combine the normalized SQL with the database file's identity and its
+PRAGMA data_version, so an entry stops matching as soon as the data changes.
+Concurrent identical queries are coalesced: SQLite runs them once.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+from urllib.request import pathname2url
+
+from database import get_db_path, error_result, QueryBudget, MAX_OPEN_DATABASES
+from process_pool import query_executor
+from sql_utils import normalize_sql, file_signature
+from metrics import span
+
+RESULT_CACHE_BYTES = int(os.getenv("RESULT_CACHE_BYTES", str(64 * 1024 * 1024)))  # 0 disables the cache
+# Results estimated above this size are returned but not kept
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024)))
+
+# Rough CPython sizes, enough to keep the byte budget honest
+_ROW_OVERHEAD = 56
+_SLOT = 8
+_SCALAR = 32
+
+
+def _value_bytes(value) -> int:
+    if isinstance(value, (str, bytes)):
+        return 49 + len(value)
+    return _SCALAR
+
+
+def estimate_bytes(columns: list[str], rows: list[tuple]) -> int:
+    size = sum(_value_bytes(c) for c in columns)
+    for row in rows:
+        size += _ROW_OVERHEAD + _SLOT * len(row) + sum(_value_bytes(v) for v in row)
+    return size
+
+
+class _Flight:
+    """A query some thread is running; identical requests wait for its result."""
+
+    __slots__ = ("done", "result")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[dict] = None
+
+
+class ResultCache:
+    """Byte-bounded LRU of successful query results, with single-flight."""
+
+    def __init__(self, max_bytes: int = RESULT_CACHE_BYTES, max_entry_bytes: int = RESULT_CACHE_MAX_ENTRY_BYTES,
+                 max_sentinels: int = MAX_OPEN_DATABASES, fetch: Callable[..., dict] = None):
+        self.run_query = fetch or query_executor()
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.max_sentinels = max_sentinels
+        self._entries: OrderedDict[tuple, dict] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[tuple, _Flight] = {}
+        self._lock = threading.Lock()
+        # One idle connection per database, used only to read PRAGMA data_version:
+        # it changes whenever another connection commits to the file.
+        self._sentinels: OrderedDict[str, tuple[sqlite3.Connection, int]] = OrderedDict()
+        self._sentinel_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+
+    # ── Data version ────────────────────────────────────
+    def data_version(self, path: str) -> tuple:
+        """Token that changes whenever the database file is replaced or written."""
+        signature = file_signature(path)
+        inode = signature[0]
+        with self._sentinel_lock:
+            sentinel = self._sentinels.get(path)
+            if sentinel is None or sentinel[1] != inode:
+                # New database, or the file was swapped out under the old connection
+                if sentinel:
+                    sentinel[0].close()
+                uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+                sentinel = (sqlite3.connect(uri, uri=True, check_same_thread=False), inode)
+                self._sentinels[path] = sentinel
+                while len(self._sentinels) > self.max_sentinels:
+                    self._sentinels.popitem(last=False)[1][0].close()
+            self._sentinels.move_to_end(path)
+            version = sentinel[0].execute("PRAGMA data_version").fetchone()[0]
+        return (*signature, version)
+
+    # ── Entries ─────────────────────────────────────────
+    @staticmethod
+    def _shape(result: dict, cached: bool, as_dicts: bool) -> dict[str, Any]:
+        """A copy of a tuple-row result for one caller, with dict rows if it wants them."""
+        shaped = {**result, "cached": cached}
+        shaped.pop("bytes", None)
+        if as_dicts and result["success"]:
+            columns = result["columns"]
+            with span("rows_to_dicts"):
+                shaped["rows"] = [dict(zip(columns, row)) for row in result["rows"]]
+        return shaped
+
+    def _store(self, key: tuple, result: dict):
+        columns = result["columns"]
+        rows = result["rows"]
+        size = estimate_bytes(columns, rows)
+        if size > self.max_entry_bytes:
+            return
+        entry = {**result, "bytes": size}  # keeps extra keys such as "rollup" provenance
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old["bytes"]
+            self._entries[key] = entry
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted["bytes"]
+                self._evictions += 1
+
+    # ── Execution ───────────────────────────────────────
+    def execute(self, sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+                query_id: str = None, as_dicts: bool = True) -> dict[str, Any]:
+        """
+        execute_query with caching; results carry "cached": True when SQLite was not run for them.
+        With as_dicts=False rows stay tuples in column order, as from fetch_rows.
+        """
+        path = db_path or get_db_path()
+        if self.max_bytes <= 0:
+            return self._shape(self.run_query(sql, path, timeout, max_steps, query_id), False, as_dicts)
+        try:
+            with span("result_cache"):
+                version = self.data_version(path)
+        except (OSError, sqlite3.Error):
+            return self._shape(self.run_query(sql, path, timeout, max_steps, query_id), False, as_dicts)
+        key = (path, normalize_sql(sql), version)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._shape(entry, True, as_dicts)
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            # Wait under this request's own budget, cancellable by its query_id
+            budget = QueryBudget(timeout, max_steps, query_id)
+            if not budget.wait(flight.done):
+                return self._shape(error_result("", budget), False, as_dicts)
+            if flight.result is not None and flight.result["success"]:
+                return self._shape(flight.result, True, as_dicts)
+            # The leader failed, timed out or was cancelled: its outcome is not ours.
+            # Run it ourselves with whatever time the wait left.
+            remaining = max(budget.deadline - time.monotonic(), 0.001) if budget.deadline else 0
+            return self._shape(self.run_query(sql, path, remaining, max_steps, query_id), False, as_dicts)
+
+        try:
+            result = self.run_query(sql, path, timeout, max_steps, query_id)
+            if result["success"]:
+                self._store(key, result)
+            flight.result = result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+        return self._shape(result, False, as_dicts)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def close(self):
+        """Drop cached results and close the data_version connections."""
+        self.clear()
+        with self._sentinel_lock:
+            while self._sentinels:
+                self._sentinels.popitem()[1][0].close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "hit_rate": round((self._hits + self._coalesced) / lookups, 4) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,763 @@
+"""
+Pre-aggregated rollup tables for Smart Bridge SQL Querying.
+
+A background thread mines recorded history for aggregate queries that keep
+coming back with the same FROM/WHERE and GROUP BY, and materializes each
+recurring shape into a rollup table in a sidecar SQLite file next to the
+source database. A rollup holds, per group, COUNT(*) and the SUM / COUNT /
+MIN / MAX of every aggregated expression seen for that shape.
+
+fetch_rows asks rewrite() whether an incoming query can be answered from a
+rollup: same FROM and WHERE, GROUP BY a subset of the rollup's groups, and
+only SUM / COUNT / AVG / MIN / MAX / TOTAL over stored expressions. Such
+queries are rewritten to re-aggregate the rollup instead of scanning the
+source. Column names and row order are preserved; floating-point sums may
+differ in the last digits when groups are merged.
+
+A rollup is only used while the source file's signature (inode, mtime, size,
+WAL) matches the one it was built against. Any change to that signature
+means a full rebuild, except with ROLLUP_INCREMENTAL on when the change
+provably added rows to the first FROM table (its row count grew by exactly
+the rows past the old max rowid, every other table unchanged): then only
+the new rows are aggregated and merged in. That shortcut assumes existing
+rows were not also updated in place in the same interval, so set
+ROLLUP_INCREMENTAL=0 for sources that are modified that way.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+from urllib.request import pathname2url
+
+from sql_utils import mask_sql, strip_sql, normalize_sql, table_aliases, file_signature
+from history_store import history
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "data")
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "1") != "0"
+ROLLUP_DIR = os.getenv("ROLLUP_DIR", os.path.join(DB_DIR, "rollups"))
+ROLLUP_MIN_OCCURRENCES = int(os.getenv("ROLLUP_MIN_OCCURRENCES", "3"))
+ROLLUP_MAX_PER_DB = int(os.getenv("ROLLUP_MAX_PER_DB", "16"))
+ROLLUP_MAX_ROWS = int(os.getenv("ROLLUP_MAX_ROWS", "100000"))
+# A rollup must be at least this many times smaller than its first FROM table
+ROLLUP_MIN_REDUCTION = float(os.getenv("ROLLUP_MIN_REDUCTION", "10"))
+ROLLUP_MINE_LIMIT = int(os.getenv("ROLLUP_MINE_LIMIT", "5000"))  # recent history entries examined
+ROLLUP_MINE_SECONDS = float(os.getenv("ROLLUP_MINE_SECONDS", "300"))
+ROLLUP_REFRESH_SECONDS = float(os.getenv("ROLLUP_REFRESH_SECONDS", "30"))
+ROLLUP_INCREMENTAL = os.getenv("ROLLUP_INCREMENTAL", "1") != "0"
+
+PARSE_CACHE_SIZE = 1024
+
+_AGG_CALL = re.compile(r"\b(sum|count|avg|min|max|total)\s*\(", re.IGNORECASE)
+_CLAUSE = re.compile(r"\b(FROM|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b", re.IGNORECASE)
+_CLAUSE_ORDER = ["FROM", "WHERE", "GROUP BY", "HAVING", "ORDER BY", "LIMIT"]
+_IDENTIFIER = re.compile(r'"[^"]*"|\b[A-Za-z_]\w*\b')
+# Words allowed around aggregates in a rewritable expression (no column references)
+_SAFE_WORDS = {"round", "abs", "cast", "as", "real", "integer", "numeric", "text", "coalesce", "ifnull",
+               "nullif", "null", "printf", "format"}
+_ORDER_SUFFIX = re.compile(r"(\s+COLLATE\s+\w+)?(\s+(?:ASC|DESC))?(\s+NULLS\s+(?:FIRST|LAST))?\s*$", re.IGNORECASE)
+_IMPLICIT_ALIAS = re.compile(r'^(.*[\w)"\]])\s+("?)([A-Za-z_]\w*)\2$', re.DOTALL)
+_ALIAS = re.compile(r'^(.*\S)\s+AS\s+("?)(\w+)\2$', re.IGNORECASE | re.DOTALL)
+_BARE_COLUMN = re.compile(r'^(?:"?\w+"?\s*\.\s*)?"?(\w+)"?$')
+_NOT_ALIASES = {"end", "asc", "desc", "null", "and", "or", "not", "is", "then", "else"}
+
+
+# ── Parsing ─────────────────────────────────────────────
+def canon(expr: str) -> str:
+    """Comparable form of an expression: normalized whitespace, lowercase outside string literals."""
+    text = normalize_sql(expr)
+    out, i = [], 0
+    while i < len(text):
+        if text[i] == "'":
+            end = text.find("'", i + 1)
+            while end != -1 and text.startswith("''", end):
+                end = text.find("'", end + 2)
+            end = len(text) if end == -1 else end + 1
+            out.append(text[i:end])
+            i = end
+            continue
+        end = text.find("'", i)
+        end = len(text) if end == -1 else end
+        out.append(re.sub(r"\s*([^\w\s'\"])\s*", r"\1", text[i:end]).lower().replace('"', ""))
+        i = end
+    return "".join(out)
+
+
+def split_top_level(text: str) -> list[str]:
+    """Split on commas outside parentheses and string literals."""
+    masked = mask_sql(text)
+    parts, start = [], 0
+    for i, ch in enumerate(masked):
+        if ch == ",":
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return [p for p in parts if p]
+
+
+def _opaque(text: str) -> str:
+    """mask_sql, but masked characters become "x" instead of spaces so expressions stay one token."""
+    return "".join(m if m != " " or o.isspace() else "x" for m, o in zip(mask_sql(text), text))
+
+
+def aggregate_calls(expr: str) -> Optional[list[tuple[int, int, str, str]]]:
+    """(start, end, function, argument) of each aggregate call, or None if any cannot be rolled up."""
+    masked = mask_sql(expr, mask_parens=False)
+    calls, last_end = [], 0
+    for m in _AGG_CALL.finditer(masked):
+        if m.start() < last_end:
+            return None  # aggregate inside an aggregate
+        depth, i = 1, m.end()
+        while i < len(masked) and depth:
+            depth += {"(": 1, ")": -1}.get(masked[i], 0)
+            i += 1
+        if depth:
+            return None
+        arg = expr[m.end():i - 1].strip()
+        func = m.group(1).lower()
+        if re.match(r"DISTINCT\b", arg, re.IGNORECASE) or not arg:
+            return None
+        if func in ("min", "max") and len(split_top_level(arg)) > 1:
+            return None  # scalar min()/max()
+        calls.append((m.start(), i, func, arg))
+        last_end = i
+    return calls
+
+
+def _split_alias(item: str) -> tuple[str, Optional[str]]:
+    masked = _opaque(item)
+    m = _ALIAS.match(masked)
+    if m:
+        return item[:len(m.group(1))].strip(), m.group(3)
+    m = _IMPLICIT_ALIAS.match(masked)
+    if m and m.group(3).lower() not in _NOT_ALIASES and not re.search(r"\b(CASE|COLLATE)\b", masked, re.IGNORECASE):
+        return item[:len(m.group(1))].strip(), m.group(3)
+    return item, None
+
+
+def _first_table(from_sql: str) -> Optional[tuple[str, str]]:
+    """(table, name it is referenced by) of the first table in a FROM clause."""
+    m = re.match(r'\s*"?(\w+)"?(?:\s+(?:AS\s+)?(\w+))?', from_sql, re.IGNORECASE)
+    if not m:
+        return None
+    alias = m.group(2)
+    if alias and alias.upper() in ("JOIN", "INNER", "LEFT", "CROSS", "NATURAL", "WHERE", "ON"):
+        alias = None
+    return m.group(1), alias or m.group(1)
+
+
+def parse_aggregate(sql: str, columns: set[str]) -> Optional[dict]:
+    """
+    Break a single-level aggregate SELECT into clauses, or None when it is not one
+    (subqueries, set operations, window functions, DISTINCT, SELECT *).
+    columns are the source's column names, to tell GROUP BY aliases from columns.
+    """
+    sql = strip_sql(sql)
+    literal_free = mask_sql(sql, mask_parens=False)
+    if len(re.findall(r"\bSELECT\b", literal_free, re.IGNORECASE)) != 1 or re.search(
+            r"\b(UNION|EXCEPT|INTERSECT|OVER|WINDOW)\b", literal_free, re.IGNORECASE):
+        return None
+    masked = mask_sql(sql)
+    head = re.match(r"\s*SELECT\s+", masked, re.IGNORECASE)
+    if not head or re.match(r"(DISTINCT|ALL)\b", masked[head.end():], re.IGNORECASE):
+        return None
+
+    clauses, order = {}, []
+    marks = list(_CLAUSE.finditer(masked))
+    for n, m in enumerate(marks):
+        name = re.sub(r"\s+", " ", m.group(1).upper())
+        if name in clauses:
+            return None
+        end = marks[n + 1].start() if n + 1 < len(marks) else len(sql)
+        clauses[name] = sql[m.end():end].strip()
+        order.append(name)
+    if order != [c for c in _CLAUSE_ORDER if c in clauses] or "FROM" not in clauses:
+        return None
+    if "(" in clauses["FROM"]:
+        return None
+    first = _first_table(clauses["FROM"])
+    if first is None:
+        return None
+
+    items = []
+    for item in split_top_level(sql[head.end():marks[0].start()]):
+        expr, alias = _split_alias(item)
+        if expr == "*" or expr.endswith(".*"):
+            return None
+        bare = _BARE_COLUMN.match(expr)
+        items.append({"expr": expr, "alias": alias, "name": alias or (bare.group(1) if bare else expr)})
+    aliases = {item["alias"].lower(): item for item in items if item["alias"]}
+
+    groups = []
+    for term in split_top_level(clauses.get("GROUP BY", "")):
+        if term.isdigit():
+            if not 1 <= int(term) <= len(items):
+                return None
+            term = items[int(term) - 1]["expr"]
+        else:
+            bare = re.fullmatch(r'"?(\w+)"?', term)
+            if bare and bare.group(1).lower() not in columns and bare.group(1).lower() in aliases:
+                term = aliases[bare.group(1).lower()]["expr"]
+        groups.append(term)
+
+    measures = {}
+    for text in [item["expr"] for item in items] + [clauses.get("HAVING", "")] + \
+            split_top_level(clauses.get("ORDER BY", "")):
+        calls = aggregate_calls(text)
+        if calls is None:
+            return None
+        for _, _, func, arg in calls:
+            if arg != "*":
+                measures.setdefault(canon(arg), arg)
+    if not groups and not any(aggregate_calls(item["expr"]) for item in items):
+        return None
+
+    return {
+        "from_sql": clauses["FROM"],
+        "where_sql": clauses.get("WHERE", ""),
+        "key": [canon(clauses["FROM"]), canon(clauses.get("WHERE", ""))],
+        "items": items,
+        "groups": [canon(g) for g in groups],
+        "group_sql": groups,
+        "measures": measures,
+        "having": clauses.get("HAVING", ""),
+        "order_by": clauses.get("ORDER BY", ""),
+        "limit": clauses.get("LIMIT", ""),
+        "fact_table": first[0],
+        "fact_ref": first[1],
+        "tables": sorted({first[0], *table_aliases(sql).values()}),
+    }
+
+
+# ── Rollup SQL ──────────────────────────────────────────
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def rollup_columns(definition: dict) -> list[str]:
+    columns = [f"g{i}" for i in range(len(definition["groups"]))] + ["n"]
+    for i in range(len(definition["measures"])):
+        columns += [f"s{i}", f"c{i}", f"lo{i}", f"hi{i}"]
+    return columns
+
+
+def aggregate_sql(definition: dict, extra_where: str = "") -> str:
+    """The source query that computes a rollup's rows (optionally for a slice of the first table)."""
+    select = [f"{g} AS g{i}" for i, g in enumerate(definition["group_sql"])] + ["COUNT(*) AS n"]
+    for i, m in enumerate(definition["measure_sql"]):
+        select += [f"SUM({m}) AS s{i}", f"COUNT({m}) AS c{i}", f"MIN({m}) AS lo{i}", f"MAX({m}) AS hi{i}"]
+    conditions = [f"({c})" for c in (definition["where_sql"], extra_where) if c]
+    sql = f"SELECT {', '.join(select)} FROM {definition['from_sql']}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if definition["group_sql"]:
+        sql += f" GROUP BY {', '.join(definition['group_sql'])}"
+    return sql
+
+
+def _merge_sql(definition: dict, table: str) -> str:
+    """Re-aggregate a rollup together with the partial rows in temp.delta."""
+    groups = [f"g{i}" for i in range(len(definition["groups"]))]
+    select = groups + ["SUM(n)"]
+    for i in range(len(definition["measures"])):
+        select += [f"SUM(s{i})", f"SUM(c{i})", f"MIN(lo{i})", f"MAX(hi{i})"]
+    sql = f"SELECT {', '.join(select)} FROM (SELECT * FROM main.{_quote(table)} UNION ALL SELECT * FROM temp.delta)"
+    return sql + (f" GROUP BY {', '.join(groups)}" if groups else "")
+
+
+def _rolled_aggregate(func: str, arg: str, measures: dict[str, int]) -> Optional[str]:
+    if arg == "*":
+        return "COALESCE(SUM(n), 0)" if func == "count" else None
+    i = measures.get(canon(arg))
+    if i is None:
+        return None
+    return {
+        "sum": f"SUM(s{i})",
+        "total": f"TOTAL(s{i})",
+        "count": f"COALESCE(SUM(c{i}), 0)",
+        "min": f"MIN(lo{i})",
+        "max": f"MAX(hi{i})",
+        "avg": f"(TOTAL(s{i}) / SUM(c{i}))",
+    }[func]
+
+
+def _map_expr(expr: str, groups: dict[str, int], measures: dict[str, int],
+              aliases: set[str] = frozenset()) -> Optional[str]:
+    """An expression over the source, rewritten over rollup columns; None if it can't be."""
+    c = canon(expr)
+    if c in groups:
+        return f"g{groups[c]}"
+    if c.strip('"') in aliases or c.isdigit():
+        return expr
+    calls = aggregate_calls(expr)
+    if calls is None:
+        return None
+    out, residue, pos = [], [], 0
+    for start, end, func, arg in calls:
+        rolled = _rolled_aggregate(func, arg, measures)
+        if rolled is None:
+            return None
+        out += [expr[pos:start], rolled]
+        residue.append(expr[pos:start])
+        pos = end
+    out.append(expr[pos:])
+    residue.append(expr[pos:])
+    words = _IDENTIFIER.findall(mask_sql(" ".join(residue), mask_parens=False))
+    if any(w.lower() not in _SAFE_WORDS for w in words):
+        return None  # a column reference outside any aggregate or group
+    return "".join(out)
+
+
+def rewrite_query(parsed: dict, definition: dict, table: str) -> Optional[str]:
+    """SQL answering a parsed query from a rollup table, or None when the rollup can't answer it."""
+    if parsed["key"] != definition["key"] or not set(parsed["groups"]) <= set(definition["groups"]):
+        return None
+    groups = {g: i for i, g in enumerate(definition["groups"])}
+    measures = {m: i for i, m in enumerate(definition["measures"])}
+
+    select = []
+    for item in parsed["items"]:
+        mapped = _map_expr(item["expr"], groups, measures)
+        if mapped is None:
+            return None
+        select.append(f"{mapped} AS {_quote(item['name'])}")
+    aliases = {item["alias"].lower() for item in parsed["items"] if item["alias"]}
+
+    sql = f"SELECT {', '.join(select)} FROM {_quote(table)}"
+    if parsed["groups"]:
+        sql += f" GROUP BY {', '.join(f'g{groups[g]}' for g in parsed['groups'])}"
+    if parsed["having"]:
+        having = _map_expr(parsed["having"], groups, measures, aliases)
+        if having is None:
+            return None
+        sql += f" HAVING {having}"
+    if parsed["order_by"]:
+        terms = []
+        for term in split_top_level(parsed["order_by"]):
+            suffix = _ORDER_SUFFIX.search(_opaque(term))
+            expr, tail = term[:suffix.start()], term[suffix.start():]
+            mapped = _map_expr(expr, groups, measures, aliases)
+            if mapped is None:
+                return None
+            terms.append(mapped + tail)
+        sql += f" ORDER BY {', '.join(terms)}"
+    if parsed["limit"]:
+        if re.search(r"[A-Za-z_]", mask_sql(parsed["limit"]).replace("OFFSET", "").replace("offset", "")):
+            return None
+        sql += f" LIMIT {parsed['limit']}"
+    return sql
+
+
+# ── Source helpers ──────────────────────────────────────
+def _open_source(path: str) -> sqlite3.Connection:
+    uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def source_columns(conn: sqlite3.Connection) -> set[str]:
+    columns = set()
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+    for table in tables:
+        columns.update(r[1].lower() for r in conn.execute(f"PRAGMA table_info({_quote(table)})"))
+    return columns
+
+
+def _table_stats(conn: sqlite3.Connection, tables: list[str]) -> Optional[dict]:
+    """{table: [row count, max rowid]}, or None if a table has no rowid."""
+    try:
+        return {t: list(conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {_quote(t)}").fetchone()) for t in tables}
+    except sqlite3.Error:
+        return None
+
+
+# ── Manager ─────────────────────────────────────────────
+class RollupManager:
+    """Builds and refreshes rollups in the background and rewrites queries onto them."""
+
+    def __init__(self, directory: str = ROLLUP_DIR, enabled: bool = ROLLUPS_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._catalogs: dict[str, tuple] = {}  # sidecar path -> (file signature, columns, rollups)
+        self._parsed: OrderedDict[tuple, Optional[dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._maintain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._sources: Optional[Callable[[], Iterable[tuple[str, str]]]] = None
+        self._last_mined: dict[str, float] = {}
+        self._rewrites = 0
+        self._stale = 0
+        self._refreshes: dict[str, int] = {}
+        self.last_error: Optional[str] = None
+
+    def sidecar_path(self, db_path: str) -> str:
+        path = os.path.abspath(db_path)
+        digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+        return os.path.join(self.directory, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}.db")
+
+    # ── Lifecycle ───────────────────────────────────────
+    def start(self, sources: Callable[[], Iterable[tuple[str, str]]]):
+        """Maintain rollups for the (name, path) pairs sources() returns."""
+        if not self.enabled or self._thread:
+            return
+        self._sources = sources
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="rollups", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _loop(self):
+        while not self._stopping:
+            for name, path in list(self._sources()):
+                if self._stopping:
+                    return
+                try:
+                    due = time.monotonic() - self._last_mined.get(path, float("-inf")) >= ROLLUP_MINE_SECONDS
+                    self.maintain(name, path, mine=due)
+                except Exception as e:
+                    self.last_error = f"{name}: {e}"
+            self._wake.wait(ROLLUP_REFRESH_SECONDS)
+            self._wake.clear()
+
+    # ── Sidecar ─────────────────────────────────────────
+    def _open_sidecar(self, db_path: str) -> sqlite3.Connection:
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.sidecar_path(db_path), timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS rollups (
+                id TEXT PRIMARY KEY,
+                definition TEXT NOT NULL,
+                occurrences INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,            -- ready | rejected
+                error TEXT,
+                source_signature TEXT,
+                table_stats TEXT,
+                row_count INTEGER NOT NULL DEFAULT 0,
+                built_at TEXT,
+                refreshed_at TEXT,
+                last_refresh TEXT                -- full | incremental
+            );
+        """)
+        return conn
+
+    def _catalog(self, db_path: str) -> Optional[tuple[set, list[dict]]]:
+        """(source columns, ready rollups) from the sidecar, re-read whenever it changes."""
+        sidecar = self.sidecar_path(db_path)
+        try:
+            signature = file_signature(sidecar)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._catalogs.get(sidecar)
+            if cached and cached[0] == signature:
+                return cached[1], cached[2]
+        try:
+            conn = _open_source(sidecar)
+            try:
+                columns = conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+                rows = conn.execute(
+                    "SELECT id, definition, source_signature, row_count FROM rollups WHERE status = 'ready' "
+                    "ORDER BY row_count"
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        catalog = (
+            set(json.loads(columns[0])) if columns else set(),
+            [{"id": r[0], "definition": json.loads(r[1]), "signature": json.loads(r[2]), "rows": r[3]} for r in rows],
+        )
+        with self._lock:
+            self._catalogs[sidecar] = (signature, *catalog)
+        return catalog
+
+    # ── Rewriting ───────────────────────────────────────
+    def _parse(self, sql: str, db_path: str, columns: set[str]) -> Optional[dict]:
+        key = (db_path, sql)
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                return self._parsed[key]
+        parsed = parse_aggregate(sql, columns)
+        with self._lock:
+            self._parsed[key] = parsed
+            while len(self._parsed) > PARSE_CACHE_SIZE:
+                self._parsed.popitem(last=False)
+        return parsed
+
+    def rewrite(self, sql: str, db_path: str) -> Optional[dict]:
+        """{"path", "sql", "rollup"} to run instead of sql, or None to run it as is."""
+        if not self.enabled:
+            return None
+        catalog = self._catalog(db_path)
+        if not catalog or not catalog[1]:
+            return None
+        columns, rollups = catalog
+        parsed = self._parse(sql, db_path, columns)
+        if parsed is None:
+            return None
+        try:
+            signature = file_signature(db_path)
+        except OSError:
+            return None
+        stale = False
+        for rollup in rollups:  # smallest first
+            if rollup["definition"]["key"] != parsed["key"]:
+                continue
+            if rollup["signature"] != signature:
+                stale = True
+                continue
+            rewritten = rewrite_query(parsed, rollup["definition"], f"rollup_{rollup['id']}")
+            if rewritten:
+                with self._lock:
+                    self._rewrites += 1
+                return {"path": self.sidecar_path(db_path), "sql": rewritten, "rollup": rollup["id"]}
+        if stale:
+            with self._lock:
+                self._stale += 1
+            self._wake.set()  # refresh soon rather than at the next interval
+        return None
+
+    # ── Mining ──────────────────────────────────────────
+    def mine(self, db_name: str, columns: set[str]) -> list[dict]:
+        """Rollup definitions for aggregate shapes seen at least ROLLUP_MIN_OCCURRENCES times in history."""
+        parsed = [p for p in (parse_aggregate(e["sql"], columns)
+                              for e in history.query(limit=ROLLUP_MINE_LIMIT, db=db_name, success=True)
+                              if e["sql"]) if p]
+        shapes: dict[tuple, dict] = {}
+        for p in parsed:
+            shape = shapes.setdefault((tuple(p["key"]), frozenset(p["groups"])), {"sample": p, "count": 0})
+            shape["count"] += 1
+        definitions = []
+        for (key, groups), shape in shapes.items():
+            if shape["count"] < ROLLUP_MIN_OCCURRENCES:
+                continue
+            sample = shape["sample"]
+            # Every measure any query of this FROM/WHERE aggregates at this or a coarser grain
+            measures = {}
+            for p in parsed:
+                if tuple(p["key"]) == key and set(p["groups"]) <= groups:
+                    measures.update(p["measures"])
+            order = sorted(range(len(sample["groups"])), key=lambda i: sample["groups"][i])
+            definition = {
+                "key": list(key),
+                "from_sql": sample["from_sql"],
+                "where_sql": sample["where_sql"],
+                "groups": [sample["groups"][i] for i in order],
+                "group_sql": [sample["group_sql"][i] for i in order],
+                "measures": sorted(measures),
+                "measure_sql": [measures[m] for m in sorted(measures)],
+                "fact_table": sample["fact_table"],
+                "fact_ref": sample["fact_ref"],
+                "tables": sample["tables"],
+            }
+            identity = json.dumps([definition["key"], definition["groups"], definition["measures"]])
+            definition["id"] = hashlib.sha1(identity.encode()).hexdigest()[:12]
+            definitions.append((shape["count"], definition))
+        definitions.sort(key=lambda d: -d[0])
+        return [{**d, "occurrences": count} for count, d in definitions[:ROLLUP_MAX_PER_DB]]
+
+    # ── Building ────────────────────────────────────────
+    def maintain(self, db_name: str, db_path: str, mine: bool = True) -> dict:
+        """Build rollups for newly recurring shapes (when mine) and refresh stale ones."""
+        summary = {"built": [], "rejected": [], "dropped": [], "refreshed": {}}
+        with self._maintain_lock:
+            source = _open_source(db_path)
+            sidecar = self._open_sidecar(db_path)
+            try:
+                columns = source_columns(source)
+                with sidecar:
+                    sidecar.execute("INSERT OR REPLACE INTO meta VALUES ('columns', ?)", (json.dumps(sorted(columns)),))
+                    sidecar.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (os.path.abspath(db_path),))
+                existing = {r["id"]: r for r in sidecar.execute("SELECT * FROM rollups")}
+                if mine:
+                    self._last_mined[db_path] = time.monotonic()
+                    wanted = {d["id"]: d for d in self.mine(db_name, columns)}
+                    for rollup_id in existing.keys() - wanted.keys():
+                        with sidecar:
+                            sidecar.execute(f"DROP TABLE IF EXISTS {_quote('rollup_' + rollup_id)}")
+                            sidecar.execute("DELETE FROM rollups WHERE id = ?", (rollup_id,))
+                        summary["dropped"].append(rollup_id)
+                    for rollup_id, definition in wanted.items():
+                        if rollup_id in existing:
+                            with sidecar:
+                                sidecar.execute("UPDATE rollups SET occurrences = ? WHERE id = ?",
+                                                (definition["occurrences"], rollup_id))
+                            continue
+                        status = self._build(source, sidecar, db_path, definition)
+                        summary["built" if status == "ready" else "rejected"].append(rollup_id)
+                    existing = {r["id"]: r for r in sidecar.execute("SELECT * FROM rollups")}
+
+                signature = json.dumps(file_signature(db_path))
+                for rollup_id, row in existing.items():
+                    if row["status"] == "ready" and row["source_signature"] != signature:
+                        kind = self._refresh(source, sidecar, db_path, row)
+                        summary["refreshed"][rollup_id] = kind
+                        self._refreshes[kind] = self._refreshes.get(kind, 0) + 1
+            finally:
+                source.close()
+                sidecar.close()
+        return summary
+
+    def _fill(self, source: sqlite3.Connection, sidecar: sqlite3.Connection, table: str, sql: str,
+              params: tuple = ()) -> Optional[int]:
+        """Copy a source query's rows into a sidecar table; None if there are more than ROLLUP_MAX_ROWS."""
+        cursor = source.execute(sql, params)
+        placeholders = ", ".join("?" * len(cursor.description))
+        count = 0
+        while batch := cursor.fetchmany(10000):
+            count += len(batch)
+            if count > ROLLUP_MAX_ROWS:
+                cursor.close()
+                return None
+            sidecar.executemany(f"INSERT INTO {table} VALUES ({placeholders})", batch)
+        return count
+
+    def _build(self, source: sqlite3.Connection, sidecar: sqlite3.Connection, db_path: str,
+               definition: dict) -> str:
+        """Materialize a new rollup. Returns its status."""
+        table = _quote(f"rollup_{definition['id']}")
+        signature = json.dumps(file_signature(db_path))  # taken first, so changes during the build leave it stale
+        stats = _table_stats(source, definition["tables"])
+        status, error, rows = "ready", None, 0
+        with sidecar:
+            sidecar.execute(f"DROP TABLE IF EXISTS {table}")
+            sidecar.execute(f"CREATE TABLE {table} ({', '.join(rollup_columns(definition))})")
+            try:
+                rows = self._fill(source, sidecar, table, aggregate_sql(definition))
+            except sqlite3.Error as e:
+                status, error = "rejected", str(e)
+            if status == "ready":
+                fact_rows = (stats or {}).get(definition["fact_table"], [0])[0]
+                if rows is None:
+                    status, error = "rejected", f"More than {ROLLUP_MAX_ROWS} groups."
+                elif fact_rows and rows * ROLLUP_MIN_REDUCTION > fact_rows:
+                    status, error = "rejected", f"{rows} groups for {fact_rows} rows is not a useful reduction."
+            if status != "ready":
+                sidecar.execute(f"DROP TABLE {table}")
+            now = datetime.now().isoformat()
+            sidecar.execute(
+                "INSERT OR REPLACE INTO rollups (id, definition, occurrences, status, error, source_signature, "
+                "table_stats, row_count, built_at, refreshed_at, last_refresh) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (definition["id"], json.dumps(definition), definition.get("occurrences", 0), status, error,
+                 signature, json.dumps(stats), rows or 0, now, now, "full"),
+            )
+        return status
+
+    def _refresh(self, source: sqlite3.Connection, sidecar: sqlite3.Connection, db_path: str,
+                 row: sqlite3.Row) -> str:
+        """Bring a rollup whose source signature changed up to date: "incremental" or "full"."""
+        definition = json.loads(row["definition"])
+        signature = json.dumps(file_signature(db_path))
+        old = json.loads(row["table_stats"]) if row["table_stats"] else None
+        new = _table_stats(source, definition["tables"])
+        table = _quote(f"rollup_{definition['id']}")
+        fact = definition["fact_table"]
+        # Same row counts do not mean same rows (an UPDATE keeps them), so only a
+        # proven append to the first table avoids a full rebuild
+        kind = "full"
+        if ROLLUP_INCREMENTAL and old and new and all(old[t] == new[t] for t in new if t != fact):
+            (old_count, old_max), (new_count, new_max) = old[fact], new[fact]
+            # Bounded by the recorded max rowid, so rows appended since _table_stats
+            # are left for the next refresh instead of being merged unrecorded
+            old_max, new_max = old_max or 0, new_max or 0
+            appended = source.execute(
+                f"SELECT COUNT(*) FROM {_quote(fact)} WHERE rowid > ? AND rowid <= ?", (old_max, new_max)
+            ).fetchone()[0]
+            if appended > 0 and new_count - old_count == appended:
+                kind = "incremental"
+
+        now = datetime.now().isoformat()
+        if kind == "full":
+            self._build(source, sidecar, db_path, {**definition, "occurrences": row["occurrences"]})
+            return kind
+        with sidecar:
+            sidecar.execute(f"CREATE TEMP TABLE delta ({', '.join(rollup_columns(definition))})")
+            fact_rowid = f"{_quote(definition['fact_ref'])}.rowid"
+            delta = aggregate_sql(definition, f"{fact_rowid} > ? AND {fact_rowid} <= ?")
+            self._fill(source, sidecar, "temp.delta", delta, (old_max, new_max))
+            sidecar.execute(f"CREATE TEMP TABLE merged AS {_merge_sql(definition, 'rollup_' + definition['id'])}")
+            sidecar.execute(f"DELETE FROM {table}")
+            sidecar.execute(f"INSERT INTO {table} SELECT * FROM temp.merged")
+            sidecar.execute("DROP TABLE temp.delta")
+            sidecar.execute("DROP TABLE temp.merged")
+            rows = sidecar.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            sidecar.execute(
+                "UPDATE rollups SET source_signature = ?, table_stats = ?, row_count = ?, refreshed_at = ?, "
+                "last_refresh = ? WHERE id = ?",
+                (signature, json.dumps(new), rows, now, kind, definition["id"]),
+            )
+        return kind
+
+    # ── Admin ───────────────────────────────────────────
+    def list(self, db_path: str) -> list[dict]:
+        """Rollups of a database, including rejected shapes."""
+        if not os.path.exists(self.sidecar_path(db_path)):
+            return []
+        try:
+            current = json.dumps(file_signature(db_path))
+        except OSError:
+            current = None
+        conn = _open_source(self.sidecar_path(db_path))
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute("SELECT * FROM rollups ORDER BY occurrences DESC").fetchall()
+        finally:
+            conn.close()
+        out = []
+        for row in rows:
+            definition = json.loads(row["definition"])
+            out.append({
+                "id": row["id"],
+                "status": row["status"],
+                "error": row["error"],
+                "fresh": row["source_signature"] == current,
+                "occurrences": row["occurrences"],
+                "row_count": row["row_count"],
+                "from": definition["from_sql"],
+                "where": definition["where_sql"],
+                "group_by": definition["group_sql"],
+                "measures": definition["measure_sql"],
+                "built_at": row["built_at"],
+                "refreshed_at": row["refreshed_at"],
+                "last_refresh": row["last_refresh"],
+            })
+        return out
+
+    def clear(self, db_path: str):
+        """Drop every rollup of a database."""
+        with self._maintain_lock:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.sidecar_path(db_path) + suffix)
+                except OSError:
+                    pass
+            self._last_mined.pop(db_path, None)
+        with self._lock:
+            self._catalogs.pop(self.sidecar_path(db_path), None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "rewrites": self._rewrites, "stale_skips": self._stale,
+                    "refreshes": dict(self._refreshes), "last_error": self.last_error}
+
+
+rollups = RollupManager()
@@ -0,0 +1,568 @@
+"""
+Approximate query answers from table samples for Smart Bridge SQL Querying.
+
+A background thread keeps a uniform Bernoulli sample of every large table
+(at least SAMPLE_MIN_ROWS rows) in a sidecar SQLite file next to the source
+database: each row is kept with probability p = SAMPLE_ROWS / table rows.
+When the file changes, a sample is rebuilt unless SAMPLE_INCREMENTAL is on
+and the table provably only grew (its row count rose by exactly the rows past
+the old max rowid): then just the new rows are sampled, with the same p.
+An unchanged row count proves nothing, as rows may have been updated in
+place, so such tables are resampled. Set SAMPLE_INCREMENTAL=0 for sources
+that update existing rows while also appending.
+
+With approximate=true, an aggregate query over such a table is rewritten so
+its first FROM table reads the sample instead (joined tables stay complete),
+and COUNT / SUM / TOTAL are scaled by 1/p. Alongside each estimate the query
+computes its Horvitz-Thompson variance, which becomes a confidence interval
+(SAMPLE_CONFIDENCE, normal approximation) per cell. AVG is a ratio and is not
+scaled; MIN / MAX come straight from the sample and get no interval (they are
+bounds of what the sample saw). Groups too rare to appear in the sample are
+missing from approximate results.
+
+Anything that cannot be answered this way (no aggregate, DISTINCT
+aggregates, subqueries, no sample for the table yet) runs exactly, and the
+response says which mode produced it.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from statistics import NormalDist
+from typing import Any, Callable, Iterable, Optional
+from urllib.request import pathname2url
+
+import database
+from database import ConnectionPool, QueryBudget, error_result, validate_query, MAX_ROWS
+from rollups import parse_aggregate, aggregate_calls, source_columns
+from sql_utils import mask_sql, strip_sql, file_signature
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "data")
+SAMPLING_ENABLED = os.getenv("SAMPLING_ENABLED", "1") != "0"
+SAMPLE_DIR = os.getenv("SAMPLE_DIR", os.path.join(DB_DIR, "samples"))
+SAMPLE_MIN_ROWS = int(os.getenv("SAMPLE_MIN_ROWS", "1000000"))  # smaller tables are cheap enough to scan
+SAMPLE_ROWS = int(os.getenv("SAMPLE_ROWS", "100000"))  # target sample size per table
+SAMPLE_CONFIDENCE = float(os.getenv("SAMPLE_CONFIDENCE", "0.95"))
+# A sample that has fallen behind its source is still used for this long after its last refresh
+SAMPLE_MAX_AGE_SECONDS = float(os.getenv("SAMPLE_MAX_AGE_SECONDS", "600"))
+SAMPLE_REFRESH_SECONDS = float(os.getenv("SAMPLE_REFRESH_SECONDS", "60"))
+SAMPLE_INCREMENTAL = os.getenv("SAMPLE_INCREMENTAL", "1") != "0"
+
+_RESOLUTION = 1_000_000  # sampling probabilities are multiples of 1 / _RESOLUTION
+_WRAPPER_HEAD = re.compile(r"^\s*(?:(?:round|cast)\s*\(\s*)*$", re.IGNORECASE)
+_WRAPPER_TAIL = re.compile(r"^(?:\s*(?:,\s*\d+\s*|AS\s+\w+\s*)?\))*\s*$", re.IGNORECASE)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _sample_table(table: str) -> str:
+    return f"sample_{table.lower()}"
+
+
+# ── Rewriting ───────────────────────────────────────────
+def _scale(expr: str, weight: float) -> Optional[str]:
+    """expr with COUNT / SUM / TOTAL scaled up by weight; None if it has aggregates that can't be."""
+    calls = aggregate_calls(expr)
+    if calls is None:
+        return None
+    out, pos = [], 0
+    for start, end, func, _ in calls:
+        call = expr[start:end]
+        if func == "count":
+            call = f"CAST(ROUND({call} * {weight!r}) AS INTEGER)"
+        elif func in ("sum", "total"):
+            call = f"({call} * {weight!r})"
+        out += [expr[pos:start], call]
+        pos = end
+    out.append(expr[pos:])
+    return "".join(out)
+
+
+def _variance(expr: str, p: float) -> Optional[tuple[str, Optional[int]]]:
+    """
+    (SQL for the variance of expr's estimate, ROUND digits) when expr is a single
+    aggregate, optionally wrapped in ROUND / CAST; None when no interval applies.
+    """
+    calls = aggregate_calls(expr)
+    if not calls or len(calls) != 1:
+        return None
+    start, end, func, arg = calls[0]
+    masked = mask_sql(expr, mask_parens=False)
+    if not _WRAPPER_HEAD.match(masked[:start]) or not _WRAPPER_TAIL.match(masked[end:]):
+        return None
+    digits = re.search(r",\s*(\d+)", masked[end:])
+    q, w2 = 1 - p, 1 / (p * p)
+    if func == "count":
+        variance = f"(COUNT({arg}) * {q * w2!r})"
+    elif func in ("sum", "total"):
+        variance = f"(TOTAL(({arg}) * ({arg})) * {q * w2!r})"
+    elif func == "avg":
+        variance = f"((AVG(({arg}) * ({arg})) - AVG({arg}) * AVG({arg})) / NULLIF(COUNT({arg}) - 1, 0) * {q!r})"
+    else:
+        return None
+    return variance, int(digits.group(1)) if digits else None
+
+
+def _sampled_from(parsed: dict) -> Optional[str]:
+    """The FROM clause with its first table read from the attached sample instead."""
+    from_sql, table, ref = parsed["from_sql"], parsed["fact_table"], parsed["fact_ref"]
+    m = re.match(rf'\s*"?{re.escape(table)}"?', from_sql)
+    if not m:
+        return None
+    rest = from_sql[m.end():]
+    if ref != table:
+        alias = re.match(rf'\s+(?:AS\s+)?"?{re.escape(ref)}"?', rest, re.IGNORECASE)
+        if not alias:
+            return None
+        rest = rest[alias.end():]
+    return f"samples.{_quote(_sample_table(table))} AS {_quote(ref)}{rest}"
+
+
+def approximate_sql(parsed: dict, p: float) -> Optional[tuple[str, list[tuple[int, Optional[int]]]]]:
+    """
+    SQL answering a parsed aggregate from the sample of its first table, and
+    (output column, ROUND digits) for each trailing variance column; None when
+    the query can't be estimated.
+    """
+    weight = 1 / p
+    from_sql = _sampled_from(parsed)
+    if from_sql is None:
+        return None
+    select, variances = [], []
+    for i, item in enumerate(parsed["items"]):
+        scaled = _scale(item["expr"], weight)
+        if scaled is None:
+            return None
+        select.append(f"{scaled} AS {_quote(item['name'])}")
+        variance = _variance(item["expr"], p)
+        if variance:
+            variances.append((i, variance))
+    select += [f"{sql} AS {_quote(f'__variance_{i}')}" for i, (sql, _) in variances]
+
+    sql = f"SELECT {', '.join(select)} FROM {from_sql}"
+    if parsed["where_sql"]:
+        sql += f" WHERE {parsed['where_sql']}"
+    if parsed["group_sql"]:
+        sql += f" GROUP BY {', '.join(parsed['group_sql'])}"
+    for clause, text in (("HAVING", parsed["having"]), ("ORDER BY", parsed["order_by"])):
+        if text:
+            scaled = _scale(text, weight)
+            if scaled is None:
+                return None
+            sql += f" {clause} {scaled}"
+    if parsed["limit"]:
+        sql += f" LIMIT {parsed['limit']}"
+    return sql, [(i, digits) for i, (_, digits) in variances]
+
+
+def _interval(estimate, variance, z: float, digits: Optional[int]) -> Optional[list]:
+    if estimate is None or variance is None or not isinstance(estimate, (int, float)):
+        return None
+    half = z * math.sqrt(max(variance, 0.0))
+    low, high = estimate - half, estimate + half
+    if digits is not None:
+        low, high = round(low, digits), round(high, digits)
+    return [low, high]
+
+
+# ── Pools ───────────────────────────────────────────────
+class SamplePool(ConnectionPool):
+    """Read-only connections to a source database with its sample sidecar attached as "samples"."""
+
+    def __init__(self, path: str, sidecar: str):
+        super().__init__(path)
+        self.sidecar = sidecar
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = super()._connect()
+        conn.row_factory = None
+        uri = f"file:{pathname2url(os.path.abspath(self.sidecar))}?mode=ro"
+        conn.execute("ATTACH DATABASE ? AS samples", (uri,))
+        return conn
+
+
+# ── Manager ─────────────────────────────────────────────
+class SampleManager:
+    """Keeps samples of large tables fresh in the background and answers queries from them."""
+
+    def __init__(self, directory: str = SAMPLE_DIR, enabled: bool = SAMPLING_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._catalogs: dict[str, tuple] = {}  # sidecar path -> (file signature, columns, {table: sample})
+        self._pools: dict[str, SamplePool] = {}
+        self._lock = threading.Lock()
+        self._maintain_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._sources: Optional[Callable[[], Iterable[tuple[str, str]]]] = None
+        self._z = NormalDist().inv_cdf((1 + SAMPLE_CONFIDENCE) / 2)
+        self._answered = 0
+        self._fallbacks = 0
+        self._refreshes: dict[str, int] = {}
+        self.last_error: Optional[str] = None
+
+    def sidecar_path(self, db_path: str) -> str:
+        path = os.path.abspath(db_path)
+        digest = hashlib.sha1(path.encode()).hexdigest()[:12]
+        return os.path.join(self.directory, f"{os.path.splitext(os.path.basename(path))[0]}-{digest}.db")
+
+    # ── Lifecycle ───────────────────────────────────────
+    def start(self, sources: Callable[[], Iterable[tuple[str, str]]]):
+        """Maintain samples for the (name, path) pairs sources() returns."""
+        if not self.enabled or self._thread:
+            return
+        self._sources = sources
+        self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="samples", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=30)
+            self._thread = None
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def _loop(self):
+        while not self._stopping:
+            for name, path in list(self._sources()):
+                if self._stopping:
+                    return
+                try:
+                    self.maintain(path)
+                except Exception as e:
+                    self.last_error = f"{name}: {e}"
+            self._wake.wait(SAMPLE_REFRESH_SECONDS)
+            self._wake.clear()
+
+    # ── Sidecar ─────────────────────────────────────────
+    def _open_sidecar(self, db_path: str) -> sqlite3.Connection:
+        os.makedirs(self.directory, exist_ok=True)
+        conn = sqlite3.connect(self.sidecar_path(db_path), timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS samples (
+                table_name TEXT PRIMARY KEY,
+                probability REAL NOT NULL,
+                sample_rows INTEGER NOT NULL,
+                table_rows INTEGER NOT NULL,
+                max_rowid INTEGER,
+                source_signature TEXT,
+                built_at TEXT,
+                refreshed_at TEXT,
+                refreshed_epoch REAL,
+                last_refresh TEXT                -- full | incremental
+            );
+        """)
+        uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+        conn.execute("ATTACH DATABASE ? AS src", (uri,))
+        return conn
+
+    def _catalog(self, db_path: str) -> Optional[tuple[set, dict]]:
+        """(source columns, {table: sample}) from the sidecar, re-read whenever it changes."""
+        sidecar = self.sidecar_path(db_path)
+        try:
+            signature = file_signature(sidecar)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._catalogs.get(sidecar)
+            if cached and cached[0] == signature:
+                return cached[1], cached[2]
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(sidecar)}?mode=ro", uri=True)
+            try:
+                conn.row_factory = sqlite3.Row
+                columns = conn.execute("SELECT value FROM meta WHERE key = 'columns'").fetchone()
+                rows = conn.execute("SELECT * FROM samples").fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+        catalog = (set(json.loads(columns[0])) if columns else set(), {r["table_name"]: dict(r) for r in rows})
+        with self._lock:
+            self._catalogs[sidecar] = (signature, *catalog)
+        return catalog
+
+    def _pool(self, db_path: str) -> SamplePool:
+        with self._lock:
+            pool = self._pools.get(db_path)
+            if pool is None:
+                pool = self._pools[db_path] = SamplePool(db_path, self.sidecar_path(db_path))
+            return pool
+
+    # ── Answering ───────────────────────────────────────
+    def _fallback(self, reason: str) -> dict:
+        with self._lock:
+            self._fallbacks += 1
+        return {"mode": "exact", "approximate_unavailable": reason}
+
+    def plan(self, sql: str, db_path: str) -> dict:
+        """How a query would run in approximate mode: {"mode": "approximate", "sql", ...} or an exact fallback."""
+        if not self.enabled:
+            return self._fallback("Sampling is disabled (SAMPLING_ENABLED=0).")
+        catalog = self._catalog(db_path)
+        if catalog is None:
+            self._wake.set()
+            return self._fallback("No samples have been built for this database yet.")
+        columns, samples = catalog
+        parsed = parse_aggregate(sql, columns)
+        if parsed is None:
+            return self._fallback("Only single-level aggregate queries (COUNT / SUM / AVG / MIN / MAX, no "
+                                  "DISTINCT, subqueries or window functions) can be answered from a sample.")
+        sample = samples.get(parsed["fact_table"].lower())
+        if sample is None:
+            return self._fallback(f"Table '{parsed['fact_table']}' has no sample (fewer than "
+                                  f"{SAMPLE_MIN_ROWS} rows, or not built yet).")
+        try:
+            fresh = json.loads(sample["source_signature"]) == file_signature(db_path)
+        except OSError:
+            fresh = False
+        if not fresh:
+            self._wake.set()  # refresh soon rather than at the next interval
+            if time.time() - (sample["refreshed_epoch"] or 0) > SAMPLE_MAX_AGE_SECONDS:
+                return self._fallback(f"The sample of '{parsed['fact_table']}' is out of date; it is being refreshed.")
+        rewritten = approximate_sql(parsed, sample["probability"])
+        if rewritten is None:
+            return self._fallback("The query uses aggregates that cannot be estimated from a sample "
+                                  "(e.g. COUNT(DISTINCT ...)).")
+        return {"mode": "approximate", "sql": rewritten[0], "variances": rewritten[1], "sample": sample,
+                "fresh": fresh}
+
+    def execute(self, sql: str, db_path: str = None, timeout: float = None, max_steps: int = None,
+                query_id: str = None, as_dicts: bool = True) -> Optional[dict[str, Any]]:
+        """
+        Answer a query from samples, fetch_rows-shaped plus "mode": "approximate"
+        and an "approximation" report with per-cell confidence intervals.
+        Returns the exact-fallback {"mode": "exact", "approximate_unavailable"}
+        (without "success") when the query has to run exactly.
+        """
+        path = db_path or database.get_db_path()
+        sql = strip_sql(sql)
+        error = validate_query(sql, path)
+        if error:
+            return {**error_result(error), "mode": "approximate"}
+        plan = self.plan(sql, path)
+        if plan["mode"] != "approximate":
+            return plan
+
+        budget = QueryBudget(timeout, max_steps, query_id)
+        try:
+            with self._pool(path).connection() as conn:
+                cursor = conn.cursor()
+                budget.attach(conn)
+                try:
+                    cursor.execute(plan["sql"])
+                    names = [d[0] for d in cursor.description]
+                    raw = cursor.fetchmany(MAX_ROWS)
+                finally:
+                    budget.detach()
+                    cursor.close()
+        except sqlite3.Error as e:
+            if budget.reason:
+                return {**error_result(str(e), budget), "mode": "approximate"}
+            return self._fallback(f"The sample could not answer the query: {e}")
+
+        width = len(names) - len(plan["variances"])
+        columns = names[:width]
+        intervals = {
+            columns[i]: [_interval(row[i], row[width + n], self._z, digits) for row in raw]
+            for n, (i, digits) in enumerate(plan["variances"])
+        }
+        rows = [row[:width] for row in raw]
+        # Largest interval half-width relative to its estimate, as a one-number precision summary
+        relative = []
+        for i, _ in plan["variances"]:
+            relative += [(cell[1] - cell[0]) / 2 / abs(row[i])
+                         for row, cell in zip(rows, intervals[columns[i]]) if cell and row[i]]
+        sample = plan["sample"]
+        with self._lock:
+            self._answered += 1
+        return {
+            "success": True,
+            "columns": columns,
+            "rows": [dict(zip(columns, row)) for row in rows] if as_dicts else rows,
+            "row_count": len(rows),
+            "truncated": len(rows) >= MAX_ROWS,
+            "mode": "approximate",
+            "approximation": {
+                "table": sample["table_name"],
+                "sample_rows": sample["sample_rows"],
+                "table_rows": sample["table_rows"],
+                "sampling_fraction": sample["probability"],
+                "sample_refreshed_at": sample["refreshed_at"],
+                "sample_fresh": plan["fresh"],
+                "confidence": SAMPLE_CONFIDENCE,
+                "intervals": intervals,
+                "max_relative_error": round(max(relative), 6) if relative else None,
+            },
+        }
+
+    # ── Building ────────────────────────────────────────
+    def maintain(self, db_path: str) -> dict:
+        """Build samples for newly large tables and refresh ones whose source changed."""
+        summary = {"built": [], "dropped": [], "refreshed": {}}
+        with self._maintain_lock:
+            signature = json.dumps(file_signature(db_path))
+            sidecar = self._open_sidecar(db_path)
+            try:
+                checked = sidecar.execute("SELECT value FROM meta WHERE key = 'source_signature'").fetchone()
+                if checked and checked[0] == signature:
+                    return summary
+                source = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+                try:
+                    columns = source_columns(source)
+                    sizes = self._table_sizes(source, db_path)
+                finally:
+                    source.close()
+                existing = {r["table_name"]: r for r in sidecar.execute("SELECT * FROM samples")}
+                for table in existing.keys() - sizes.keys():
+                    self._drop(sidecar, table)
+                    summary["dropped"].append(table)
+                for table, (count, max_rowid) in sizes.items():
+                    if table not in existing:
+                        self._build(sidecar, table, count, max_rowid, signature)
+                        summary["built"].append(table)
+                        continue
+                    kind = self._refresh(sidecar, existing[table], count, max_rowid, signature)
+                    summary["refreshed"][table] = kind
+                    self._refreshes[kind] = self._refreshes.get(kind, 0) + 1
+                with sidecar:
+                    sidecar.execute("INSERT OR REPLACE INTO meta VALUES ('columns', ?)", (json.dumps(sorted(columns)),))
+                    sidecar.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (os.path.abspath(db_path),))
+                    sidecar.execute("INSERT OR REPLACE INTO meta VALUES ('source_signature', ?)", (signature,))
+            finally:
+                sidecar.close()
+        return summary
+
+    @staticmethod
+    def _table_sizes(source: sqlite3.Connection, db_path: str) -> dict[str, tuple[int, int]]:
+        """{table: (rows, max rowid)} for rowid tables with at least SAMPLE_MIN_ROWS rows."""
+        # The schema cache's estimates pick the candidates; only those are counted exactly
+        candidates = [t["table_name"] for t in database.get_schema(db_path)
+                      if t["row_count"] >= SAMPLE_MIN_ROWS // 2]
+        sizes = {}
+        for table in candidates:
+            try:
+                count, max_rowid = source.execute(f"SELECT COUNT(*), MAX(rowid) FROM {_quote(table)}").fetchone()
+            except sqlite3.Error:
+                continue  # WITHOUT ROWID tables are not sampled
+            if count >= SAMPLE_MIN_ROWS:
+                sizes[table.lower()] = (count, max_rowid or 0)
+        return sizes
+
+    def _build(self, sidecar: sqlite3.Connection, table: str, count: int, max_rowid: int, signature: str):
+        """(Re)sample a table from scratch, keeping each row with probability SAMPLE_ROWS / count."""
+        threshold = max(1, min(_RESOLUTION, round(SAMPLE_ROWS / count * _RESOLUTION)))
+        target = _quote(_sample_table(table))
+        now = datetime.now()
+        with sidecar:
+            sidecar.execute(f"DROP TABLE IF EXISTS {target}")
+            sidecar.execute(f"CREATE TABLE {target} AS SELECT * FROM src.{_quote(table)} "
+                            f"WHERE rowid <= ? AND abs(random() % {_RESOLUTION}) < {threshold}", (max_rowid,))
+            rows = sidecar.execute(f"SELECT COUNT(*) FROM {target}").fetchone()[0]
+            sidecar.execute(
+                "INSERT OR REPLACE INTO samples (table_name, probability, sample_rows, table_rows, max_rowid, "
+                "source_signature, built_at, refreshed_at, refreshed_epoch, last_refresh) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (table, threshold / _RESOLUTION, rows, count, max_rowid, signature, now.isoformat(),
+                 now.isoformat(), now.timestamp(), "full"),
+            )
+
+    def _refresh(self, sidecar: sqlite3.Connection, row: sqlite3.Row, count: int, max_rowid: int,
+                 signature: str) -> str:
+        """Bring a sample up to date after its source file changed: "incremental" or "full"."""
+        table = row["table_name"]
+        p = row["probability"]
+        kind = "full"
+        if SAMPLE_INCREMENTAL and count * p <= 2 * SAMPLE_ROWS and max_rowid > row["max_rowid"]:
+            appended = sidecar.execute(
+                f"SELECT COUNT(*) FROM src.{_quote(table)} WHERE rowid > ?", (row["max_rowid"],)
+            ).fetchone()[0]
+            if count - row["table_rows"] == appended:
+                kind = "incremental"
+        if kind == "full":
+            self._build(sidecar, table, count, max_rowid, signature)
+            return kind
+
+        now = datetime.now()
+        with sidecar:
+            sidecar.execute(
+                f"INSERT INTO {_quote(_sample_table(table))} SELECT * FROM src.{_quote(table)} "
+                f"WHERE rowid > ? AND rowid <= ? AND abs(random() % {_RESOLUTION}) < {round(p * _RESOLUTION)}",
+                (row["max_rowid"], max_rowid),
+            )
+            rows = sidecar.execute(f"SELECT COUNT(*) FROM {_quote(_sample_table(table))}").fetchone()[0]
+            sidecar.execute(
+                "UPDATE samples SET sample_rows = ?, table_rows = ?, max_rowid = ?, source_signature = ?, "
+                "refreshed_at = ?, refreshed_epoch = ?, last_refresh = ? WHERE table_name = ?",
+                (rows, count, max_rowid, signature, now.isoformat(), now.timestamp(), kind, table),
+            )
+        return kind
+
+    @staticmethod
+    def _drop(sidecar: sqlite3.Connection, table: str):
+        with sidecar:
+            sidecar.execute(f"DROP TABLE IF EXISTS {_quote(_sample_table(table))}")
+            sidecar.execute("DELETE FROM samples WHERE table_name = ?", (table,))
+
+    # ── Admin ───────────────────────────────────────────
+    def list(self, db_path: str) -> list[dict]:
+        """Samples of a database with their freshness."""
+        catalog = self._catalog(db_path)
+        if not catalog:
+            return []
+        try:
+            current = file_signature(db_path)
+        except OSError:
+            current = None
+        return [
+            {
+                "table": s["table_name"],
+                "fresh": json.loads(s["source_signature"]) == current,
+                "sample_rows": s["sample_rows"],
+                "table_rows": s["table_rows"],
+                "sampling_fraction": s["probability"],
+                "built_at": s["built_at"],
+                "refreshed_at": s["refreshed_at"],
+                "last_refresh": s["last_refresh"],
+            }
+            for s in catalog[1].values()
+        ]
+
+    def clear(self, db_path: str):
+        """Drop every sample of a database."""
+        with self._maintain_lock:
+            with self._lock:
+                pool = self._pools.pop(db_path, None)
+                self._catalogs.pop(self.sidecar_path(db_path), None)
+            if pool:
+                pool.close()
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.sidecar_path(db_path) + suffix)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "answered": self._answered, "fallbacks": self._fallbacks,
+                    "refreshes": dict(self._refreshes), "last_error": self.last_error}
+
+
+samples = SampleManager()
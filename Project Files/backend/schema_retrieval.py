@@ -0,0 +1,121 @@
+"""
+Schema retrieval for Smart Bridge SQL Querying.
+Picks the tables relevant to a question so large schemas are not sent to
+Gemini in full: identifier-token overlap scoring plus foreign-key neighbours.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from database import format_schema_text
+
+# Schemas with at most this many tables are always sent in full
+SCHEMA_COMPACT_MIN_TABLES = int(os.getenv("SCHEMA_COMPACT_MIN_TABLES", "12"))
+# Number of best-scoring tables kept before adding FK neighbours
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "8"))
+# Best table score needed to trust the selection; below it the full schema is used
+SCHEMA_MIN_SCORE = float(os.getenv("SCHEMA_MIN_SCORE", "2"))
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "for", "to", "by", "with", "and", "or", "is", "are", "was", "were",
+    "what", "which", "who", "how", "many", "much", "show", "me", "list", "give", "get", "find", "all",
+    "each", "per", "from", "that", "this", "their", "there", "do", "does", "did", "have", "has", "top",
+    "most", "least", "than", "more", "less", "between", "over", "under", "it", "its", "be", "as", "at",
+}
+
+TABLE_NAME_WEIGHT = 3.0
+COLUMN_WEIGHT = 1.0
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def identifier_tokens(name: str) -> set[str]:
+    """Split snake_case / camelCase identifiers into stemmed lowercase tokens."""
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return {_stem(t) for t in re.split(r"[^A-Za-z0-9]+", spaced.lower()) if t}
+
+
+def question_tokens(question: str) -> set[str]:
+    return {_stem(t) for t in re.findall(r"[a-z0-9]+", question.lower()) if t not in _STOPWORDS}
+
+
+class _SchemaIndex:
+    """Per-schema token sets and FK adjacency, built once per fingerprint."""
+
+    def __init__(self, schema: list[dict]):
+        self.tables = {t["table_name"]: t for t in schema}
+        self.name_tokens = {name: identifier_tokens(name) for name in self.tables}
+        self.column_tokens = {
+            name: set().union(*(identifier_tokens(c["name"]) for c in t["columns"])) if t["columns"] else set()
+            for name, t in self.tables.items()
+        }
+        self.neighbours = {name: set() for name in self.tables}
+        for name, t in self.tables.items():
+            for fk in t["foreign_keys"]:
+                if fk["to_table"] in self.neighbours:
+                    self.neighbours[name].add(fk["to_table"])
+                    self.neighbours[fk["to_table"]].add(name)
+
+    def score(self, tokens: set[str]) -> dict[str, float]:
+        return {
+            name: TABLE_NAME_WEIGHT * len(tokens & self.name_tokens[name])
+            + COLUMN_WEIGHT * len(tokens & (self.column_tokens[name] - self.name_tokens[name]))
+            for name in self.tables
+        }
+
+
+_indexes: OrderedDict[str, _SchemaIndex] = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _index_for(schema: list[dict], fingerprint: str) -> _SchemaIndex:
+    with _indexes_lock:
+        index = _indexes.get(fingerprint)
+        if index is None:
+            index = _indexes[fingerprint] = _SchemaIndex(schema)
+            while len(_indexes) > 16:
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(fingerprint)
+        return index
+
+
+def select_schema(question: str, schema: list[dict], fingerprint: str, full_text: str) -> dict:
+    """
+    Choose the schema text to send for a question.
+
+    Returns:
+        dict with keys: text, tables (names included), compacted, top_score
+    """
+    result = {"text": full_text, "tables": [t["table_name"] for t in schema], "compacted": False, "top_score": None}
+    if len(schema) <= SCHEMA_COMPACT_MIN_TABLES:
+        return result
+
+    index = _index_for(schema, fingerprint)
+    scores = index.score(question_tokens(question))
+    ranked = sorted((s, name) for name, s in scores.items() if s > 0)[::-1]
+    top_score = ranked[0][0] if ranked else 0.0
+    result["top_score"] = top_score
+    if top_score < SCHEMA_MIN_SCORE:
+        return result
+
+    chosen = [name for _, name in ranked[:SCHEMA_TOP_K]]
+    selected = set(chosen)
+    for name in chosen:
+        selected |= index.neighbours[name]
+    if len(selected) >= len(schema):
+        return result
+
+    subset = [t for t in schema if t["table_name"] in selected]
+    return {"text": format_schema_text(subset), "tables": [t["table_name"] for t in subset],
+            "compacted": True, "top_score": top_score}
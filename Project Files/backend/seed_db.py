@@ -1,24 +1,374 @@
 """
 Seed script to create and populate a sample e-commerce SQLite database.
 Run: python seed_db.py
+     python seed_db.py --rows 1e6 --db data/bench_1e6.db   # synthetic data for benchmarks
+     python seed_db.py --scale 100 --workers 8 --db data/sf100.db   # 100M orders, generated in parallel
 """
 
 import sqlite3
 import os
+import time
 import random
+import shutil
+import argparse
+import operator
+import itertools
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from typing import Optional
 
 DB_DIR = os.path.join(os.path.dirname(__file__), "data")
 DB_PATH = os.path.join(DB_DIR, "sample.db")
 
+# Rows per executemany when generating scaled data
+SCALED_BATCH_SIZE = 50_000
+# Driving rows (customers, orders or reviews) per shard, the unit of parallel generation
+SHARD_ROWS = 1_000_000
+# --scale N means N million orders, about 4N million rows in total
+ORDERS_PER_SCALE = 1_000_000
+ITEMS_PER_ORDER = (1, 2, 3, 4)
 
-def create_database():
-    os.makedirs(DB_DIR, exist_ok=True)
+# Nothing needs to survive a crash while a file is being built, so the load
+# runs without a rollback journal or fsyncs; normal settings are restored after.
+LOAD_PRAGMAS = (
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+)
 
-    if os.path.exists(DB_PATH):
-        os.remove(DB_PATH)
+# Secondary indexes, built once the data is loaded
+INDEXES = [
+    "CREATE INDEX idx_products_category_id ON products(category_id)",
+    "CREATE INDEX idx_orders_customer_id ON orders(customer_id)",
+    "CREATE INDEX idx_orders_order_date ON orders(order_date)",
+    "CREATE INDEX idx_order_items_order_id ON order_items(order_id)",
+    "CREATE INDEX idx_order_items_product_id ON order_items(product_id)",
+    "CREATE INDEX idx_reviews_product_id ON reviews(product_id)",
+    "CREATE INDEX idx_reviews_customer_id ON reviews(customer_id)",
+]
 
-    conn = sqlite3.connect(DB_PATH)
+# Columns written by the scaled generators (order_items ids are assigned on insert)
+_LOAD_COLUMNS = {
+    "customers": ("id", "first_name", "last_name", "email", "city", "country", "joined_at"),
+    "orders": ("id", "customer_id", "order_date", "total_amount", "status"),
+    "order_items": ("order_id", "product_id", "quantity", "unit_price"),
+    "reviews": ("id", "product_id", "customer_id", "rating", "comment", "review_date"),
+}
+# Tables written by each kind of shard
+_SHARD_TABLES = {"customers": ("customers",), "orders": ("orders", "order_items"), "reviews": ("reviews",)}
+
+CATEGORIES = [
+    ("Electronics", "Gadgets, devices, and accessories"),
+    ("Clothing", "Apparel and fashion items"),
+    ("Books", "Fiction, non-fiction, and textbooks"),
+    ("Home & Kitchen", "Furniture, cookware, and decor"),
+    ("Sports", "Sports equipment and accessories"),
+    ("Beauty", "Skincare, makeup, and personal care"),
+]
+
+PRODUCTS = [
+    # Electronics
+    ("Wireless Earbuds Pro", 1, 2499.00, 150, 4.5),
+    ("Smartphone X12", 1, 18999.00, 45, 4.3),
+    ("Laptop UltraSlim", 1, 54999.00, 20, 4.7),
+    ("Bluetooth Speaker", 1, 1299.00, 200, 4.1),
+    ("Smart Watch S3", 1, 3999.00, 80, 4.4),
+    ("USB-C Hub Adapter", 1, 899.00, 300, 4.2),
+    ("Mechanical Keyboard", 1, 2799.00, 65, 4.6),
+    ("Wireless Mouse", 1, 599.00, 400, 4.0),
+    # Clothing
+    ("Cotton T-Shirt", 2, 499.00, 500, 4.2),
+    ("Denim Jacket", 2, 2199.00, 60, 4.5),
+    ("Running Shoes", 2, 3499.00, 100, 4.6),
+    ("Formal Shirt", 2, 1299.00, 150, 4.1),
+    ("Hoodie Classic", 2, 1599.00, 120, 4.3),
+    # Books
+    ("Python Programming", 3, 599.00, 200, 4.8),
+    ("Data Structures & Algorithms", 3, 699.00, 150, 4.7),
+    ("Machine Learning Basics", 3, 899.00, 80, 4.5),
+    ("Web Dev Bootcamp", 3, 499.00, 250, 4.4),
+    ("Clean Code", 3, 749.00, 100, 4.9),
+    # Home & Kitchen
+    ("Non-stick Pan Set", 4, 1899.00, 70, 4.3),
+    ("Coffee Maker", 4, 4999.00, 30, 4.6),
+    ("LED Desk Lamp", 4, 799.00, 180, 4.4),
+    ("Storage Organizer", 4, 599.00, 220, 4.1),
+    # Sports
+    ("Yoga Mat Premium", 5, 999.00, 150, 4.5),
+    ("Resistance Bands Set", 5, 699.00, 200, 4.3),
+    ("Cricket Bat Pro", 5, 2499.00, 40, 4.7),
+    ("Football Official", 5, 1199.00, 90, 4.4),
+    # Beauty
+    ("Sunscreen SPF50", 6, 399.00, 300, 4.6),
+    ("Face Wash Gel", 6, 249.00, 400, 4.2),
+    ("Moisturizer Cream", 6, 549.00, 250, 4.5),
+    ("Hair Serum", 6, 449.00, 180, 4.3),
+]
+
+FIRST_NAMES = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya",
+               "Rahul", "Meera", "Aditya", "Ishita", "Karan", "Divya", "Nikhil",
+               "Pooja", "Siddharth", "Riya", "Amit", "Neha"]
+LAST_NAMES = ["Sharma", "Patel", "Kumar", "Singh", "Gupta", "Reddy", "Joshi", "Verma",
+              "Iyer", "Nair", "Rao", "Das", "Mehta", "Shah", "Chopra",
+              "Malhotra", "Bose", "Dutta", "Pillai", "Menon"]
+CITIES = ["Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Kolkata", "Pune",
+          "Ahmedabad", "Jaipur", "Lucknow"]
+
+STATUSES = ["completed", "completed", "completed", "shipped", "pending", "cancelled"]
+
+COMMENTS = [
+    "Great product, highly recommend!",
+    "Good quality for the price.",
+    "Exceeded my expectations.",
+    "Decent product, could be better.",
+    "Amazing! Will buy again.",
+    "Fast delivery and great packaging.",
+    "Value for money.",
+    "Loved it, perfect for daily use.",
+]
+
+
+def scaled_counts(rows: int) -> dict[str, int]:
+    """Table sizes for a synthetic database of roughly `rows` rows (order_items ≈ 2.5 per order)."""
+    return {
+        "products": max(len(PRODUCTS), rows // 1000),
+        "customers": max(len(FIRST_NAMES), rows // 20),
+        "orders": max(50, rows // 4),
+        "reviews": max(60, rows // 10),
+    }
+
+
+def _insert_sql(table: str) -> str:
+    columns = _LOAD_COLUMNS[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def _apply_load_pragmas(conn: sqlite3.Connection):
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+
+
+# ── Batch generators ────────────────────────────────────
+# Each yields (table, rows) for SCALED_BATCH_SIZE driving rows at a time. Columns
+# are drawn whole with rng.choices and zipped into rows, instead of calling
+# random once per value.
+def _customer_batches(ctx: dict, start: int, stop: int, rng: random.Random):
+    first_lower = [n.lower() for n in FIRST_NAMES]
+    last_lower = [n.lower() for n in LAST_NAMES]
+    n_first, n_last = len(FIRST_NAMES), len(LAST_NAMES)
+    for lo in range(start, stop, SCALED_BATCH_SIZE):
+        ids = range(lo, min(lo + SCALED_BATCH_SIZE, stop))
+        first = [i % n_first for i in ids]
+        last = [(i // n_first) % n_last for i in ids]
+        yield "customers", zip(
+            ids,
+            map(FIRST_NAMES.__getitem__, first),
+            map(LAST_NAMES.__getitem__, last),
+            [f"{first_lower[f]}.{last_lower[g]}.{i}@email.com" for i, f, g in zip(ids, first, last)],
+            rng.choices(CITIES, k=len(ids)),
+            itertools.repeat("India"),
+            rng.choices(ctx["join_dates"], k=len(ids)),
+        )
+
+
+def _order_batches(ctx: dict, start: int, stop: int, rng: random.Random):
+    prices, n_products = ctx["prices"], ctx["products"]
+    customer_ids = range(1, ctx["customers"] + 1)
+    # An order's lines are `stride` apart in the product list, so they are
+    # distinct and spread across categories without a per-order sample()
+    stride = max(1, n_products // 4)
+    for lo in range(start, stop, SCALED_BATCH_SIZE):
+        ids = range(lo, min(lo + SCALED_BATCH_SIZE, stop))
+        lines = rng.choices(ITEMS_PER_ORDER, k=len(ids))
+        bases = rng.choices(range(n_products), k=len(ids))
+        product_ids = [(base + j * stride) % n_products + 1 for base, n in zip(bases, lines) for j in range(n)]
+        quantities = rng.choices((1, 2, 3), k=len(product_ids))
+        unit_prices = list(map(prices.__getitem__, product_ids))
+        running = list(itertools.accumulate(map(operator.mul, quantities, unit_prices), initial=0))
+        ends = itertools.accumulate(lines)
+        totals = [round(running[end] - running[end - n], 2) for end, n in zip(ends, lines)]
+        yield "orders", zip(
+            ids,
+            rng.choices(customer_ids, k=len(ids)),
+            rng.choices(ctx["order_dates"], k=len(ids)),
+            totals,
+            rng.choices(STATUSES, k=len(ids)),
+        )
+        order_ids = itertools.chain.from_iterable(map(itertools.repeat, ids, lines))
+        yield "order_items", zip(order_ids, product_ids, quantities, unit_prices)
+
+
+def _review_batches(ctx: dict, start: int, stop: int, rng: random.Random):
+    product_ids, customer_ids = range(1, ctx["products"] + 1), range(1, ctx["customers"] + 1)
+    for lo in range(start, stop, SCALED_BATCH_SIZE):
+        ids = range(lo, min(lo + SCALED_BATCH_SIZE, stop))
+        yield "reviews", zip(
+            ids,
+            rng.choices(product_ids, k=len(ids)),
+            rng.choices(customer_ids, k=len(ids)),
+            rng.choices((3, 4, 5), k=len(ids)),
+            rng.choices(COMMENTS, k=len(ids)),
+            rng.choices(ctx["review_dates"], k=len(ids)),
+        )
+
+
+_GENERATORS = {"customers": _customer_batches, "orders": _order_batches, "reviews": _review_batches}
+
+
+def _shards(counts: dict[str, int]):
+    """(table, first id, stop id) work units. Fixed by the counts, so output does not depend on --workers."""
+    for table in _GENERATORS:
+        for start in range(1, counts[table] + 1, SHARD_ROWS):
+            yield table, start, min(start + SHARD_ROWS, counts[table] + 1)
+
+
+def _shard_rng(seed: Optional[int], table: str, start: int) -> random.Random:
+    return random.Random(None if seed is None else f"{seed}:{table}:{start}")
+
+
+def _load_shard(conn: sqlite3.Connection, ctx: dict, shard: tuple, seed: Optional[int]) -> dict[str, int]:
+    table, start, stop = shard
+    loaded: dict[str, int] = {}
+    cursor = conn.cursor()
+    for name, rows in _GENERATORS[table](ctx, start, stop, _shard_rng(seed, table, start)):
+        cursor.executemany(_insert_sql(name), rows)
+        loaded[name] = loaded.get(name, 0) + cursor.rowcount
+    conn.commit()
+    return loaded
+
+
+def _build_shard_file(args: tuple) -> tuple[str, dict[str, int]]:
+    """Worker: generate one shard into its own file, for the parent to ATTACH and copy."""
+    path, ctx, shard, seed = args
+    conn = sqlite3.connect(path)
+    _apply_load_pragmas(conn)
+    for table in _SHARD_TABLES[shard[0]]:
+        conn.execute(f"CREATE TABLE {table} ({', '.join(_LOAD_COLUMNS[table])})")
+    loaded = _load_shard(conn, ctx, shard, seed)
+    conn.close()
+    return path, loaded
+
+
+def _merge_shard(conn: sqlite3.Connection, path: str):
+    """Copy a shard file's rows into the main database in one INSERT ... SELECT per table."""
+    conn.commit()  # ATTACH cannot run inside a transaction
+    conn.execute("ATTACH DATABASE ? AS shard", (path,))
+    try:
+        for (table,) in conn.execute("SELECT name FROM shard.sqlite_master WHERE type = 'table'").fetchall():
+            columns = ", ".join(_LOAD_COLUMNS[table])
+            conn.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM shard.{table} ORDER BY rowid")
+        conn.commit()
+    finally:
+        conn.execute("DETACH DATABASE shard")
+    os.remove(path)
+
+
+def _seed_scaled(conn: sqlite3.Connection, db_path: str, rows: int, seed: Optional[int],
+                 workers: int = 1) -> dict[str, int]:
+    """
+    Generate synthetic data shard by shard, so memory stays flat even at 10^8
+    rows. Each shard is written to its own constraint-free file next to the
+    database, then copied in with one INSERT ... SELECT per table, which is
+    much cheaper than row-by-row inserts into the AUTOINCREMENT tables. With
+    workers > 1 the shard files are generated in parallel.
+    """
+    counts = scaled_counts(rows)
+    rng = random.Random(seed)
+    today = datetime.now()
+    dates = [(today - timedelta(days=d)).strftime("%Y-%m-%d") for d in range(366)]
+
+    conn.executemany("INSERT INTO categories (name, description) VALUES (?, ?)", CATEGORIES)
+
+    products = []
+    for i in range(counts["products"]):
+        name, category_id, price, _, _ = PRODUCTS[i % len(PRODUCTS)]
+        variant = i // len(PRODUCTS)
+        products.append((
+            f"{name} #{variant}" if variant else name,
+            category_id,
+            round(price * rng.uniform(0.8, 1.2), 2) if variant else price,
+            rng.randint(0, 500),
+            round(rng.uniform(3.0, 5.0), 1),
+        ))
+    conn.executemany(
+        "INSERT INTO products (name, category_id, price, stock_quantity, rating) VALUES (?, ?, ?, ?, ?)",
+        products,
+    )
+    ctx = {
+        "prices": [0.0] + [p[2] for p in products],  # indexed by product id
+        "products": len(products),
+        "customers": counts["customers"],
+        "join_dates": dates[30:],
+        "order_dates": dates[1:181],
+        "review_dates": dates[1:121],
+    }
+
+    totals = {"categories": len(CATEGORIES), "products": len(products)}
+
+    def merge(result: tuple[str, dict[str, int]]):
+        path, loaded = result
+        _merge_shard(conn, path)
+        for table, n in loaded.items():
+            totals[table] = totals.get(table, 0) + n
+
+    parts_dir = tempfile.mkdtemp(prefix=".seed-", dir=os.path.dirname(os.path.abspath(db_path)))
+    jobs = [(os.path.join(parts_dir, f"{n:05d}.db"), ctx, shard, seed) for n, shard in enumerate(_shards(counts))]
+    try:
+        if workers <= 1:
+            for job in jobs:
+                merge(_build_shard_file(job))
+        else:
+            # Shards merge in submission order, so ids come out the same for any number
+            # of workers; the window bounds how many unmerged shard files sit on disk.
+            with ProcessPoolExecutor(workers) as pool:
+                pending = deque()
+                for job in jobs:
+                    pending.append(pool.submit(_build_shard_file, job))
+                    if len(pending) >= 2 * workers:
+                        merge(pending.popleft().result())
+                while pending:
+                    merge(pending.popleft().result())
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    conn.commit()
+    return {"categories": totals["categories"], "products": totals["products"],
+            **{table: totals.get(table, 0) for table in ("customers", "orders", "reviews", "order_items")}}
+
+
+def build_indexes(conn: sqlite3.Connection, analysis_limit: int = 0, threads: int = 1):
+    """
+    Create secondary indexes (one sort per index, cheaper than maintaining them
+    during the load) and gather planner statistics. `threads` lets SQLite sort in parallel.
+    """
+    conn.execute(f"PRAGMA threads = {int(threads)}")
+    for statement in INDEXES:
+        conn.execute(statement)
+    if analysis_limit:
+        conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def create_database(db_path: str = DB_PATH, rows: int = 0, seed: int = None, workers: int = 1,
+                    analysis_limit: int = 0):
+    """
+    (Re)create the sample database at db_path. With rows > 0 the tables are
+    filled with roughly that many synthetic rows instead of the demo data,
+    generated by `workers` processes. Secondary indexes and ANALYZE statistics
+    are built after the load.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    _apply_load_pragmas(conn)
     cursor = conn.cursor()
 
     # ── Tables ──────────────────────────────────────────────
@@ -82,74 +432,32 @@ def create_database():
     """)
 
     # ── Seed Data ───────────────────────────────────────────
-    categories = [
-        ("Electronics", "Gadgets, devices, and accessories"),
-        ("Clothing", "Apparel and fashion items"),
-        ("Books", "Fiction, non-fiction, and textbooks"),
-        ("Home & Kitchen", "Furniture, cookware, and decor"),
-        ("Sports", "Sports equipment and accessories"),
-        ("Beauty", "Skincare, makeup, and personal care"),
-    ]
-    cursor.executemany("INSERT INTO categories (name, description) VALUES (?, ?)", categories)
-
-    products_data = [
-        # Electronics
-        ("Wireless Earbuds Pro", 1, 2499.00, 150, 4.5),
-        ("Smartphone X12", 1, 18999.00, 45, 4.3),
-        ("Laptop UltraSlim", 1, 54999.00, 20, 4.7),
-        ("Bluetooth Speaker", 1, 1299.00, 200, 4.1),
-        ("Smart Watch S3", 1, 3999.00, 80, 4.4),
-        ("USB-C Hub Adapter", 1, 899.00, 300, 4.2),
-        ("Mechanical Keyboard", 1, 2799.00, 65, 4.6),
-        ("Wireless Mouse", 1, 599.00, 400, 4.0),
-        # Clothing
-        ("Cotton T-Shirt", 2, 499.00, 500, 4.2),
-        ("Denim Jacket", 2, 2199.00, 60, 4.5),
-        ("Running Shoes", 2, 3499.00, 100, 4.6),
-        ("Formal Shirt", 2, 1299.00, 150, 4.1),
-        ("Hoodie Classic", 2, 1599.00, 120, 4.3),
-        # Books
-        ("Python Programming", 3, 599.00, 200, 4.8),
-        ("Data Structures & Algorithms", 3, 699.00, 150, 4.7),
-        ("Machine Learning Basics", 3, 899.00, 80, 4.5),
-        ("Web Dev Bootcamp", 3, 499.00, 250, 4.4),
-        ("Clean Code", 3, 749.00, 100, 4.9),
-        # Home & Kitchen
-        ("Non-stick Pan Set", 4, 1899.00, 70, 4.3),
-        ("Coffee Maker", 4, 4999.00, 30, 4.6),
-        ("LED Desk Lamp", 4, 799.00, 180, 4.4),
-        ("Storage Organizer", 4, 599.00, 220, 4.1),
-        # Sports
-        ("Yoga Mat Premium", 5, 999.00, 150, 4.5),
-        ("Resistance Bands Set", 5, 699.00, 200, 4.3),
-        ("Cricket Bat Pro", 5, 2499.00, 40, 4.7),
-        ("Football Official", 5, 1199.00, 90, 4.4),
-        # Beauty
-        ("Sunscreen SPF50", 6, 399.00, 300, 4.6),
-        ("Face Wash Gel", 6, 249.00, 400, 4.2),
-        ("Moisturizer Cream", 6, 549.00, 250, 4.5),
-        ("Hair Serum", 6, 449.00, 180, 4.3),
-    ]
+    if rows > 0:
+        counts = _seed_scaled(conn, db_path, rows, seed, workers)
+        loaded = time.perf_counter()
+        build_indexes(conn, analysis_limit, workers)
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.close()
+        print(f"✅ Scaled database created at: {db_path}")
+        print("   - " + ", ".join(f"{n:,} {table}" for table, n in counts.items()))
+        print(f"   - loaded in {loaded - started:.1f}s, indexed and analyzed in {time.perf_counter() - loaded:.1f}s")
+        return counts
+
+    if seed is not None:
+        random.seed(seed)
+    cursor.executemany("INSERT INTO categories (name, description) VALUES (?, ?)", CATEGORIES)
+
     cursor.executemany(
         "INSERT INTO products (name, category_id, price, stock_quantity, rating) VALUES (?, ?, ?, ?, ?)",
-        products_data,
+        PRODUCTS,
     )
 
-    first_names = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya",
-                    "Rahul", "Meera", "Aditya", "Ishita", "Karan", "Divya", "Nikhil",
-                    "Pooja", "Siddharth", "Riya", "Amit", "Neha"]
-    last_names = ["Sharma", "Patel", "Kumar", "Singh", "Gupta", "Reddy", "Joshi", "Verma",
-                  "Iyer", "Nair", "Rao", "Das", "Mehta", "Shah", "Chopra",
-                  "Malhotra", "Bose", "Dutta", "Pillai", "Menon"]
-    cities = ["Mumbai", "Delhi", "Bangalore", "Hyderabad", "Chennai", "Kolkata", "Pune",
-              "Ahmedabad", "Jaipur", "Lucknow"]
-
     customers_data = []
     for i in range(20):
-        fn = first_names[i]
-        ln = last_names[i]
+        fn = FIRST_NAMES[i]
+        ln = LAST_NAMES[i]
         email = f"{fn.lower()}.{ln.lower()}@email.com"
-        city = random.choice(cities)
+        city = random.choice(CITIES)
         joined = (datetime.now() - timedelta(days=random.randint(30, 365))).strftime("%Y-%m-%d")
         customers_data.append((fn, ln, email, city, "India", joined))
 
@@ -159,12 +467,11 @@ def create_database():
     )
 
     # Orders & Order Items
-    statuses = ["completed", "completed", "completed", "shipped", "pending", "cancelled"]
     order_id = 1
     for _ in range(50):
         cust_id = random.randint(1, 20)
         order_date = (datetime.now() - timedelta(days=random.randint(1, 180))).strftime("%Y-%m-%d")
-        status = random.choice(statuses)
+        status = random.choice(STATUSES)
 
         num_items = random.randint(1, 4)
         prod_ids = random.sample(range(1, 31), num_items)
@@ -172,7 +479,7 @@ def create_database():
         items = []
         for pid in prod_ids:
             qty = random.randint(1, 3)
-            price = products_data[pid - 1][2]
+            price = PRODUCTS[pid - 1][2]
             items.append((order_id, pid, qty, price))
             total += qty * price
 
@@ -192,17 +499,7 @@ def create_database():
         pid = random.randint(1, 30)
         cid = random.randint(1, 20)
         rating = random.randint(3, 5)
-        comments = [
-            "Great product, highly recommend!",
-            "Good quality for the price.",
-            "Exceeded my expectations.",
-            "Decent product, could be better.",
-            "Amazing! Will buy again.",
-            "Fast delivery and great packaging.",
-            "Value for money.",
-            "Loved it, perfect for daily use.",
-        ]
-        comment = random.choice(comments)
+        comment = random.choice(COMMENTS)
         review_date = (datetime.now() - timedelta(days=random.randint(1, 120))).strftime("%Y-%m-%d")
         reviews_data.append((pid, cid, rating, comment, review_date))
 
@@ -212,11 +509,25 @@ def create_database():
     )
 
     conn.commit()
+    build_indexes(conn)
+    conn.execute("PRAGMA journal_mode = DELETE")
     conn.close()
-    print(f"✅ Sample database created at: {DB_PATH}")
+    print(f"✅ Sample database created at: {db_path}")
     print(f"   - 6 categories, 30 products, 20 customers")
     print(f"   - 50 orders, ~100+ order items, 60 reviews")
 
 
 if __name__ == "__main__":
-    create_database()
+    parser = argparse.ArgumentParser(description="Create the sample e-commerce database.")
+    parser.add_argument("--db", default=DB_PATH, help="output file (default: data/sample.db)")
+    parser.add_argument("--rows", type=float, default=0, help="approximate total rows, e.g. 1e6 (default: demo data)")
+    parser.add_argument("--scale", type=float, default=0,
+                        help=f"scale factor: {ORDERS_PER_SCALE:,} orders per unit (overrides --rows)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible data")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes generating shards in parallel (0 = one per CPU)")
+    parser.add_argument("--analysis-limit", type=int, default=0,
+                        help="rows ANALYZE samples per index (0 = exact; try 1000 for very large files)")
+    args = parser.parse_args()
+    rows = int(args.scale * ORDERS_PER_SCALE * 4) if args.scale else int(args.rows)
+    create_database(args.db, rows, args.seed, args.workers or os.cpu_count() or 1, args.analysis_limit)
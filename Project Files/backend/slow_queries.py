@@ -0,0 +1,379 @@
+"""
+Slow-query log for Smart Bridge SQL Querying.
+fetch_rows reports every statement that takes longer than SLOW_QUERY_MS,
+together with its EXPLAIN QUERY PLAN, elapsed time, SQLite VM steps and an
+estimate of rows scanned. analyze() groups the log by query shape, finds full
+table scans on filtered or joined columns and proposes indexes.
+test_indexes() (admin only) builds those indexes on a scratch copy of the
+database and times the query again; the live database is never modified.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import statistics
+import threading
+from datetime import datetime
+from typing import Optional
+from urllib.request import pathname2url
+
+from sql_utils import mask_sql, sql_shape, table_aliases
+
+DB_DIR = os.path.join(os.path.dirname(__file__), "data")
+SLOW_QUERY_LOG_PATH = os.getenv("SLOW_QUERY_LOG_PATH", os.path.join(DB_DIR, "slow_queries.db"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))  # 0 disables the log
+SLOW_QUERY_MAX_ROWS = int(os.getenv("SLOW_QUERY_MAX_ROWS", "10000"))
+# Allows POST /api/slow-queries/{shape_id}/test-indexes, which copies the whole database file
+SLOW_QUERY_ADMIN = os.getenv("SLOW_QUERY_ADMIN", "0") == "1"
+INDEX_TRIAL_DIR = os.getenv("INDEX_TRIAL_DIR", os.path.join(DB_DIR, "index_trials"))
+INDEX_TRIAL_RUNS = int(os.getenv("INDEX_TRIAL_RUNS", "3"))
+INDEX_TRIAL_TIMEOUT_SECONDS = float(os.getenv("INDEX_TRIAL_TIMEOUT_SECONDS", "120"))
+
+TRIM_EVERY = 100
+
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: USING (?:COVERING )?INDEX (\w+))?")
+_COL = r'(?:"?(\w+)"?\s*\.\s*)?"?(\w+)"?'
+_JOIN_PREDICATE = re.compile(rf"{_COL}\s*==?\s*{_COL}")
+_PREDICATE = re.compile(
+    rf"{_COL}\s*(==?|<=|>=|<>|!=|<|>|\bNOT\s+IN\b|\bIN\b|\bNOT\s+LIKE\b|\bLIKE\b|\bGLOB\b|\bBETWEEN\b|\bIS\b)",
+    re.IGNORECASE,
+)
+_EQUALITY_OPS = {"=", "==", "IN", "IS"}
+_RANGE_OPS = {"<", ">", "<=", ">=", "BETWEEN", "LIKE", "GLOB"}
+
+
+# ── Plan analysis ───────────────────────────────────────
+def explain_plan(conn: sqlite3.Connection, sql: str) -> list[dict]:
+    """EXPLAIN QUERY PLAN rows as {"id", "parent", "detail"}."""
+    return [
+        {"id": row[0], "parent": row[1], "detail": row[-1]}
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    ]
+
+
+def full_scans(sql: str, plan: list[dict]) -> list[dict]:
+    """Tables the plan reads end to end: [{"table", "alias", "index"}]."""
+    aliases = table_aliases(sql)
+    scans = []
+    for step in plan:
+        m = _SCAN.match(step["detail"])
+        if m:
+            name = m.group(2) or m.group(1)
+            scans.append({"table": aliases.get(name.lower(), m.group(1)), "alias": name, "index": m.group(3)})
+    return scans
+
+
+def predicate_columns(sql: str, columns: dict[str, list[str]]) -> dict[str, dict]:
+    """
+    Columns compared in the statement, per table: {"eq": [...], "join": [...], "range": [...]}.
+    A regex heuristic over the literal-masked SQL; `columns` maps table -> column names.
+    """
+    masked = mask_sql(sql, mask_parens=False)
+    scope = {alias: table for alias, table in table_aliases(sql).items() if table in columns}
+    for table in columns:
+        if re.search(rf'\b{re.escape(table)}\b', masked, re.IGNORECASE):
+            scope.setdefault(table.lower(), table)
+    lowered = {table: {c.lower(): c for c in cols} for table, cols in columns.items()}
+
+    def resolve(qualifier: Optional[str], column: str) -> list[tuple[str, str]]:
+        column = column.lower()
+        if qualifier:
+            table = scope.get(qualifier.lower())
+            return [(table, lowered[table][column])] if table and column in lowered[table] else []
+        return [(table, lowered[table][column]) for table in set(scope.values()) if column in lowered[table]]
+
+    found: dict[str, dict] = {}
+
+    def add(table: str, kind: str, column: str):
+        bucket = found.setdefault(table, {"eq": [], "join": [], "range": []})[kind]
+        if column not in bucket:
+            bucket.append(column)
+
+    join_spans = []
+    for m in _JOIN_PREDICATE.finditer(masked):
+        left, right = resolve(m.group(1), m.group(2)), resolve(m.group(3), m.group(4))
+        if len(left) == 1 and len(right) == 1 and left[0][0] != right[0][0]:
+            join_spans.append(m.span())
+            for table, column in left + right:
+                add(table, "join", column)
+
+    for m in _PREDICATE.finditer(masked):
+        if any(start <= m.start() < end for start, end in join_spans):
+            continue
+        op = " ".join(m.group(3).upper().split())
+        kind = "eq" if op in _EQUALITY_OPS else "range" if op in _RANGE_OPS else None
+        if kind:
+            for table, column in resolve(m.group(1), m.group(2)):
+                add(table, kind, column)
+    return found
+
+
+def _table_columns(conn: sqlite3.Connection) -> dict[str, list[str]]:
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")]
+    return {t: [c[1] for c in conn.execute(f"PRAGMA table_info('{t}')")] for t in tables}
+
+
+def _existing_indexes(conn: sqlite3.Connection, table: str) -> list[list[str]]:
+    """Column lists of the table's indexes, counting an INTEGER PRIMARY KEY as an index on it."""
+    indexes = [
+        [c[2] for c in conn.execute(f"PRAGMA index_info('{index[1]}')")]
+        for index in conn.execute(f"PRAGMA index_list('{table}')")
+    ]
+    pk = [c for c in conn.execute(f"PRAGMA table_info('{table}')") if c[5]]
+    if len(pk) == 1 and pk[0][2].upper() == "INTEGER":
+        indexes.append([pk[0][1]])
+    return indexes
+
+
+def suggest_index(table: str, predicates: dict, existing: list[list[str]]) -> Optional[dict]:
+    """
+    Candidate index for a scanned table: equality filters, then join keys,
+    then one range column. None when an existing index already starts that way.
+    """
+    columns = list(dict.fromkeys(predicates["eq"] + predicates["join"])) + [
+        c for c in predicates["range"] if c not in predicates["eq"] + predicates["join"]
+    ][:1]
+    if not columns:
+        return None
+    lowered = [c.lower() for c in columns]
+    if any([c.lower() for c in index[:len(columns)]] == lowered for index in existing):
+        return None
+    name = f"idx_{table}_{'_'.join(columns)}"
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    return {
+        "table": table,
+        "columns": columns,
+        "statement": f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_list})',
+    }
+
+
+def _open_readonly(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True, timeout=10)
+
+
+# ── Log ─────────────────────────────────────────────────
+class SlowQueryLog:
+    """SQLite-backed slow-query log. Only slow statements pay for a plan and an insert."""
+
+    def __init__(self, path: str = SLOW_QUERY_LOG_PATH, threshold_ms: float = SLOW_QUERY_MS,
+                 max_rows: int = SLOW_QUERY_MAX_ROWS):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.max_rows = max_rows
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Caller holds _lock."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS slow_queries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    db_path TEXT NOT NULL,
+                    shape_id TEXT NOT NULL,
+                    shape TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    elapsed_ms REAL NOT NULL,
+                    row_count INTEGER NOT NULL DEFAULT 0,
+                    vm_steps INTEGER NOT NULL DEFAULT 0,
+                    rows_scanned_estimate INTEGER,
+                    plan TEXT NOT NULL DEFAULT '[]',
+                    error TEXT,
+                    timestamp TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_slow_queries_db_shape ON slow_queries(db_path, shape_id);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def is_slow(self, elapsed: float) -> bool:
+        return bool(self.threshold_ms) and elapsed * 1000 >= self.threshold_ms
+
+    def record(self, conn: sqlite3.Connection, sql: str, db_path: str, elapsed: float, row_count: int,
+               vm_steps: int, table_rows: dict[str, int] = None, error: str = None):
+        """Log a slow statement, capturing its plan on the connection that ran it. Never raises."""
+        try:
+            plan = explain_plan(conn, sql)
+        except sqlite3.Error:
+            plan = []
+        scans = full_scans(sql, plan)
+        rows_scanned = sum((table_rows or {}).get(s["table"]) or 0 for s in scans) if table_rows else None
+        shape = sql_shape(sql)
+        try:
+            with self._lock:
+                db = self._connection()
+                with db:
+                    db.execute(
+                        "INSERT INTO slow_queries (db_path, shape_id, shape, sql, elapsed_ms, row_count, vm_steps, "
+                        "rows_scanned_estimate, plan, error, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (os.path.abspath(db_path), hashlib.sha1(shape.encode()).hexdigest()[:16], shape, sql,
+                         round(elapsed * 1000, 3), row_count, vm_steps, rows_scanned, json.dumps(plan), error,
+                         datetime.now().isoformat()),
+                    )
+                    self._inserts += 1
+                    if self.max_rows and self._inserts % TRIM_EVERY == 0:
+                        db.execute(
+                            "DELETE FROM slow_queries WHERE id <= "
+                            "(SELECT id FROM slow_queries ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                            (self.max_rows,),
+                        )
+        except (sqlite3.Error, OSError):
+            pass  # the log is best-effort; never fail the query over it
+
+    # ── Reads ───────────────────────────────────────────
+    def entries(self, db_path: str = None, limit: int = 50) -> list[dict]:
+        """Logged statements, newest first."""
+        where, params = ("WHERE db_path = ?", (os.path.abspath(db_path),)) if db_path else ("", ())
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT * FROM slow_queries {where} ORDER BY id DESC LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [{**dict(row), "plan": json.loads(row["plan"])} for row in rows]
+
+    def clear(self, db_path: str = None):
+        where, params = ("WHERE db_path = ?", (os.path.abspath(db_path),)) if db_path else ("", ())
+        with self._lock:
+            with self._connection() as db:
+                db.execute(f"DELETE FROM slow_queries {where}", params)
+
+    def _groups(self, db_path: str, limit: int, shape_id: str = None) -> list[sqlite3.Row]:
+        clauses, params = ["db_path = ?"], [os.path.abspath(db_path)]
+        if shape_id:
+            clauses.append("shape_id = ?")
+            params.append(shape_id)
+        with self._lock:
+            return self._connection().execute(
+                f"""SELECT s.*, g.count, g.total_ms, g.mean_ms, g.max_ms, g.first_seen FROM (
+                        SELECT shape_id, MAX(id) AS last_id, COUNT(*) AS count, SUM(elapsed_ms) AS total_ms,
+                               AVG(elapsed_ms) AS mean_ms, MAX(elapsed_ms) AS max_ms, MIN(timestamp) AS first_seen
+                        FROM slow_queries WHERE {' AND '.join(clauses)} GROUP BY shape_id
+                    ) g JOIN slow_queries s ON s.id = g.last_id
+                    ORDER BY g.total_ms DESC LIMIT ?""",
+                (*params, limit),
+            ).fetchall()
+
+    def analyze(self, db_path: str, limit: int = 20, shape_id: str = None) -> list[dict]:
+        """
+        Slow queries of one database grouped by shape, most total time first,
+        with their full scans and index suggestions for the filtered/joined columns.
+        """
+        groups = self._groups(db_path, limit, shape_id)
+        if not groups:
+            return []
+        conn = _open_readonly(db_path)
+        try:
+            columns = _table_columns(conn)
+            indexes = {table: _existing_indexes(conn, table) for table in columns}
+            results = []
+            for row in groups:
+                sql, plan = row["sql"], json.loads(row["plan"])
+                predicates = predicate_columns(sql, columns)
+                scans, suggestions = [], []
+                for scan in full_scans(sql, plan):
+                    table = scan["table"]
+                    used = predicates.get(table, {"eq": [], "join": [], "range": []})
+                    scans.append({**scan, "filtered_columns": used["eq"] + used["range"],
+                                  "join_columns": used["join"]})
+                    suggestion = suggest_index(table, used, indexes.get(table, [])) if table in columns else None
+                    if suggestion and suggestion not in suggestions:
+                        suggestions.append(suggestion)
+                results.append({
+                    "shape_id": row["shape_id"],
+                    "shape": row["shape"],
+                    "count": row["count"],
+                    "total_ms": round(row["total_ms"], 3),
+                    "mean_ms": round(row["mean_ms"], 3),
+                    "max_ms": row["max_ms"],
+                    "first_seen": row["first_seen"],
+                    "last_seen": row["timestamp"],
+                    "example_sql": sql,
+                    "rows_scanned_estimate": row["rows_scanned_estimate"],
+                    "vm_steps": row["vm_steps"],
+                    "plan": plan,
+                    "full_scans": scans,
+                    "suggestions": suggestions,
+                })
+            return results
+        finally:
+            conn.close()
+
+    # ── Index trials ────────────────────────────────────
+    def test_indexes(self, db_path: str, shape_id: str, runs: int = INDEX_TRIAL_RUNS,
+                     timeout: float = INDEX_TRIAL_TIMEOUT_SECONDS) -> dict:
+        """
+        Copy the database, time the shape's latest statement, create the
+        suggested indexes on the copy and time it again. The copy is deleted afterwards.
+        """
+        groups = self.analyze(db_path, 1, shape_id)
+        if not groups:
+            return {"success": False, "error": f"No slow queries with shape '{shape_id}' for this database."}
+        group = groups[0]
+        if not group["suggestions"]:
+            return {"success": False, "error": "No index suggestions for this query shape."}
+
+        os.makedirs(INDEX_TRIAL_DIR, exist_ok=True)
+        trial_path = os.path.join(INDEX_TRIAL_DIR, f"{uuid.uuid4().hex}.db")
+        deadline = time.monotonic() + timeout
+        source = _open_readonly(db_path)
+        trial = sqlite3.connect(trial_path)
+        try:
+            source.backup(trial)
+            source.close()
+            trial.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+            size_before = os.path.getsize(trial_path)
+            before = _measure(trial, group["example_sql"], runs)
+            built = []
+            for suggestion in group["suggestions"]:
+                started = time.perf_counter()
+                trial.execute(suggestion["statement"])
+                built.append({**suggestion, "build_ms": round((time.perf_counter() - started) * 1000, 3)})
+            trial.commit()
+            after = _measure(trial, group["example_sql"], runs)
+            return {
+                "success": True,
+                "shape_id": shape_id,
+                "sql": group["example_sql"],
+                "indexes": built,
+                "before": before,
+                "after": after,
+                "speedup": round(before["median_ms"] / after["median_ms"], 2) if after["median_ms"] else None,
+                "size_bytes": {"before": size_before, "after": os.path.getsize(trial_path)},
+            }
+        except sqlite3.Error as e:
+            timed_out = time.monotonic() > deadline
+            return {"success": False, "error": f"Index trial timed out after {timeout:g}s." if timed_out else str(e)}
+        finally:
+            source.close()
+            trial.close()
+            for suffix in ("", "-journal", "-wal", "-shm"):
+                try:
+                    os.remove(trial_path + suffix)
+                except OSError:
+                    pass
+
+
+def _measure(conn: sqlite3.Connection, sql: str, runs: int) -> dict:
+    samples, row_count = [], 0
+    for _ in range(max(runs, 1)):
+        started = time.perf_counter()
+        row_count = len(conn.execute(sql).fetchall())
+        samples.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "row_count": row_count,
+        "plan": explain_plan(conn, sql),
+    }
+
+
+slow_log = SlowQueryLog()
@@ -0,0 +1,146 @@
+"""
+SQL safety validation for Smart Bridge SQL Querying.
+Compiles each statement once under an SQLite authorizer (via EXPLAIN QUERY
+PLAN) to prove it is read-only, and inspects the plan for full scans of large
+tables. Verdicts are cached per normalized SQL text.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from sql_utils import mask_sql, normalize_sql, table_aliases
+
+# Reject full scans of tables with more rows than this when the query has no
+# top-level LIMIT (0 disables the plan check).
+MAX_SCAN_ROWS = int(os.getenv("SQL_GUARD_MAX_SCAN_ROWS", "0"))
+VERDICT_CACHE_SIZE = int(os.getenv("SQL_GUARD_CACHE_SIZE", "2048"))
+
+READ_ONLY_ERROR = "Only SELECT queries are allowed for safety. Write operations are disabled."
+
+_ALLOWED_FIRST_WORDS = ("SELECT", "WITH", "VALUES", "EXPLAIN")
+_EXPLAIN_PREFIX = re.compile(r"^\s*EXPLAIN(\s+QUERY\s+PLAN)?\s+", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)")
+
+# Introspection pragmas that may be read (never assigned) from inside a query
+_READ_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info", "index_xinfo",
+    "foreign_key_list", "collation_list", "function_list", "pragma_list",
+}
+_DENIED_FUNCTIONS = {"load_extension", "readfile", "writefile", "edit", "fts3_tokenizer"}
+
+
+class _Authorizer:
+    """Authorizer callback that records the first denied action."""
+
+    def __init__(self):
+        self.denied: Optional[str] = None
+        self.first_action: Optional[int] = None
+
+    def __call__(self, action, arg1, arg2, dbname, source) -> int:
+        if self.first_action is None:
+            self.first_action = action
+        if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_RECURSIVE):
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_FUNCTION:
+            if (arg2 or "").lower() in _DENIED_FUNCTIONS:
+                return self._deny(f"Function '{arg2}' is not allowed.")
+            return sqlite3.SQLITE_OK
+        if action == sqlite3.SQLITE_PRAGMA:
+            if arg2 is None and (arg1 or "").lower() in _READ_PRAGMAS:
+                return sqlite3.SQLITE_OK
+            return self._deny(f"PRAGMA {arg1} is not allowed.")
+        if action == sqlite3.SQLITE_UPDATE and arg1 == "sqlite_master" and self.first_action == sqlite3.SQLITE_SELECT:
+            # Emitted while SQLite registers eponymous virtual tables such as
+            # pragma_table_info() inside a SELECT. A real UPDATE statement
+            # reports its own actions before any SQLITE_SELECT, so it is denied.
+            return sqlite3.SQLITE_OK
+        if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH):
+            return self._deny("ATTACH/DETACH is not allowed.")
+        return self._deny(READ_ONLY_ERROR)
+
+    def _deny(self, reason: str) -> int:
+        self.denied = self.denied or reason
+        return sqlite3.SQLITE_DENY
+
+
+def _first_word(sql: str) -> str:
+    masked = mask_sql(sql).strip()
+    return masked.split()[0].upper() if masked else ""
+
+
+def check_statement(conn: sqlite3.Connection, sql: str, table_rows: dict[str, int] = None,
+                    params: list = None) -> Optional[str]:
+    """
+    Validate one statement on `conn` without running it.
+    Returns an error message, or None if the statement is allowed.
+    """
+    if _first_word(sql) not in _ALLOWED_FIRST_WORDS:
+        return READ_ONLY_ERROR
+
+    target = _EXPLAIN_PREFIX.sub("", sql, count=1)
+    authorizer = _Authorizer()
+    conn.set_authorizer(authorizer)
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {target}", params or []).fetchall()
+    except sqlite3.Error as e:
+        return authorizer.denied or str(e)
+    except sqlite3.Warning as e:
+        # e.g. "You can only execute one statement at a time."
+        return str(e)
+    finally:
+        conn.set_authorizer(None)
+    if authorizer.denied:
+        return authorizer.denied
+
+    if MAX_SCAN_ROWS and table_rows and not re.search(r"\bLIMIT\b", mask_sql(target), re.IGNORECASE):
+        aliases = table_aliases(target)
+        for row in plan:
+            m = _SCAN.match(row[-1])
+            if not m:
+                continue
+            table = aliases.get(m.group(1).lower(), m.group(1))
+            rows = table_rows.get(table)
+            if rows and rows > MAX_SCAN_ROWS:
+                return (
+                    f"Query would scan all of '{table}' (~{rows} rows) without a LIMIT. "
+                    f"Add a filter on an indexed column or a LIMIT."
+                )
+    return None
+
+
+class VerdictCache:
+    """LRU of validation verdicts keyed by (database key, normalized SQL)."""
+
+    def __init__(self, max_entries: int = VERDICT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, Optional[str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def validate(self, conn: sqlite3.Connection, sql: str, db_key: tuple,
+                 table_rows: dict[str, int] = None, params: list = None) -> Optional[str]:
+        key = (db_key, normalize_sql(sql))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        verdict = check_statement(conn, sql, table_rows, params)
+        with self._lock:
+            self._entries[key] = verdict
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return verdict
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+verdict_cache = VerdictCache()
@@ -0,0 +1,178 @@
+"""
+Lightweight SQL text helpers for Smart Bridge SQL Querying.
+Not a parser: just enough lexing to find top-level clauses while ignoring
+string literals, comments and parenthesized subqueries.
+Also home to file_signature, the database-file change detector every cache shares.
+"""
+
+import os
+import re
+from typing import Optional
+
+
+def mask_sql(sql: str, mask_parens: bool = True) -> str:
+    """
+    Return a same-length copy of `sql` where string literals, comments and
+    (optionally) everything inside parentheses is blanked out, so regex
+    searches only match top-level tokens at their original offsets.
+    Quoted identifiers are kept as-is.
+    """
+    out = list(sql)
+    i, n, depth = 0, len(sql), 0
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            end = i + 1
+            while end < n:
+                if sql[end] == "'":
+                    if end + 1 < n and sql[end + 1] == "'":
+                        end += 2
+                        continue
+                    break
+                end += 1
+            for k in range(i, min(end + 1, n)):
+                out[k] = " "
+            i = end + 1
+            continue
+        if sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = n if end == -1 else end
+            for k in range(i, end):
+                out[k] = " "
+            i = end
+            continue
+        if sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = n if end == -1 else end + 2
+            for k in range(i, end):
+                out[k] = " "
+            i = end
+            continue
+        if mask_parens:
+            if ch == "(":
+                depth += 1
+                out[i] = " "
+                i += 1
+                continue
+            if ch == ")":
+                depth = max(depth - 1, 0)
+                out[i] = " "
+                i += 1
+                continue
+            if depth > 0:
+                out[i] = " "
+        i += 1
+    return "".join(out)
+
+
+def find_top_level(sql: str, pattern: str, masked: str = None) -> Optional[re.Match]:
+    """Search for a regex (case-insensitive) among top-level SQL tokens only."""
+    masked = masked if masked is not None else mask_sql(sql)
+    return re.search(pattern, masked, re.IGNORECASE)
+
+
+def strip_sql(sql: str) -> str:
+    """Trim whitespace and trailing semicolons, as execute_query does."""
+    return sql.strip().rstrip(";").strip()
+
+
+def _literal_end(sql: str, start: int) -> int:
+    """Index just past the string literal that opens at `start`."""
+    end = start + 1
+    while end < len(sql):
+        if sql[end] == "'":
+            if sql.startswith("''", end):
+                end += 2
+                continue
+            return end + 1
+        end += 1
+    return end
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical text for cache keys: comments removed, whitespace collapsed
+    outside string literals, trailing semicolons dropped. Case is preserved
+    because literals and quoted identifiers are case-sensitive.
+    """
+    out = []
+
+    def space():
+        if out and out[-1] != " ":
+            out.append(" ")
+
+    i, n = 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch == "'":
+            end = _literal_end(sql, i)
+            out.append(sql[i:end])
+            i = end
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end == -1 else end
+            space()
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            space()
+        elif ch.isspace():
+            space()
+            i += 1
+        else:
+            out.append(ch)
+            i += 1
+    return strip_sql("".join(out))
+
+
+_ALIAS_STOP_WORDS = {"WHERE", "JOIN", "ON", "INNER", "LEFT", "RIGHT", "FULL", "CROSS", "NATURAL",
+                     "GROUP", "ORDER", "LIMIT", "USING", "HAVING", "UNION", "EXCEPT", "INTERSECT", "WINDOW"}
+
+
+def table_aliases(sql: str) -> dict[str, str]:
+    """Map table aliases (as shown in query plans) back to table names."""
+    aliases = {}
+    masked = mask_sql(sql, mask_parens=False)
+    for m in re.finditer(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?(\w+))?', masked, re.IGNORECASE):
+        table, alias = m.group(1), m.group(2)
+        if alias and alias.upper() not in _ALIAS_STOP_WORDS:
+            aliases[alias.lower()] = table
+    return aliases
+
+
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def sql_shape(sql: str) -> str:
+    """
+    Normalized SQL with literals replaced by ?, lowercased, so the same query
+    with different constants (or IN-list lengths) maps to one shape.
+    """
+    text = normalize_sql(sql)
+    out, i = [], 0
+    while i < len(text):
+        if text[i] == "'":
+            i = _literal_end(text, i)
+            out.append("?")
+            continue
+        end = text.find("'", i)
+        end = len(text) if end == -1 else end
+        out.append(_NUMBER.sub("?", text[i:end]).lower())
+        i = end
+    return _IN_LIST.sub("(?)", "".join(out))
+
+
+def file_signature(path: str) -> list:
+    """
+    Cheap change detector for a database file: inode, mtime and size of the
+    file, then mtime and size of its WAL (None, None without one). Flat and
+    JSON-friendly, so it can be stored and compared after a round trip.
+    """
+    st = os.stat(path)
+    try:
+        wal = os.stat(path + "-wal")
+        wal_sig = [wal.st_mtime_ns, wal.st_size]
+    except OSError:
+        wal_sig = [None, None]
+    return [st.st_ino, st.st_mtime_ns, st.st_size, *wal_sig]
@@ -0,0 +1,170 @@
+"""
+Streaming result encoders for Smart Bridge SQL Querying.
+Turn (columns, row batches) from database.stream_query into NDJSON, CSV or
+Arrow IPC byte chunks, one chunk per batch, so large exports use constant memory.
+Also frames NDJSON lines and Server-Sent Events for progress streams.
+"""
+
+import io
+import os
+import csv
+import json
+from typing import Iterable, Iterator
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Arrow output holds back at most this many leading rows to settle its schema
+ARROW_SCHEMA_ROWS = int(os.getenv("ARROW_SCHEMA_ROWS", "10000"))
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def json_default(value):
+    """json `default` hook: blobs are written as hex."""
+    if isinstance(value, bytes):
+        return value.hex()
+    raise TypeError(f"Unserializable value: {type(value).__name__}")
+
+
+def ndjson_line(obj) -> bytes:
+    """One JSON document plus newline, with blobs written as hex."""
+    return (json.dumps(obj, default=json_default) + "\n").encode()
+
+
+def sse_event(event: str, data) -> bytes:
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=json_default)}\n\n".encode()
+
+
+def encode_ndjson(columns: list[str], batches: Iterable[list[tuple]], meta: dict = None) -> Iterator[bytes]:
+    """Header line {"columns": [...]} followed by one JSON array per row."""
+    header = {"columns": columns, **(meta or {})}
+    yield (json.dumps(header) + "\n").encode()
+    for batch in batches:
+        yield "".join(
+            json.dumps(row, separators=(",", ":"), default=json_default) + "\n" for row in batch
+        ).encode()
+
+
+def encode_csv(columns: list[str], batches: Iterable[list[tuple]], meta: dict = None) -> Iterator[bytes]:
+    """Header row of column names followed by data rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+
+
+def _as_text(value):
+    return None if value is None else value.hex() if isinstance(value, bytes) else str(value)
+
+
+def arrow_column(values: list, type=None):
+    """
+    Arrow array for one result column. SQLite columns can mix types: without a
+    type, a column that doesn't infer cleanly is written as text; with one (a
+    fixed stream schema) values are cast safely, and text columns take anything.
+    Raises ValueError for values a non-text type can't hold without loss.
+    """
+    import pyarrow as pa
+
+    try:
+        array = pa.array(values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        array = None
+    if type is None or (array is not None and array.type == type):
+        return array if array is not None else pa.array([_as_text(v) for v in values], type=pa.string())
+    if pa.types.is_string(type):
+        return pa.array([_as_text(v) for v in values], type=type)
+    if array is not None:
+        try:
+            return array.cast(type)  # safe: int -> double and all-NULL -> anything, never 1.5 -> 1
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+            pass
+    found = array.type if array is not None else "mixed"
+    raise ValueError(f"Column values of type {found} don't fit the stream's {type} type.")
+
+
+def _arrow_schema(columns: list[str], batches: list[list[tuple]]):
+    """Schema inferred from the given rows; columns with no non-NULL value are text."""
+    import pyarrow as pa
+
+    fields = []
+    for i, name in enumerate(columns):
+        array = arrow_column([row[i] for batch in batches for row in batch])
+        fields.append((name, pa.string() if pa.types.is_null(array.type) else array.type))
+    return pa.schema(fields)
+
+
+def encode_arrow(columns: list[str], batches: Iterable[list[tuple]], meta: dict = None) -> Iterator[bytes]:
+    """
+    Arrow IPC stream, one record batch per chunk. Leading batches are held back
+    until every column has shown a non-NULL value (or ARROW_SCHEMA_ROWS rows
+    have arrived) and the schema is inferred from all of them.
+    """
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+    held, held_rows = [], 0
+    untyped = set(range(len(columns)))
+
+    def flush() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    def write(batch: list[tuple]):
+        arrays = [arrow_column([row[i] for row in batch], field.type) for i, field in enumerate(schema)]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    for batch in batches:
+        if not batch:
+            continue
+        if writer is not None:
+            write(batch)
+            yield flush()
+            continue
+        held.append(batch)
+        held_rows += len(batch)
+        untyped = {i for i in untyped if all(row[i] is None for row in batch)}
+        if untyped and held_rows < ARROW_SCHEMA_ROWS:
+            continue
+        schema = _arrow_schema(columns, held)
+        writer = pa.ipc.new_stream(sink, schema)
+        for pending in held:
+            write(pending)
+        held = []
+        yield flush()
+
+    if writer is None:
+        schema = _arrow_schema(columns, held)
+        writer = pa.ipc.new_stream(sink, schema)
+        for pending in held:
+            write(pending)
+    writer.close()
+    yield flush()
+
+
+ENCODERS = {
+    "ndjson": encode_ndjson,
+    "csv": encode_csv,
+    "arrow": encode_arrow,
+}
+
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
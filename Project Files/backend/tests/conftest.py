@@ -0,0 +1,37 @@
+"""
+Shared test setup: every data file the backend writes goes to a throwaway
+directory, and the backend modules are importable from the tests.
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_DATA_DIR = tempfile.mkdtemp(prefix="smartbridge-tests-")
+os.environ.setdefault("HISTORY_DB_PATH", os.path.join(_DATA_DIR, "history.db"))
+os.environ.setdefault("DATABASE_REGISTRY_PATH", os.path.join(_DATA_DIR, "databases.json"))
+os.environ.setdefault("ROLLUP_DIR", os.path.join(_DATA_DIR, "rollups"))
+os.environ.setdefault("SAMPLE_DIR", os.path.join(_DATA_DIR, "samples"))
+os.environ.setdefault("JOB_RESULT_DIR", os.path.join(_DATA_DIR, "job_results"))
+os.environ.setdefault("RESULT_CACHE_BYTES", "0")
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """Create a SQLite file from a script and return its path."""
+
+    def make(script: str, name: str = "test.db") -> str:
+        path = str(tmp_path / name)
+        conn = sqlite3.connect(path)
+        conn.executescript(script)
+        conn.commit()
+        conn.close()
+        return path
+
+    return make
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pytest
+
+import cursors
+import database
+from cursors import open_cursor, fetch_page
+
+
+@pytest.fixture
+def items_db(make_db):
+    path = make_db(
+        "CREATE TABLE items (id INTEGER PRIMARY KEY, grp TEXT, code TEXT NOT NULL);"
+        + "".join(f"INSERT INTO items (grp, code) VALUES ({'NULL' if i % 10 else repr(str(i % 3))}, 'c{i % 7}');"
+                  for i in range(100))
+    )
+    yield path
+    cursors.registry.close_all()
+    database.close_pool(path)
+
+
+def read_all(sql: str, path: str, page_size: int = 10) -> tuple[list, set]:
+    page = open_cursor(sql, path, page_size)
+    rows, modes = list(page["rows"]), {page["pagination"]}
+    while page["cursor"]:
+        page = fetch_page(page["cursor"], page_size)
+        rows += page["rows"]
+        modes.add(page["pagination"])
+    return rows, modes
+
+
+def test_nullable_sort_key_pages_every_row(items_db):
+    rows, modes = read_all("SELECT id, grp FROM items ORDER BY grp, id", items_db)
+    assert len(rows) == 100
+    assert len({r["id"] for r in rows}) == 100
+    assert modes == {"live"}
+
+
+def test_live_cursor_honours_each_page_size(items_db):
+    page = open_cursor("SELECT id, grp FROM items ORDER BY grp, id", items_db, 10)
+    assert page["pagination"] == "live"
+    ids = [r["id"] for r in page["rows"]]
+    for size in (50, 5, 100):
+        page = fetch_page(page["cursor"], size)
+        ids += [r["id"] for r in page["rows"]]
+        if size == 100:
+            assert page["row_count"] == 35 and page["cursor"] is None
+        else:
+            assert page["row_count"] == size and page["cursor"]
+    assert sorted(ids) == list(range(1, 101))
+
+
+def test_not_null_sort_key_uses_keyset(items_db):
+    rows, modes = read_all("SELECT id, code FROM items ORDER BY code, id", items_db)
+    assert [r["id"] for r in rows] == [r["id"] for r in database.execute_query(
+        "SELECT id, code FROM items ORDER BY code, id", items_db, 0, 0)["rows"]]
+    assert modes == {"keyset"}
+
+
+def test_primary_key_alone_uses_keyset(items_db):
+    rows, modes = read_all("SELECT id, grp FROM items ORDER BY id DESC", items_db)
+    assert [r["id"] for r in rows] == list(range(100, 0, -1))
+    assert modes == {"keyset"}
+
+
+@pytest.fixture
+def sparse_db(make_db):
+    # flag = 1 on the first ten rows and then on every 2000th row
+    path = make_db(
+        "CREATE TABLE events (id INTEGER PRIMARY KEY, flag INTEGER);"
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 40000) "
+        "INSERT INTO events SELECT i, i <= 10 OR i % 2000 = 0 FROM n;"
+    )
+    yield path
+    cursors.registry.close_all()
+    database.close_pool(path)
+
+
+def test_live_pages_keep_the_step_budget(sparse_db):
+    budget = database.QueryBudget(max_steps=50_000)
+    page = open_cursor("SELECT id FROM events WHERE flag = 1", sparse_db, 10, budget)
+    assert page["pagination"] == "live" and page["row_count"] == 10
+    with pytest.raises(sqlite3.OperationalError, match="VM steps"):
+        fetch_page(page["cursor"], 10)
+
+
+def test_live_pages_each_get_a_fresh_budget(sparse_db):
+    budget = database.QueryBudget(max_steps=50_000)
+    page = open_cursor("SELECT id FROM events WHERE flag = 1", sparse_db, 1, budget)
+    rows = page["row_count"]
+    while page["cursor"]:
+        page = fetch_page(page["cursor"], 1)
+        rows += page["row_count"]
+    assert rows == 30
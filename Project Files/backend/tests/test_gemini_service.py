@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+import gemini_service
+from llm_providers import LLMProvider, ProviderError
+from metrics import LLM_REQUESTS
+
+
+class FailingProvider(LLMProvider):
+    def __init__(self, name: str, label: str):
+        self.name, self.label = name, label
+
+    def generate(self, prompt: str) -> str:
+        raise ProviderError(f"{self.name} is down")
+
+
+def test_failed_fallback_is_reported_as_the_fallback(monkeypatch):
+    monkeypatch.setattr(gemini_service, "provider", FailingProvider("primary", "Primary LLM"))
+    monkeypatch.setattr(gemini_service, "fallback", FailingProvider("backup", "Backup LLM"))
+    before = dict(LLM_REQUESTS._values)
+
+    result = asyncio.run(gemini_service.generate_sql("how many orders?", "CREATE TABLE orders (id INTEGER)"))
+
+    assert not result["success"]
+    assert result["error"] == "Backup LLM error: backup is down"
+    counted = {k: v - before.get(k, 0) for k, v in LLM_REQUESTS._values.items() if v != before.get(k, 0)}
+    assert counted == {("primary", "failover"): 1, ("backup", "error"): 1}
+
+
+def test_provider_without_generate_cannot_be_created():
+    class Incomplete(LLMProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
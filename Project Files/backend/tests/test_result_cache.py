@@ -0,0 +1,92 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from database import cancel_query
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def db(make_db):
+    return make_db("CREATE TABLE t (id INTEGER PRIMARY KEY, v INTEGER); INSERT INTO t (v) VALUES (1), (2);")
+
+
+def test_cached_result_keeps_rollup_provenance(db):
+    calls = []
+
+    def fetch(sql, path, *args):
+        calls.append(sql)
+        return {"success": True, "columns": ["total"], "rows": [(3,)], "row_count": 1, "truncated": False,
+                "rollup": "abc123"}
+
+    cache = ResultCache(max_bytes=1 << 20, fetch=fetch)
+    first = cache.execute("SELECT SUM(v) AS total FROM t", db)
+    second = cache.execute("SELECT SUM(v) AS total FROM t", db)
+    cache.close()
+    assert len(calls) == 1
+    assert not first["cached"] and second["cached"]
+    assert first["rollup"] == second["rollup"] == "abc123"
+    assert second["rows"] == [{"total": 3}]
+    assert "bytes" not in second
+
+
+def test_data_version_changes_on_write(db):
+    cache = ResultCache(max_bytes=1 << 20, fetch=lambda *a: None)
+    before = cache.data_version(db)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO t (v) VALUES (3)")
+    conn.commit()
+    conn.close()
+    assert cache.data_version(db) != before
+    cache.close()
+
+
+@pytest.fixture
+def slow_cache(db):
+    """A cache whose first fetch blocks until released; later fetches fail fast."""
+    release = threading.Event()
+    calls = []
+
+    def fetch(sql, path, timeout, max_steps, query_id):
+        calls.append(timeout)
+        if len(calls) == 1:
+            release.wait(5)
+            return {"success": False, "error": "leader failed", "columns": [], "rows": [], "row_count": 0}
+        return {"success": True, "columns": ["n"], "rows": [(1,)], "row_count": 1, "truncated": False}
+
+    cache = ResultCache(max_bytes=1 << 20, fetch=fetch)
+    leader = threading.Thread(target=cache.execute, args=("SELECT 1 AS n", db, 10))
+    leader.start()
+    while not calls:
+        time.sleep(0.01)
+    yield cache, calls, release
+    release.set()
+    leader.join()
+    cache.close()
+
+
+def test_follower_wait_honours_its_timeout(slow_cache, db):
+    cache, calls, _ = slow_cache
+    started = time.monotonic()
+    result = cache.execute("SELECT 1 AS n", db, 0.2)
+    assert time.monotonic() - started < 2
+    assert result["timed_out"] and not result["success"]
+    assert len(calls) == 1
+
+
+def test_follower_can_be_cancelled(slow_cache, db):
+    cache, calls, _ = slow_cache
+    threading.Timer(0.1, cancel_query, args=("follower",)).start()
+    result = cache.execute("SELECT 1 AS n", db, 10, query_id="follower")
+    assert result["cancelled"] and not result["success"]
+    assert len(calls) == 1
+
+
+def test_follower_rerun_gets_only_the_time_left(slow_cache, db):
+    cache, calls, release = slow_cache
+    threading.Timer(0.3, release.set).start()
+    result = cache.execute("SELECT 1 AS n", db, 5)
+    assert result["success"] and not result["cached"]
+    assert len(calls) == 2 and 0 < calls[1] < 4.8
@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+
+import database
+import rollups as rollups_module
+from rollups import RollupManager
+
+SQL = "SELECT status, SUM(amt) AS total FROM orders GROUP BY status ORDER BY status"
+
+
+class FakeHistory:
+    def __init__(self, sql: str, times: int = 3):
+        self.entries = [{"sql": sql}] * times
+
+    def query(self, **_):
+        return self.entries
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, make_db):
+    path = make_db(
+        "CREATE TABLE orders (id INTEGER PRIMARY KEY, status TEXT, amt REAL);"
+        + "".join(f"INSERT INTO orders (status, amt) VALUES ('{s}', {i});"
+                  for i in range(300) for s in [("a", "b", "c")[i % 3]])
+    )
+    manager = RollupManager(directory=str(tmp_path / "rollups"))
+    monkeypatch.setattr(rollups_module, "history", FakeHistory(SQL))
+    monkeypatch.setattr(database, "rollups", manager)
+    summary = manager.maintain("test", path)
+    assert len(summary["built"]) == 1
+    yield manager, path
+    database.close_pool(path)
+    database.close_pool(manager.sidecar_path(path))
+
+
+def exact(path: str) -> list[tuple]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(SQL).fetchall()
+    finally:
+        conn.close()
+
+
+def write(path: str, sql: str):
+    conn = sqlite3.connect(path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_rewrite_uses_rollup(manager):
+    manager, path = manager
+    result = database.fetch_rows(SQL, path)
+    assert result["rollup"]
+    assert result["rows"] == exact(path)
+
+
+def test_update_in_place_rebuilds_rollup(manager):
+    manager, path = manager
+    write(path, "UPDATE orders SET amt = amt * 2")
+    # Before the refresh the stale rollup must not answer
+    result = database.fetch_rows(SQL, path)
+    assert "rollup" not in result
+    assert result["rows"] == exact(path)
+
+    summary = manager.maintain("test", path, mine=False)
+    assert list(summary["refreshed"].values()) == ["full"]
+    result = database.fetch_rows(SQL, path)
+    assert result["rollup"]
+    assert result["rows"] == exact(path)
+
+
+def test_update_rebuilds_without_incremental(manager, monkeypatch):
+    manager, path = manager
+    monkeypatch.setattr(rollups_module, "ROLLUP_INCREMENTAL", False)
+    write(path, "INSERT INTO orders (status, amt) VALUES ('a', 1000)")
+    summary = manager.maintain("test", path, mine=False)
+    assert list(summary["refreshed"].values()) == ["full"]
+    assert database.fetch_rows(SQL, path)["rows"] == exact(path)
+
+
+def test_append_refreshes_incrementally(manager):
+    manager, path = manager
+    write(path, "INSERT INTO orders (status, amt) VALUES ('a', 1000), ('d', 5)")
+    summary = manager.maintain("test", path, mine=False)
+    assert list(summary["refreshed"].values()) == ["incremental"]
+    result = database.fetch_rows(SQL, path)
+    assert result["rollup"]
+    assert result["rows"] == exact(path)
+
+
+def test_rows_appended_during_refresh_wait_for_the_next_one(manager, monkeypatch):
+    manager, path = manager
+    write(path, "INSERT INTO orders (status, amt) VALUES ('a', 1000)")
+    table_stats = rollups_module._table_stats
+
+    def stats_then_append(source, tables):
+        stats = table_stats(source, tables)
+        write(path, "INSERT INTO orders (status, amt) VALUES ('b', 7)")
+        return stats
+
+    monkeypatch.setattr(rollups_module, "_table_stats", stats_then_append)
+    assert list(manager.maintain("test", path, mine=False)["refreshed"].values()) == ["incremental"]
+    monkeypatch.setattr(rollups_module, "_table_stats", table_stats)
+    assert list(manager.maintain("test", path, mine=False)["refreshed"].values()) == ["incremental"]
+    result = database.fetch_rows(SQL, path)
+    assert result["rollup"]
+    assert result["rows"] == exact(path)
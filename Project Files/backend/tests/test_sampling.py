@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+import database
+import sampling
+from sampling import SampleManager
+
+
+@pytest.fixture
+def sampled(tmp_path, monkeypatch, make_db):
+    monkeypatch.setattr(sampling, "SAMPLE_MIN_ROWS", 1000)
+    monkeypatch.setattr(sampling, "SAMPLE_ROWS", 5000)  # p = 1: the sample is the whole table
+    path = make_db(
+        "CREATE TABLE orders (id INTEGER PRIMARY KEY, amt REAL);"
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 2000) "
+        "INSERT INTO orders (amt) SELECT i FROM n;"
+    )
+    manager = SampleManager(directory=str(tmp_path / "samples"))
+    assert manager.maintain(path)["built"] == ["orders"]
+    yield manager, path
+    database.close_pool(path)
+
+
+def sample_total(manager: SampleManager, path: str) -> float:
+    conn = sqlite3.connect(manager.sidecar_path(path))
+    try:
+        return conn.execute(f'SELECT SUM(amt) FROM "{sampling._sample_table("orders")}"').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def write(path: str, sql: str):
+    conn = sqlite3.connect(path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+
+def test_update_in_place_resamples(sampled):
+    manager, path = sampled
+    write(path, "UPDATE orders SET amt = amt * 2")
+    assert manager.maintain(path)["refreshed"] == {"orders": "full"}
+    assert sample_total(manager, path) == 2 * sum(range(1, 2001))
+    assert all(s["fresh"] for s in manager.list(path))
+
+
+def test_append_samples_new_rows_only(sampled):
+    manager, path = sampled
+    write(path, "INSERT INTO orders (amt) VALUES (1000000)")
+    assert manager.maintain(path)["refreshed"] == {"orders": "incremental"}
+    assert sample_total(manager, path) == sum(range(1, 2001)) + 1000000
@@ -0,0 +1,37 @@
+import sqlite3
+
+import pytest
+
+from sql_guard import check_statement, READ_ONLY_ERROR
+
+
+@pytest.fixture
+def conn(make_db):
+    conn = sqlite3.connect(make_db("CREATE TABLE customers (id INTEGER PRIMARY KEY, name TEXT);"))
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT replace(name, 'a', 'b') FROM customers",
+    "SELECT name AS \"update\" FROM customers WHERE name <> 'delete'",
+    "WITH c AS (SELECT * FROM customers) SELECT count(*) FROM c",
+    "SELECT name FROM pragma_table_info('customers')",
+])
+def test_reads_are_allowed(conn, sql):
+    assert check_statement(conn, sql) is None
+
+
+@pytest.mark.parametrize("sql", [
+    "INSERT INTO customers (name) VALUES ('x')",
+    "WITH c AS (SELECT 1) DELETE FROM customers",
+    "WITH c AS (SELECT 1) INSERT INTO customers (name) SELECT 'x' FROM c",
+    "WITH c AS (SELECT 1) UPDATE sqlite_master SET sql = 'x'",
+    "REPLACE INTO customers (id, name) VALUES (1, 'x')",
+])
+def test_writes_are_rejected(conn, sql):
+    assert check_statement(conn, sql) is not None
+
+
+def test_write_error_message(conn):
+    assert check_statement(conn, "WITH c AS (SELECT 1) DELETE FROM customers") == READ_ONLY_ERROR
@@ -0,0 +1,47 @@
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import streaming
+from streaming import encode_arrow
+
+
+def read_arrow(columns: list[str], batches: list[list[tuple]]):
+    return pa.ipc.open_stream(b"".join(encode_arrow(columns, iter(batches)))).read_all()
+
+
+def test_null_first_batch_takes_type_from_later_rows():
+    table = read_arrow(["id", "note"], [[(1, None), (2, None)], [(3, 7), (4, None)]])
+    assert table.schema.field("note").type == pa.int64()
+    assert table.column("note").to_pylist() == [None, None, 7, None]
+
+
+def test_all_null_column_is_text():
+    table = read_arrow(["id", "note"], [[(1, None)], [(2, None)]])
+    assert table.schema.field("note").type == pa.string()
+    assert table.num_rows == 2
+
+
+def test_mixed_column_falls_back_to_text():
+    table = read_arrow(["v"], [[(1,), ("x",)], [(2,), (b"\x01",)]])
+    assert table.schema.field("v").type == pa.string()
+    assert table.column("v").to_pylist() == ["1", "x", "2", "01"]
+
+
+def test_drift_after_schema_is_settled(monkeypatch):
+    monkeypatch.setattr(streaming, "ARROW_SCHEMA_ROWS", 1)
+    table = read_arrow(["label", "amount"], [[("a", 1.5)], [(2, 3)]])
+    assert table.column("label").to_pylist() == ["a", "2"]
+    assert table.column("amount").to_pylist() == [1.5, 3.0]
+
+
+def test_lossy_drift_is_an_error(monkeypatch):
+    monkeypatch.setattr(streaming, "ARROW_SCHEMA_ROWS", 1)
+    with pytest.raises(ValueError):
+        read_arrow(["n"], [[(1,)], [(1.5,)]])
+
+
+def test_empty_result():
+    table = read_arrow(["a", "b"], [])
+    assert table.column_names == ["a", "b"]
+    assert table.num_rows == 0
@@ -0,0 +1,81 @@
+import os
+import time
+import hashlib
+import sqlite3
+
+import pytest
+
+import uploads as uploads_module
+from db_registry import DatabaseRegistry
+from uploads import UploadManager, validate_file
+
+
+def write_db(path: str) -> str:
+    conn = sqlite3.connect(path)
+    conn.executescript("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT); INSERT INTO t (v) VALUES ('a');")
+    conn.close()
+    return path
+
+
+def sha256_of(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    db_dir = tmp_path / "Project Files"
+    db_dir.mkdir()
+    monkeypatch.setattr(uploads_module, "registry", DatabaseRegistry(path=str(tmp_path / "databases.json")))
+    return UploadManager(db_dir=str(db_dir), index_path=str(tmp_path / "uploads.json"))
+
+
+def upload(manager: UploadManager, source: str, name: str) -> dict:
+    tmp = os.path.join(manager.db_dir, f".upload-{name}.part")
+    with open(source, "rb") as src, open(tmp, "wb") as out:
+        out.write(src.read())
+    job = manager.submit(tmp, name, sha256_of(source), os.path.getsize(source))
+    for _ in range(500):
+        job = manager.get_job(job["job_id"])
+        if job["status"] != "validating":
+            return job
+        time.sleep(0.01)
+    raise AssertionError("upload did not finish")
+
+
+def test_validate_file_with_special_characters(tmp_path):
+    folder = tmp_path / "My Data #1"
+    folder.mkdir()
+    schema = validate_file(write_db(str(folder / "sales?v=2 %20.db")))
+    assert [t["table_name"] for t in schema] == ["t"]
+
+
+def test_integrity_check_reads_the_named_file(tmp_path):
+    # A misparsed URI would quick_check some other (empty) file and pass
+    path = str(tmp_path / "My Data #1 ?.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.executemany("INSERT INTO t (v) VALUES (?)", [("x" * 200,)] * 200)
+    conn.commit()
+    conn.close()
+    with open(path, "r+b") as f:
+        f.seek(4096 + 8)
+        f.write(b"\xff" * 64)
+    with pytest.raises((ValueError, sqlite3.DatabaseError)):
+        validate_file(path)
+
+
+def test_duplicate_content_is_registered_under_the_requested_name(manager, tmp_path, monkeypatch):
+    source = write_db(str(tmp_path / "source.db"))
+    first = upload(manager, source, "a.db")
+    assert first["status"] == "ready" and not first["deduplicated"]
+
+    checked = []
+    monkeypatch.setattr(uploads_module, "validate_file", lambda path: checked.append(path))
+    second = upload(manager, source, "b.db")
+    assert second["status"] == "ready", second["error"]
+    assert second["deduplicated"] and second["db_name"] == "b.db"
+    assert checked == []
+    registry = uploads_module.registry
+    assert registry.resolve("b.db") == os.path.join(manager.db_dir, "b.db")
+    assert registry.resolve("a.db") == os.path.join(manager.db_dir, "a.db")
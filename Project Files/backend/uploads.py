@@ -0,0 +1,228 @@
+"""
+Database uploads for Smart Bridge SQL Querying.
+Uploads are streamed to a temp file in fixed-size chunks and hashed as they
+arrive. Validation (header magic, PRAGMA quick_check, schema extraction) runs
+as a background job, and the file is swapped in atomically and registered
+under its name only once it passes. Content identical to an already
+validated file skips validation and is registered under the requested name.
+"""
+
+import os
+import json
+import uuid
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Optional
+from urllib.request import pathname2url
+
+from database import DB_DIR, get_schema, close_pool, invalidate_schema_cache
+from db_registry import registry, UnknownDatabase
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", "0"))  # 0 = unlimited
+MAX_UPLOAD_JOBS = 100
+UPLOAD_INDEX_PATH = os.path.join(DB_DIR, "uploads.json")
+
+ALLOWED_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def safe_filename(filename: str) -> Optional[str]:
+    """Strip directories from an uploaded name; None if the extension is not allowed."""
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    if not name or name.startswith(".") or not name.endswith(ALLOWED_EXTENSIONS):
+        return None
+    return name
+
+
+async def receive(file, tmp_path: str, chunk_size: int = UPLOAD_CHUNK_SIZE,
+                  max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[str, int]:
+    """Copy an upload to `tmp_path` chunk by chunk. Returns (sha256, size)."""
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds the {max_bytes}-byte limit.")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        _remove(tmp_path)
+        raise
+    return digest.hexdigest(), size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def validate_file(path: str) -> list[dict]:
+    """Check that `path` is an intact SQLite database with tables. Returns its schema."""
+    with open(path, "rb") as f:
+        if f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC:
+            raise ValueError("Not an SQLite database (bad file header).")
+
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA quick_check").fetchall()]
+    finally:
+        conn.close()
+    if problems != ["ok"]:
+        raise ValueError("Integrity check failed: " + "; ".join(problems[:5]))
+
+    try:
+        schema = get_schema(path)
+    finally:
+        close_pool(path)
+        invalidate_schema_cache(path)
+    if not schema:
+        raise ValueError("Database file contains no tables.")
+    return schema
+
+
+class UploadManager:
+    """Tracks upload jobs and the content-hash index of validated files."""
+
+    def __init__(self, db_dir: str = DB_DIR, index_path: str = UPLOAD_INDEX_PATH,
+                 max_jobs: int = MAX_UPLOAD_JOBS):
+        self.db_dir = db_dir
+        self.index_path = index_path
+        self.max_jobs = max_jobs
+        self._jobs: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        # Serializes swaps so two uploads never race on the same destination
+        self._swap_lock = threading.Lock()
+
+    # ── Content-hash index ──
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index: dict):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, self.index_path)
+
+    def find_duplicate(self, sha256: str) -> Optional[str]:
+        """Path of a previously validated file with this content, if it is unchanged on disk."""
+        entry = self._load_index().get(sha256)
+        if not entry:
+            return None
+        path = os.path.join(self.db_dir, entry["db_name"])
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size != entry["size"] or st.st_mtime_ns != entry["mtime_ns"]:
+            return None
+        return path
+
+    def _record(self, sha256: str, path: str):
+        st = os.stat(path)
+        with self._lock:
+            index = self._load_index()
+            # A name holds one content at a time; forget whatever it held before
+            index = {h: e for h, e in index.items() if e["db_name"] != os.path.basename(path)}
+            index[sha256] = {"db_name": os.path.basename(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            self._save_index(index)
+
+    # ── Jobs ──
+
+    def _new_job(self, db_name: str, sha256: str, size: int) -> dict:
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "db_name": db_name,
+            "status": "validating",
+            "error": None,
+            "sha256": sha256,
+            "size": size,
+            "deduplicated": False,
+            "created_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "schema": None,
+        }
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _finish(self, job: dict, status: str, error: str = None, schema: list[dict] = None):
+        with self._lock:
+            job.update(status=status, error=error, schema=schema, finished_at=datetime.now().isoformat())
+
+    def submit(self, tmp_path: str, db_name: str, sha256: str, size: int, activate: bool = False,
+               on_replaced: Callable[[str], Any] = None) -> dict:
+        """
+        Start background validation of a received upload. Returns the job snapshot.
+        on_replaced(db_name) runs when the upload gave an existing name new content.
+        """
+        job = self._new_job(db_name, sha256, size)
+        threading.Thread(
+            target=self._run, args=(job, tmp_path, activate, on_replaced), daemon=True,
+            name=f"upload-{job['job_id'][:8]}",
+        ).start()
+        return self.get_job(job["job_id"])
+
+    def _run(self, job: dict, tmp_path: str, activate: bool, on_replaced: Optional[Callable[[str], Any]]):
+        try:
+            existing = self.find_duplicate(job["sha256"])
+            name = job["db_name"]
+            dest = os.path.join(self.db_dir, name)
+            if existing:
+                # Same bytes as a file that already passed: no need to check them again
+                with self._lock:
+                    job.update(deduplicated=True)
+            else:
+                validate_file(tmp_path)
+            if existing and os.path.abspath(existing) == os.path.abspath(dest):
+                _remove(tmp_path)
+                with self._swap_lock:
+                    try:
+                        registry.resolve(name)
+                    except UnknownDatabase:
+                        registry.register(name, dest)
+            else:
+                with self._swap_lock:
+                    replaced = os.path.exists(dest)
+                    os.replace(tmp_path, dest)
+                    self._record(job["sha256"], dest)
+                    registry.register(name, dest)
+                if replaced and on_replaced:
+                    on_replaced(name)
+            if activate:
+                registry.activate(name)
+            schema = get_schema(dest)
+        except Exception as e:
+            _remove(tmp_path)
+            self._finish(job, "failed", error=str(e))
+            return
+        self._finish(job, "ready", schema=schema)
+
+
+uploads = UploadManager()
@@ -30,7 +30,7 @@ function App() {
     try {
       const data = await fetchSchema();
       setSchema(data.schema || []);
-      setDbName(data.db_path || 'sample.db');
+      setDbName(data.db || data.db_path || 'sample.db');
     } catch (err) {
       showToast('Failed to connect to backend. Is the server running?', 'error');
     } finally {
@@ -44,7 +44,7 @@ function App() {
     setQueryResult(null);
 
     try {
-      const data = await submitQuery(question);
+      const data = await submitQuery(question, dbName);
       if (data.success) {
         setQueryResult(data);
       } else {
@@ -59,9 +59,9 @@ function App() {
     }
   };
 
-  const loadHistory = async () => {
+  const loadHistory = async (db = dbName) => {
     try {
-      const data = await fetchHistory();
+      const data = await fetchHistory(db);
       setHistory(data.history || []);
     } catch (err) {
       // silent fail
@@ -70,7 +70,7 @@ function App() {
 
   const handleClearHistory = async () => {
     try {
-      await clearHistory();
+      await clearHistory(dbName);
       setHistory([]);
       showToast('History cleared', 'success');
     } catch (err) {
@@ -93,6 +93,7 @@ function App() {
       if (data.success) {
         setSchema(data.schema || []);
         setDbName(data.db_name || file.name);
+        loadHistory(data.db_name || file.name);
         setQueryResult(null);
         setQueryError(null);
         showToast(`Database "${file.name}" loaded!`, 'success');
@@ -1,44 +1,88 @@
 const API_BASE = 'http://localhost:8000';
 
-export async function fetchSchema() {
-    const res = await fetch(`${API_BASE}/api/schema`);
+const dbQuery = (db) => (db ? `?db=${encodeURIComponent(db)}` : '');
+
+export async function fetchSchema(db) {
+    const res = await fetch(`${API_BASE}/api/schema${dbQuery(db)}`);
     if (!res.ok) throw new Error('Failed to fetch schema');
     return res.json();
 }
 
-export async function submitQuery(question) {
-    const res = await fetch(`${API_BASE}/api/query`, {
+// Results are fetched as ?format=arrays (column names once, rows as arrays; the
+// browser handles gzip) and turned back into row objects here
+const withRowObjects = (result) => {
+    if (result?.success && Array.isArray(result.rows)) {
+        const { columns } = result;
+        result.rows = result.rows.map((row) => Object.fromEntries(columns.map((c, i) => [c, row[i]])));
+    }
+    return result;
+};
+
+// approximate: estimate aggregates from table samples; results.mode says which mode answered
+export async function submitQuery(question, db, { approximate = false } = {}) {
+    const res = await fetch(`${API_BASE}/api/query?format=arrays`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question, execute: true }),
+        body: JSON.stringify({ question, execute: true, db, approximate }),
     });
     if (!res.ok) throw new Error('Failed to submit query');
-    return res.json();
+    const data = await res.json();
+    withRowObjects(data.results);
+    return data;
+}
+
+// Streams /api/query/sse, calling handlers.token / sql / columns / rows / ... per event; resolves with "done"
+export async function streamQuery(question, db, handlers = {}) {
+    const res = await fetch(`${API_BASE}/api/query/sse`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ question, execute: true, db }),
+    });
+    if (!res.ok) throw new Error('Failed to submit query');
+    const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let done = null;
+    for (;;) {
+        const { value, done: finished } = await reader.read();
+        if (finished) break;
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+            const message = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const event = message.match(/^event: (.*)$/m)?.[1];
+            const data = JSON.parse(message.match(/^data: (.*)$/m)?.[1] ?? 'null');
+            if (event === 'done') done = data;
+            handlers[event]?.(data);
+        }
+    }
+    if (!done) throw new Error('Query stream ended early');
+    return done;
 }
 
-export async function executeSQL(sql) {
-    const res = await fetch(`${API_BASE}/api/execute`, {
+export async function executeSQL(sql, db, { approximate = false } = {}) {
+    const res = await fetch(`${API_BASE}/api/execute?format=arrays`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ sql }),
+        body: JSON.stringify({ sql, db, approximate }),
     });
     if (!res.ok) throw new Error('Failed to execute SQL');
-    return res.json();
+    return withRowObjects(await res.json());
 }
 
-export async function fetchHistory() {
-    const res = await fetch(`${API_BASE}/api/history`);
+export async function fetchHistory(db) {
+    const res = await fetch(`${API_BASE}/api/history${dbQuery(db)}`);
     if (!res.ok) throw new Error('Failed to fetch history');
     return res.json();
 }
 
-export async function clearHistory() {
-    const res = await fetch(`${API_BASE}/api/history`, { method: 'DELETE' });
+export async function clearHistory(db) {
+    const res = await fetch(`${API_BASE}/api/history${dbQuery(db)}`, { method: 'DELETE' });
     if (!res.ok) throw new Error('Failed to clear history');
     return res.json();
 }
 
-export async function uploadDatabase(file) {
+export async function uploadDatabase(file, { pollMs = 500 } = {}) {
     const formData = new FormData();
     formData.append('file', file);
     const res = await fetch(`${API_BASE}/api/upload-db`, {
@@ -46,6 +90,60 @@ export async function uploadDatabase(file) {
         body: formData,
     });
     if (!res.ok) throw new Error('Failed to upload database');
+    let job = await res.json();
+
+    // Validation runs in the background; wait for it to settle
+    while (job.status === 'validating') {
+        await new Promise((resolve) => setTimeout(resolve, pollMs));
+        job = await fetchUploadStatus(job.job_id);
+    }
+    if (job.status !== 'ready') throw new Error(job.error || 'Database validation failed');
+    return { ...job, success: true };
+}
+
+export async function fetchUploadStatus(jobId) {
+    const res = await fetch(`${API_BASE}/api/upload-db/${jobId}`);
+    if (!res.ok) throw new Error('Failed to fetch upload status');
+    return res.json();
+}
+
+export async function submitJob({ question, sql, db, priority = 0 }) {
+    const res = await fetch(`${API_BASE}/api/jobs`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ question, sql, db, priority }),
+    });
+    if (!res.ok) throw new Error('Failed to submit job');
+    return res.json();
+}
+
+// Calls onStatus with every job update; resolves with the finished job
+export function watchJob(jobId, onStatus) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(`${API_BASE}/api/jobs/${jobId}/events`);
+        source.addEventListener('status', (e) => onStatus?.(JSON.parse(e.data)));
+        source.addEventListener('done', (e) => {
+            source.close();
+            resolve(JSON.parse(e.data));
+        });
+        source.addEventListener('error', (e) => {
+            source.close();
+            reject(new Error(e.data ? JSON.parse(e.data).error : 'Lost connection to job events'));
+        });
+    });
+}
+
+export async function fetchJobResults(jobId, offset = 0, limit = 500) {
+    const res = await fetch(`${API_BASE}/api/jobs/${jobId}/results?offset=${offset}&limit=${limit}&format=arrays`);
+    if (!res.ok) throw new Error('Failed to fetch job results');
+    return withRowObjects(await res.json());
+}
+
+export const jobDownloadUrl = (jobId, format = 'csv') => `${API_BASE}/api/jobs/${jobId}/download?format=${format}`;
+
+export async function cancelJob(jobId) {
+    const res = await fetch(`${API_BASE}/api/jobs/${jobId}/cancel`, { method: 'POST' });
+    if (!res.ok) throw new Error('Failed to cancel job');
     return res.json();
 }
 